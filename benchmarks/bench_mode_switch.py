@@ -0,0 +1,355 @@
+"""
+End-to-end benchmark of the mode changes, from the REST request to the flow tables of the switches.
+
+It starts the real controller with ryu-manager and connects emulated OpenFlow 1.3 switches to it
+(see switch_emulator.py), then calls the mode routes of the controller and measures:
+- the time until the REST response, which the controller sends once every switch has acknowledged the change
+- the time until the flow table of every emulated switch matches the target of the mode
+
+Before every mode change the switches send a packet-in for every pair of hosts and traffic class, from the
+switch of the source host, so that the controller has reactive flow entries to move to the new mode.
+The flow tables match the target of a mode when their slice flow entries forward as the slices of the mode,
+computed from the port mappings of the topology (slice_to_port and build_forwarding_index of utils.py):
+- first topology: the (source, destination) pairs and output ports of the IP entries are exactly the ones of the slice
+- second topology: on the switch of every source host, the entries of every destination forward to the ports
+  of the active slices, or drop the packets if the hosts cannot communicate, and no entry is left for other ports
+  (the entries removed by the change are reinstalled by the next packet-in and are not required)
+Every run is repeated with switches rejecting the ONF bundles, so that the barrier fallback is measured too.
+The fabric grows from 5 to 500
+switches: the slices of the topologies are defined for their first switches (5 in the first topology,
+4 in the second one), the other switches only receive the base flow entries, so the results show how the
+per-switch work of a mode change grows with the number of connected switches.
+
+Ryu must be installed and the OpenFlow and REST ports must be free. Run it from the repository root with:
+python3 benchmarks/bench_mode_switch.py [first] [second]
+"""
+import asyncio
+import importlib.util
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from bench_packet_in import build_frame
+from switch_emulator import Fabric
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OFP_PORT = 6633
+WSAPI_PORT = 8081
+SWITCH_COUNTS = [5, 50, 100, 250, 500]
+# Number of times the sequence of mode changes is measured for every fabric size
+ROUNDS = 3
+# Sequence of mode routes of every topology, the routes of the second topology toggle a mode
+# so every mode is activated and then deactivated and the sequence ends with no active mode, as it starts
+MODE_SEQUENCES = {
+    "first": ["always_on_mode", "listener_mode", "no_guest_mode", "speaker_mode"],
+    "second": ["first_mode", "first_mode", "second_mode", "second_mode", "third_mode", "third_mode", "first_mode", "second_mode", "third_mode", "first_mode", "second_mode", "third_mode"],
+}
+# Slicing scenario of the mode routes of the first topology and index of the modes of the second one
+FIRST_SCENARIOS = {"always_on_mode": 0, "listener_mode": 1, "no_guest_mode": 2, "speaker_mode": 3}
+SECOND_MODES = {"first_mode": 0, "second_mode": 1, "third_mode": 2}
+TIMEOUT = 30
+# Runs ryu-manager with the snapshots of the controller disabled, so that a run neither restores the state
+# saved by the previous one nor overwrites the snapshot of a real deployment. The application is given by
+# module name, so that ryu-manager reuses the controller module imported here instead of loading the file again
+RYU_MANAGER = "from ryu.cmd import manager; import controller; controller.SNAPSHOT_PATH = None; manager.main()"
+# Maximum time in seconds to wait for the flow tables to match their target after the REST response
+MATCH_TIMEOUT = 5
+
+
+def load_utils(topology):
+    """
+    Load the utils module of a topology under a unique name.
+
+    Args:
+        topology (str): "first" or "second".
+
+    Returns:
+        module: The loaded module.
+    """
+    path = os.path.join(ROOT, "topologies", f"{topology}_topology", "utils.py")
+    spec = importlib.util.spec_from_file_location(f"{topology}_utils", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def host_attachments(utils):
+    """
+    Get the switch and port of every host.
+
+    Args:
+        utils (module): The utils module of the topology.
+
+    Returns:
+        dict: A dictionary {host: (dpid, port)}.
+    """
+    return {
+        host: (utils.DPID_MAPPING[switch], port)
+        for switch, links in utils.LINK_MAPPING.items()
+        for host, port in links.items() if host in utils.MAC_MAPPING
+    }
+
+
+def first_target(utils, scenario):
+    """
+    Build the check of the flow tables of the first topology in a slicing scenario.
+
+    Args:
+        utils (module): The utils module of the topology.
+        scenario (int): The slicing scenario.
+
+    Returns:
+        callable: Called with the DPID and the flow table of a switch, returns whether its IP entries are the ones of the slice.
+    """
+    expected = {}
+    for (dpid, src_ip, dst_ip), out_port in utils.build_forwarding_index(utils.slice_to_port(scenario)).items():
+        expected.setdefault(dpid, set()).add((src_ip, dst_ip, frozenset((out_port,))))
+
+    def target(dpid, flows):
+        view = set()
+        for (table_id, priority, match), (instructions, ports) in flows.items():
+            fields = dict(match)
+            if "ipv4_dst" in fields:
+                view.add((fields.get("ipv4_src"), fields["ipv4_dst"], ports))
+        return view == expected.get(dpid, set())
+    return target
+
+
+def second_target(utils, modes):
+    """
+    Build the check of the flow tables of the second topology with the given active modes.
+
+    Args:
+        utils (module): The utils module of the topology.
+        modes (list): The indexes of the active modes.
+
+    Returns:
+        callable: Called with the DPID and the flow table of a switch, returns whether its slice entries forward the
+        traffic of the hosts of the switch as the active slices. A missing entry sends the traffic to the controller.
+    """
+    index = utils.build_forwarding_index(utils.slice_to_port(), sorted(modes))
+    attachments = host_attachments(utils)
+    expected = {} # dpid -> {(in_port, dst): out ports}
+    for src, (dpid, in_port) in attachments.items():
+        for dst in attachments:
+            if dst != src:
+                src_mac, dst_mac = utils.MAC_MAPPING[src], utils.MAC_MAPPING[dst]
+                expected.setdefault(dpid, {})[(in_port, dst_mac)] = frozenset(index.get((dpid, src_mac, dst_mac), ()))
+
+    def target(dpid, flows):
+        pairs = expected.get(dpid, {})
+        entries = []
+        for (table_id, priority, match), (instructions, ports) in flows.items():
+            fields = dict(match)
+            if "eth_dst" in fields:
+                if fields.get("in_port") is not None and (fields["in_port"], fields["eth_dst"]) not in pairs:
+                    return False
+                entries.append((fields.get("in_port"), fields["eth_dst"], ports))
+        for (in_port, dst), out_ports in pairs.items():
+            # The merged entries without input port forward the traffic of every source
+            found = {ports for entry_port, entry_dst, ports in entries if entry_dst == dst and entry_port in (None, in_port)}
+            if found - {out_ports}:
+                return False
+        return True
+    return target
+
+
+def build_targets(topology, sequence):
+    """
+    Build the check of the flow tables after every mode change of a sequence.
+
+    Args:
+        topology (str): "first" or "second".
+        sequence (list): The mode routes, the second topology starting with no active mode.
+
+    Returns:
+        list: The checks, see first_target and second_target.
+    """
+    utils = load_utils(topology)
+    if topology == "first":
+        return [first_target(utils, FIRST_SCENARIOS[route]) for route in sequence]
+    targets, modes = [], set()
+    for route in sequence:
+        modes ^= {SECOND_MODES[route]}
+        targets.append(second_target(utils, modes))
+    return targets
+
+
+def build_traffic(topology):
+    """
+    Build the packet-ins of every pair of hosts and traffic class, received by the switch of the source host.
+
+    Args:
+        topology (str): "first" or "second".
+
+    Returns:
+        list: The packet-ins (dpid, in_port, frame).
+    """
+    utils = load_utils(topology)
+    attachments = host_attachments(utils)
+    traffic = []
+    for src, (dpid, in_port) in attachments.items():
+        for dst in attachments:
+            if dst == src:
+                continue
+            for traffic_class in ("http", "dns", "icmp", "general"):
+                frame = build_frame(utils.MAC_MAPPING[src], utils.MAC_MAPPING[dst], utils.IP_MAPPING[src], utils.IP_MAPPING[dst], traffic_class)
+                traffic.append((dpid, in_port, frame))
+    return traffic
+
+
+def get_json(path):
+    """
+    Send a GET request to the REST API of the controller.
+
+    Args:
+        path (str): The path of the route.
+
+    Returns:
+        dict: The decoded JSON response.
+    """
+    with urllib.request.urlopen(f"http://127.0.0.1:{WSAPI_PORT}{path}", timeout=TIMEOUT) as response:
+        return json.loads(response.read())
+
+
+def start_controller(topology):
+    """
+    Start the controller of a topology with ryu-manager, without snapshots, and wait until its REST API answers.
+
+    Args:
+        topology (str): "first" or "second".
+
+    Returns:
+        Popen: The process of the controller.
+    """
+    process = subprocess.Popen(
+        [sys.executable, "-c", RYU_MANAGER, "--ofp-tcp-listen-port", str(OFP_PORT), "--wsapi-port", str(WSAPI_PORT), "controller"],
+        cwd=os.path.join(ROOT, "topologies", f"{topology}_topology"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.perf_counter() + TIMEOUT
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"ryu-manager exited with code {process.returncode}")
+        try:
+            get_json(f"/controller/{topology}/flows")
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("the controller did not start")
+
+
+async def wait_registered(topology, count):
+    """
+    Wait until the controller has registered the given number of switches.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = time.perf_counter() + TIMEOUT
+    while len(await loop.run_in_executor(None, get_json, f"/controller/{topology}/flows")) < count:
+        if time.perf_counter() > deadline:
+            raise RuntimeError(f"the controller did not register {count} switches")
+        await asyncio.sleep(0.1)
+
+
+async def change_mode(fabric, topology, traffic, route, target):
+    """
+    Send the traffic, then call a mode route and wait until every switch has the target flow table.
+
+    Args:
+        fabric (Fabric): The emulated switches.
+        topology (str): "first" or "second".
+        traffic (list): The packet-ins (dpid, in_port, frame) sent before the mode change.
+        route (str): The mode route.
+        target (callable): The check of the flow table of every switch, if None the tables are not checked.
+
+    Returns:
+        tuple: The time of the REST response and the time until the tables match in ms (None if they did not match
+        within MATCH_TIMEOUT seconds), the convergence time reported by the controller and the flow-mods applied by the switches.
+    """
+    loop = asyncio.get_running_loop()
+    for dpid, in_port, frame in traffic:
+        fabric.switches[dpid].packet_in(in_port, frame)
+    await fabric.settle()
+
+    flow_mods = sum(switch.flow_mods for switch in fabric.switches.values())
+    if target is not None:
+        fabric.expect(target)
+    start = time.perf_counter()
+    body = await loop.run_in_executor(None, get_json, f"/controller/{topology}/{route}")
+    response_ms = (time.perf_counter() - start) * 1000
+
+    match_ms = None
+    if target is not None:
+        deadline = time.perf_counter() + MATCH_TIMEOUT
+        while not fabric.converged() and time.perf_counter() < deadline:
+            await asyncio.sleep(0.001)
+        if fabric.converged():
+            match_ms = (max(start, *fabric.matched_at.values()) - start) * 1000
+    flow_mods = sum(switch.flow_mods for switch in fabric.switches.values()) - flow_mods
+    return response_ms, match_ms, body["convergence_ms"], flow_mods
+
+
+async def benchmark(topology, switch_counts, bundles):
+    """
+    Measure the mode changes of a topology for every fabric size.
+
+    Args:
+        topology (str): "first" or "second".
+        switch_counts (list): The numbers of switches, in increasing order.
+        bundles (bool): Whether the emulated switches support the ONF bundles, otherwise the controller falls back to barriers.
+
+    Returns:
+        None
+    """
+    sequence = MODE_SEQUENCES[topology]
+    traffic = build_traffic(topology)
+    targets = build_targets(topology, sequence)
+    fabric = Fabric(port=OFP_PORT, bundles=bundles)
+    try:
+        for count in switch_counts:
+            await fabric.add_switches(range(len(fabric.switches) + 1, count + 1))
+            await wait_registered(topology, count)
+            await fabric.settle()
+
+            # Warm-up pass over the sequence, which ends in the state it starts from
+            for route in sequence:
+                await change_mode(fabric, topology, traffic, route, None)
+
+            responses, matches, reported, flow_mods, failed = [], [], [], [], 0
+            for _ in range(ROUNDS):
+                for route, target in zip(sequence, targets):
+                    response_ms, match_ms, convergence_ms, count_flow_mods = await change_mode(fabric, topology, traffic, route, target)
+                    responses.append(response_ms)
+                    reported.append(convergence_ms)
+                    flow_mods.append(count_flow_mods)
+                    if match_ms is None:
+                        failed += 1
+                    else:
+                        matches.append(match_ms)
+
+            print(
+                f"{topology:<9}{'yes' if bundles else 'no':>8}{count:>9}{len(responses):>8}{statistics.median(responses):>12.1f}{max(responses):>10.1f}"
+                f"{statistics.median(matches) if matches else float('nan'):>13.1f}{max(matches, default=float('nan')):>10.1f}"
+                f"{statistics.median(reported):>11.1f}{statistics.mean(flow_mods):>11.1f}{failed:>9}"
+            )
+    finally:
+        fabric.close()
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(MODE_SEQUENCES)
+    print(f"{'topology':<9}{'bundles':>8}{'switches':>9}{'changes':>8}{'rest p50 ms':>12}{'max ms':>10}{'flows p50 ms':>13}{'max ms':>10}{'ctrl p50':>11}{'flow-mods':>11}{'timeouts':>9}")
+    for topology in selected:
+        for bundles in (True, False):
+            process = start_controller(topology)
+            try:
+                asyncio.run(benchmark(topology, SWITCH_COUNTS, bundles))
+            finally:
+                process.terminate()
+                process.wait()
@@ -0,0 +1,314 @@
+"""
+Benchmark of the packet-in handlers of the controllers, without mininet and Open vSwitch.
+
+The controllers are instantiated with fake datapaths recording the messages they receive, and the
+handlers are called with synthetic packet-in events carrying realistic frames, for every mode and
+traffic class. Every scenario is measured twice:
+- miss: the first packet-in of every flow, which installs a flow entry and sends a packet-out
+- repeat: the same packet-ins again while the flow entries are still being installed, answered with a packet-out only
+
+For each scenario it reports the events per second, the median and 99th percentile latency of the handler
+and the flow-mods emitted per event. The packet-in rate limiter is disabled and the log records are
+written to /dev/null.
+
+Ryu must be installed. Run it from the repository root with: python3 benchmarks/bench_packet_in.py [first] [second]
+"""
+import importlib
+import logging
+import os
+import sys
+import time
+
+from ryu.controller import ofp_event
+from ryu.lib.packet import packet, ethernet, ether_types, ipv4, tcp, udp, icmp
+from ryu.ofproto import ofproto_v1_3, ofproto_v1_3_parser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOPOLOGIES = {"first": "first_topology", "second": "second_topology"}
+# Number of times every scenario is repeated
+ROUNDS = 20
+
+SRC_MAC = "00:00:00:00:00:01"
+DST_MAC = "00:00:00:00:00:06"
+SRC_IP = "10.0.0.1"
+DST_IP = "10.0.0.6"
+
+
+class FakeDatapath:
+    """
+    Datapath of a switch recording the messages sent by the controller instead of sending them.
+
+    Attributes:
+        id (int): The DPID of the switch.
+        sent (list): The messages sent to the switch.
+    """
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+
+    def __init__(self, dpid):
+        self.id = dpid
+        self.sent = []
+        self.xid = 0
+
+    def set_xid(self, msg):
+        self.xid += 1
+        msg.set_xid(self.xid)
+        return self.xid
+
+    def send_msg(self, msg):
+        if msg.xid is None:
+            self.set_xid(msg)
+        self.sent.append(msg)
+
+
+class FakeWSGI:
+    """
+    WSGI application accepting the registration of the REST controllers.
+    """
+    def register(self, controller, data):
+        pass
+
+
+def load_controller(topology):
+    """
+    Import the controller of a topology. The modules of the other topology, which have the same names, are unloaded first.
+
+    Args:
+        topology (str): The topology directory (e.g., "first_topology").
+
+    Returns:
+        module: The controller module.
+    """
+    for directory in TOPOLOGIES.values():
+        path = os.path.join(ROOT, "topologies", directory)
+        if path in sys.path:
+            sys.path.remove(path)
+        for name in os.listdir(path):
+            if name.endswith(".py"):
+                sys.modules.pop(name[:-3], None)
+    sys.path.insert(0, os.path.join(ROOT, "topologies", topology))
+    return importlib.import_module("controller")
+
+
+def create_app(controller, app_class, dpids):
+    """
+    Instantiate a controller connected to fake datapaths, without the statistics polling and the snapshots and with the logs written to /dev/null.
+
+    Args:
+        controller (module): The controller module.
+        app_class (type): The Ryu application class.
+        dpids (iterable): The DPIDs of the switches.
+
+    Returns:
+        RyuApp: The application.
+    """
+    structured_log = importlib.import_module("common.structured_log")
+    # The handler installed for the other topology is replaced by a new one
+    root_logger = logging.getLogger(structured_log.ROOT_LOGGER)
+    for handler in list(root_logger.handlers):
+        handler.close()
+        root_logger.removeHandler(handler)
+    structured_log.setup_logging(controller.LOG_LEVEL, controller.LOG_JSON, controller.LOG_QUEUE_SIZE, open(os.devnull, "w"))
+
+    controller.STATS_INTERVAL = 0
+    # The runs must not restore the state saved by the previous ones
+    controller.SNAPSHOT_PATH = None
+    app = app_class(wsgi=FakeWSGI())
+    app.packet_in_limiter.rate = None
+    app.convergence.use_bundles = False
+    app.convergence.timeout = 0
+    for dpid in dpids:
+        app.datapaths[dpid] = FakeDatapath(dpid)
+    return app
+
+
+def build_frame(src_mac, dst_mac, src_ip, dst_ip, traffic_class):
+    """
+    Serialize a realistic frame of a traffic class.
+
+    Args:
+        src_mac (str): The source MAC address.
+        dst_mac (str): The destination MAC address.
+        src_ip (str): The source IPv4 address.
+        dst_ip (str): The destination IPv4 address.
+        traffic_class (str): One of "http", "dns", "icmp" or "general".
+
+    Returns:
+        bytes: The frame.
+    """
+    pkt = packet.Packet()
+    pkt.add_protocol(ethernet.ethernet(dst=dst_mac, src=src_mac, ethertype=ether_types.ETH_TYPE_IP))
+    if traffic_class == "http":
+        syn_options = b"\x02\x04\x05\xb4\x04\x02\x08\x0a\x00\x00\x00\x01\x00\x00\x00\x00\x01\x03\x03\x07"
+        pkt.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=6))
+        pkt.add_protocol(tcp.tcp(src_port=40000, dst_port=80, bits=tcp.TCP_SYN, option=syn_options))
+    elif traffic_class == "dns":
+        pkt.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=17))
+        pkt.add_protocol(udp.udp(src_port=40000, dst_port=53))
+        pkt.add_protocol(b"\x12\x34\x01\x00\x00\x01" + b"\x00" * 6 + b"\x07example\x03com\x00\x00\x01\x00\x01")
+    elif traffic_class == "icmp":
+        pkt.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=1))
+        pkt.add_protocol(icmp.icmp(data=icmp.echo(id_=1, seq=1, data=b"x" * 56)))
+    else:
+        pkt.add_protocol(ipv4.ipv4(src=src_ip, dst=dst_ip, proto=17))
+        pkt.add_protocol(udp.udp(src_port=40000, dst_port=5001))
+        pkt.add_protocol(b"x" * 1470)
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def packet_in_event(datapath, in_port, data):
+    """
+    Build the event of a packet-in sent by a switch after a table miss.
+
+    Args:
+        datapath (FakeDatapath): The datapath of the switch.
+        in_port (int): The port receiving the packet.
+        data (bytes): The frame.
+
+    Returns:
+        EventOFPPacketIn: The event.
+    """
+    msg = ofproto_v1_3_parser.OFPPacketIn(
+        datapath,
+        buffer_id=ofproto_v1_3.OFP_NO_BUFFER,
+        total_len=len(data),
+        reason=ofproto_v1_3.OFPR_NO_MATCH,
+        table_id=0,
+        cookie=0,
+        match=ofproto_v1_3_parser.OFPMatch(in_port=in_port),
+        data=data,
+    )
+    return ofp_event.EventOFPPacketIn(msg)
+
+
+def first_scenarios(controller):
+    """
+    Get the packet-in events of every mode of the first topology: one event for every
+    switch and pair of hosts of the mode, plus the pairs of the other modes, which are dropped.
+
+    Args:
+        controller (module): The controller module of the first topology.
+
+    Returns:
+        tuple: The application and a list of (mode, traffic_class, activate, events), where activate applies the mode.
+    """
+    app = create_app(controller, controller.FirstSlicing, range(1, 6))
+    every_pair = {key for mode in controller.FirstTopologyModes for key in controller.build_forwarding_index(controller.slice_to_port(mode.value))}
+    scenarios = []
+    for mode in controller.FirstTopologyModes:
+        for traffic_class in ("http", "dns", "icmp", "general"):
+            events = [
+                packet_in_event(app.datapaths[dpid], 1, build_frame(SRC_MAC, DST_MAC, src_ip, dst_ip, traffic_class))
+                for dpid, src_ip, dst_ip in sorted(every_pair)
+            ]
+            scenarios.append((mode.name.lower(), traffic_class, lambda mode=mode: app.update_slice(mode), events))
+    return app, scenarios
+
+
+def second_scenarios(controller):
+    """
+    Get the packet-in events of every mode of the second topology, including all the modes active together:
+    one event for every switch and pair of hosts of any mode, the pairs of the inactive modes are dropped.
+
+    Args:
+        controller (module): The controller module of the second topology.
+
+    Returns:
+        tuple: The application and a list of (mode, traffic_class, activate, events), where activate applies the mode.
+    """
+    app = create_app(controller, controller.SecondSlicing, range(1, 5))
+    mode_count = len(app.slice_to_port)
+    every_pair = set(controller.build_forwarding_index(app.slice_to_port, list(range(mode_count))))
+
+    def activate(modes):
+        controller.current_modes[:] = modes
+        app.update_forwarding_index()
+        app.pending_installs.clear()
+
+    scenarios = []
+    for modes in [[mode] for mode in range(mode_count)] + [list(range(mode_count))]:
+        name = controller.SecondSlicingController.index_to_mode_name[modes[0]] if len(modes) == 1 else "all_modes"
+        for traffic_class in ("http", "dns", "icmp", "general"):
+            events = [
+                packet_in_event(app.datapaths[dpid], 1, build_frame(src_mac, dst_mac, SRC_IP, DST_IP, traffic_class))
+                for dpid, src_mac, dst_mac in sorted(every_pair)
+            ]
+            scenarios.append((name, traffic_class, lambda modes=modes: activate(modes), events))
+    return app, scenarios
+
+
+def run_pass(app, events):
+    """
+    Call the packet-in handler for every event.
+
+    Args:
+        app (RyuApp): The application.
+        events (list): The packet-in events.
+
+    Returns:
+        tuple: The latency of every call in seconds, the total time in seconds and the flow-mods sent.
+    """
+    for datapath in app.datapaths.values():
+        datapath.sent.clear()
+    latencies = []
+    handler = app._packet_in_handler
+    perf_counter = time.perf_counter
+    start = perf_counter()
+    for event in events:
+        before = perf_counter()
+        handler(event)
+        latencies.append(perf_counter() - before)
+    total = perf_counter() - start
+    flow_mods = sum(isinstance(msg, ofproto_v1_3_parser.OFPFlowMod) for datapath in app.datapaths.values() for msg in datapath.sent)
+    return latencies, total, flow_mods
+
+
+def percentile(values, fraction):
+    """
+    Get a percentile of sorted values.
+    """
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def measure(app, activate, events):
+    """
+    Measure the miss and repeat passes of a scenario over ROUNDS rounds.
+
+    Args:
+        app (RyuApp): The application.
+        activate (callable): Applies the mode of the scenario.
+        events (list): The packet-in events.
+
+    Returns:
+        dict: A dictionary {pass: (events per second, p50 in us, p99 in us, flow-mods per event)}.
+    """
+    activate()
+    results = {"miss": ([], 0, 0), "repeat": ([], 0, 0)}
+    for _ in range(ROUNDS):
+        # Forgetting the pending installs makes every packet-in a miss again
+        app.pending_installs.clear()
+        for name in ("miss", "repeat"):
+            latencies, total, flow_mods = run_pass(app, events)
+            old_latencies, old_total, old_flow_mods = results[name]
+            results[name] = (old_latencies + latencies, old_total + total, old_flow_mods + flow_mods)
+
+    summary = {}
+    for name, (latencies, total, flow_mods) in results.items():
+        latencies.sort()
+        summary[name] = (len(latencies) / total, percentile(latencies, 0.5) * 1e6, percentile(latencies, 0.99) * 1e6, flow_mods / len(latencies))
+    return summary
+
+
+if __name__ == "__main__":
+    selected = sys.argv[1:] or list(TOPOLOGIES)
+    print(f"{'topology':<9}{'mode':<13}{'class':<9}{'events':>7}{'miss ev/s':>11}{'p50 us':>8}{'p99 us':>8}{'fm/ev':>7}{'repeat ev/s':>13}{'p50 us':>8}{'p99 us':>8}")
+    for name in selected:
+        controller = load_controller(TOPOLOGIES[name])
+        app, scenarios = first_scenarios(controller) if name == "first" else second_scenarios(controller)
+        for mode, traffic_class, activate, events in scenarios:
+            result = measure(app, activate, events)
+            miss_rate, miss_p50, miss_p99, flow_mods = result["miss"]
+            repeat_rate, repeat_p50, repeat_p99, _ = result["repeat"]
+            print(f"{name:<9}{mode:<13}{traffic_class:<9}{len(events):>7}{miss_rate:>11.0f}{miss_p50:>8.1f}{miss_p99:>8.1f}{flow_mods:>7.2f}{repeat_rate:>13.0f}{repeat_p50:>8.1f}{repeat_p99:>8.1f}")
+        app.log_handler.close()
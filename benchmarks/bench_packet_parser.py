@@ -0,0 +1,115 @@
+"""
+Benchmark of the packet-in header parsing.
+
+It compares, on realistic frames:
+- the Ryu packet library, building the full packet and calling get_protocol for every header (legacy handler)
+- the fast path of packet_parser, which reads only the header fields used by the controllers
+
+Ryu must be installed. Run it from the repository root with: python3 benchmarks/bench_packet_parser.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "topologies"))
+
+from ryu.lib.packet import packet, ethernet, ether_types, arp, ipv4, tcp, udp, icmp
+
+from common.packet_parser import parse_headers, parse_full
+
+SRC_MAC = "00:00:00:00:00:01"
+DST_MAC = "00:00:00:00:00:06"
+SRC_IP = "10.0.0.1"
+DST_IP = "10.0.0.6"
+
+
+def build_frame(*protocols, payload=b""):
+    """
+    Serialize a frame from its protocol headers.
+
+    Args:
+        *protocols: The headers of the frame, starting from Ethernet.
+        payload (bytes): The application payload.
+
+    Returns:
+        bytes: The frame.
+    """
+    pkt = packet.Packet()
+    for protocol in protocols:
+        pkt.add_protocol(protocol)
+    if payload:
+        pkt.add_protocol(payload)
+    pkt.serialize()
+    return bytes(pkt.data)
+
+
+def realistic_frames():
+    """
+    Build the frames that typically reach the controller.
+
+    Args: None
+
+    Returns:
+        dict: A dictionary {name: frame}.
+    """
+    def eth(ethertype=ether_types.ETH_TYPE_IP):
+        return ethernet.ethernet(dst=DST_MAC, src=SRC_MAC, ethertype=ethertype)
+
+    def ip(proto):
+        return ipv4.ipv4(src=SRC_IP, dst=DST_IP, proto=proto)
+
+    syn_options = b"\x02\x04\x05\xb4\x04\x02\x08\x0a\x00\x00\x00\x01\x00\x00\x00\x00\x01\x03\x03\x07"
+    return {
+        "HTTP SYN": build_frame(eth(), ip(6), tcp.tcp(src_port=40000, dst_port=80, bits=tcp.TCP_SYN, option=syn_options)),
+        "HTTP data": build_frame(eth(), ip(6), tcp.tcp(src_port=40000, dst_port=80, bits=tcp.TCP_ACK), payload=b"x" * 1448),
+        "DNS query": build_frame(eth(), ip(17), udp.udp(src_port=40000, dst_port=53), payload=b"\x12\x34\x01\x00\x00\x01" + b"\x00" * 6 + b"\x07example\x03com\x00\x00\x01\x00\x01"),
+        "ICMP echo": build_frame(eth(), ip(1), icmp.icmp(data=icmp.echo(id_=1, seq=1, data=b"x" * 56))),
+        "iperf UDP": build_frame(eth(), ip(17), udp.udp(src_port=40000, dst_port=5001), payload=b"x" * 1470),
+        "ARP": build_frame(eth(ether_types.ETH_TYPE_ARP), arp.arp(src_mac=SRC_MAC, src_ip=SRC_IP, dst_ip=DST_IP)),
+    }
+
+
+def legacy_parse(data):
+    """
+    Parse a frame as the packet-in handlers did before the fast path.
+    """
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocol(ethernet.ethernet)
+    tcp_pkt = pkt.get_protocol(tcp.tcp)
+    udp_pkt = pkt.get_protocol(udp.udp)
+    icmp_pkt = pkt.get_protocol(icmp.icmp)
+    ipv4_pkt = pkt.get_protocol(ipv4.ipv4)
+    return eth, tcp_pkt, udp_pkt, icmp_pkt, ipv4_pkt
+
+
+def packets_per_second(func, data, number):
+    """
+    Get the best throughput of a parser on a frame.
+
+    Args:
+        func (callable): The parser.
+        data (bytes): The frame.
+        number (int): The number of calls per repetition.
+
+    Returns:
+        float: The parsed packets per second.
+    """
+    return number / min(timeit.repeat(lambda: func(data), number=number, repeat=5))
+
+
+if __name__ == "__main__":
+    frames = realistic_frames()
+    for name, data in frames.items():
+        assert parse_headers(data) == parse_full(data), name
+
+    print(f"{'frame':<12}{'bytes':>7}{'ryu (pkt/s)':>14}{'fast (pkt/s)':>15}{'speedup':>10}")
+    total_legacy = total_fast = 0
+    for name, data in frames.items():
+        legacy = packets_per_second(legacy_parse, data, 5000)
+        fast = packets_per_second(parse_headers, data, 50000)
+        total_legacy += 1 / legacy
+        total_fast += 1 / fast
+        print(f"{name:<12}{len(data):>7}{legacy:>14.0f}{fast:>15.0f}{fast / legacy:>9.1f}x")
+    # Mix with one frame of every kind
+    print(f"{'mix':<12}{'':>7}{len(frames) / total_legacy:>14.0f}{len(frames) / total_fast:>15.0f}{total_legacy / total_fast:>9.1f}x")
@@ -0,0 +1,242 @@
+"""
+Benchmark of the QoS updates of the second topology against a mock OVSDB server (see mock_ovsdb.py).
+
+Every update changes the rates of the queues of all the ports. It compares:
+- per-port: the OVSDB transactions of createQueue.sh, one for every port and two for every old QoS or queue
+  (one ovs-vsctl call each), every one on a new connection as ovs-vsctl does
+- rebuild: the "ovsdb" backend of qos.py creating all the queues again, in one transaction
+- update: the "ovsdb" backend of qos.py changing the rates of the existing queues in place, in one transaction
+
+For each commit delay of the mock server it reports the transactions per update, the median and maximum time of an
+update, the time the server spent applying the transactions of an update and the QoS and Queue rows left in the
+database, which must be the ones of the last update only. It checks that the rebuild and in-place updates use a
+single transaction giving every port of queue_port_names() the queues of the update, and that after the queues were
+created again by another client the next update finds them and changes their rates in place. The time needed by
+createQueue.sh to spawn its sudo and ovs-vsctl processes is not included: a lower bound is reported separately by
+spawning the same number of processes running "true".
+
+Run it from the repository root with: python3 benchmarks/bench_qos.py
+"""
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock_ovsdb import MockOvsdb, MockOvsdbServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Number of updates measured for every backend and commit delay
+ROUNDS = 50
+# Seconds added to every commit of the mock server, to emulate the disk write of ovsdb-server
+COMMIT_DELAYS = [0, 0.002]
+RATES = [["1000000", "2000000", "3000000"], ["3000000", "2000000", "1000000"]]
+
+sys.path.insert(0, os.path.join(ROOT, "topologies", "second_topology"))
+import qos  # noqa: E402
+from ovsdb import OvsdbClient  # noqa: E402
+from utils import queue_port_names  # noqa: E402
+
+
+def per_port_update(args):
+    """
+    Apply an update with the transactions of createQueue.sh.
+
+    Args:
+        args (list): The maximum rates of the HTTP, DNS and ICMP queues, as strings.
+
+    Returns:
+        None
+    """
+    old_uuids = []
+    if os.path.isfile(qos.current_queues_path):
+        with open(qos.current_queues_path) as input_file:
+            old_uuids = input_file.read().split()
+
+    os.makedirs(qos.qos_path, exist_ok=True)
+    rates = qos.queue_rates(args)
+    new_uuids = []
+    for port in qos.qos_ports:
+        client = OvsdbClient(qos.ovsdb_remote)
+        results = client.transact(qos.ovsdb_operations([port], rates, []))
+        client.close()
+        uuids = [result["uuid"][1] for result in results if result and "uuid" in result]
+        # ovs-vsctl prints the UUID of the QoS before the ones of its queues, which are inserted first
+        new_uuids += uuids[-1:] + uuids[:-1]
+    for uuid in old_uuids:
+        for table in ("QoS", "Queue"):
+            client = OvsdbClient(qos.ovsdb_remote)
+            client.transact([{"op": "delete", "table": table, "where": [["_uuid", "==", ["uuid", uuid]]]}])
+            client.close()
+
+    with open(qos.current_queues_path, "w") as output_file:
+        output_file.write("".join(f"{uuid}\n" for uuid in new_uuids))
+
+
+def rebuild_update(args):
+    """
+    Apply an update with the "ovsdb" backend, forgetting the queues of the ports so that they are created again.
+
+    Args:
+        args (list): The maximum rates of the HTTP, DNS and ICMP queues, as strings.
+
+    Returns:
+        None
+    """
+    qos.QoS().port_queues = {}
+    in_place_update(args)
+
+
+def in_place_update(args):
+    """
+    Apply an update with the "ovsdb" backend, which changes the rates of the known queues in place.
+
+    Args:
+        args (list): The maximum rates of the HTTP, DNS and ICMP queues, as strings.
+
+    Returns:
+        None
+    """
+    report = qos.QoS().start_process(*args)
+    if report["status"] != 0:
+        raise RuntimeError(report["error"])
+
+
+def check_queues(database, args):
+    """
+    Check that every port of queue_port_names() has a QoS with the queues of an update.
+
+    Args:
+        database (MockOvsdb): The database of the mock server.
+        args (list): The maximum rates of the HTTP, DNS and ICMP queues of the update, as strings.
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: A port has no QoS or its queues do not have the rates of the update.
+    """
+    expected = [str(rate) for rate in qos.queue_rates(args)]
+    qos_rows, queue_rows = database.tables["QoS"], database.tables["Queue"]
+    ports = {row["name"]: row["qos"] for row in database.tables["Port"].values()}
+    for port in queue_port_names():
+        reference = ports.get(port, ["set", []])
+        if reference[0] != "uuid" or reference[1] not in qos_rows:
+            raise AssertionError(f"{port} has no QoS")
+        queues = {queue_id: value[1] for queue_id, value in qos_rows[reference[1]]["queues"][1]}
+        rates = [dict(queue_rows[queues[queue_id]]["other_config"][1]).get("max-rate") if queues.get(queue_id) in queue_rows else None for queue_id in qos.queue_ids]
+        if rates != expected:
+            raise AssertionError(f"{port} has the queue rates {rates} instead of {expected}")
+
+
+def measure(update, commit_delay):
+    """
+    Measure ROUNDS updates on a new mock server, checking the queues of every port after each one.
+
+    Args:
+        update (callable): Applies an update.
+        commit_delay (float): The seconds added to every commit.
+
+    Returns:
+        tuple: The transactions per update, the times of the updates in ms, the ms spent by the server on an update
+        and the QoS and Queue rows left.
+    """
+    if os.path.isfile(qos.current_queues_path):
+        os.remove(qos.current_queues_path)
+    qos.QoS().port_queues = None
+    server = MockOvsdbServer(database=MockOvsdb(queue_port_names(), commit_delay)).start()
+    qos.ovsdb_remote = server.remote
+    try:
+        update(RATES[0])
+        transactions, busy_time = server.database.transactions, server.database.busy_time
+        times = []
+        for index in range(ROUNDS):
+            args = RATES[(index + 1) % len(RATES)]
+            start = time.perf_counter()
+            update(args)
+            times.append((time.perf_counter() - start) * 1000)
+            check_queues(server.database, args)
+        per_update = (server.database.transactions - transactions) / ROUNDS
+        server_time = (server.database.busy_time - busy_time) / ROUNDS * 1000
+        return per_update, times, server_time, len(server.database.tables["QoS"]), len(server.database.tables["Queue"])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def check_rediscovery():
+    """
+    Check that once another client created the queues again, the "ovsdb" backend finds the new queues and changes
+    their rates in place instead of creating them once more.
+
+    Args: None
+
+    Returns:
+        None
+
+    Raises:
+        AssertionError: The update did not change the rates of the new queues in place.
+    """
+    if os.path.isfile(qos.current_queues_path):
+        os.remove(qos.current_queues_path)
+    qos.QoS().port_queues = None
+    server = MockOvsdbServer(database=MockOvsdb(queue_port_names())).start()
+    qos.ovsdb_remote = server.remote
+    try:
+        in_place_update(RATES[0])
+        client = OvsdbClient(server.remote)
+        client.transact(qos.ovsdb_operations(queue_port_names(), qos.queue_rates(RATES[0]), qos.queue_rows(qos.QoS().port_queues)))
+        client.close()
+        queues = set(server.database.tables["Queue"])
+
+        in_place_update(RATES[1])
+        check_queues(server.database, RATES[1])
+        if qos.QoS().last_apply["mode"] != "update" or set(server.database.tables["Queue"]) != queues:
+            raise AssertionError(f"the queues created by another client were not updated in place ({qos.QoS().last_apply['mode']})")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def spawn_time(count):
+    """
+    Measure the time needed to spawn processes running "true".
+
+    Args:
+        count (int): The number of processes.
+
+    Returns:
+        float: The time in ms, None if "true" is not available.
+    """
+    command = shutil.which("true")
+    if command is None:
+        return None
+    start = time.perf_counter()
+    for _ in range(count):
+        subprocess.call([command])
+    return (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    os.chdir(tempfile.mkdtemp())
+    qos.qos_backend = "ovsdb"
+    for commit_delay in COMMIT_DELAYS:
+        print(f"Commit delay of the mock server: {commit_delay * 1000:.1f} ms")
+        print(f"{'backend':<10}{'txn/update':>11}{'p50 ms':>9}{'max ms':>9}{'server ms':>10}{'QoS rows':>9}{'Queue rows':>11}")
+        for name, update in (("per-port", per_port_update), ("rebuild", rebuild_update), ("update", in_place_update)):
+            per_update, times, server_time, qos_rows, queue_rows = measure(update, commit_delay)
+            if name != "per-port" and per_update != 1:
+                raise AssertionError(f"{name} used {per_update} transactions per update")
+            print(f"{name:<10}{per_update:>11.0f}{statistics.median(times):>9.2f}{max(times):>9.2f}{server_time:>10.2f}{qos_rows:>9}{queue_rows:>11}")
+        print()
+
+    check_rediscovery()
+    print("The queues created again by another client are updated in place")
+
+    # createQueue.sh runs sudo ovs-vsctl for every port and twice for every old QoS or queue
+    processes = 2 * (len(qos.qos_ports) + 2 * len(qos.qos_ports) * (1 + len(qos.queue_ids)))
+    elapsed = spawn_time(processes)
+    if elapsed is not None:
+        print(f"createQueue.sh also spawns {processes} processes, spawning them takes at least {elapsed:.1f} ms")
@@ -0,0 +1,171 @@
+"""
+Micro-benchmark of the slice table generation used on every mode change.
+
+It compares:
+- the slice tables rebuilt at every call (build_slice_to_port) with the cached slice_to_port results
+- the steps of a mode switch on generated topologies, made of copies of the real one: the compilation of the
+  slice tables, the forwarding index (build_forwarding_index) and the transition plan of the flow entries
+
+Run it from the repository root with: python3 benchmarks/bench_slice_tables.py
+"""
+import importlib.util
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "topologies"))
+
+from common.transition import TransitionEngine  # noqa: E402
+
+HOST_COUNTS = [10, 50, 100, 500, 1000]
+# Mode switches timed on the generated topologies: (scenario before, scenario after) of the first topology
+# and (modes before, modes after) of the second one
+FIRST_SWITCH = (0, 1)
+SECOND_SWITCH = ([0], [0, 1, 2])
+
+
+def load_utils(topology, name="utils"):
+    """
+    Load a module of a topology under a unique name.
+
+    Args:
+        topology (str): The topology directory (e.g., "first_topology").
+        name (str): The name of the module.
+
+    Returns:
+        module: The loaded module.
+    """
+    path = os.path.join(ROOT, "topologies", topology, f"{name}.py")
+    spec = importlib.util.spec_from_file_location(f"{topology}_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def best_of(func, number):
+    """
+    Get the best time per call of a function, in microseconds.
+
+    Args:
+        func (callable): The function to time.
+        number (int): The number of calls per repetition.
+
+    Returns:
+        float: The best time per call.
+    """
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def replicate_spec(spec, copies):
+    """
+    Build the specification of a topology made of copies of a real one. Every copy has its own hosts, switches,
+    addresses and DPIDs, and every slice groups the hosts of every copy like the real slice.
+
+    Args:
+        spec (dict): The specification of the topology.
+        copies (int): The number of copies.
+
+    Returns:
+        dict: The specification.
+    """
+    replicated = {**spec, "hosts": {}, "switches": {}, "links": [], "slices": [{**slice_spec, "groups": [], "links": [], "entries": []} for slice_spec in spec["slices"]]}
+    for copy in range(copies):
+        name = lambda node: f"{node}_{copy}"
+        for index, host in enumerate(spec["hosts"], 1):
+            replicated["hosts"][name(host)] = {
+                "ip": f"10.{copy // 256}.{copy % 256}.{index}",
+                "mac": f"00:00:00:{copy >> 8:02x}:{copy & 0xff:02x}:{index:02x}",
+            }
+        for switch, attributes in spec["switches"].items():
+            replicated["switches"][name(switch)] = {"dpid": attributes["dpid"] + copy * len(spec["switches"])}
+        for link in spec["links"]:
+            replicated["links"].append({**link, "nodes": [name(node) for node in link["nodes"]]})
+        for slice_spec, copied in zip(spec["slices"], replicated["slices"]):
+            copied["groups"].extend([name(host) for host in group] for group in slice_spec["groups"])
+            copied["links"].extend([name(switch) for switch in link] for link in slice_spec.get("links", ()))
+            copied["entries"].extend(
+                {**entry, "switch": name(entry["switch"]), "to": name(entry["to"]),
+                 "sources": [name(host) for host in entry["sources"]], "destinations": [name(host) for host in entry["destinations"]]}
+                for entry in slice_spec.get("entries", ())
+            )
+    for original, copied in zip(spec["slices"], replicated["slices"]):
+        if "links" not in original:
+            del copied["links"]
+    return replicated
+
+
+def transition_rules(index):
+    """
+    Convert a forwarding index into the rule set of a transition, one flow entry per pair of hosts of every switch.
+
+    Args:
+        index (dict): The forwarding index {(dpid, src, dst): out_ports}.
+
+    Returns:
+        dict: A dictionary {dpid: {(None, src, dst): out_ports}}.
+    """
+    rules = {}
+    for (dpid, src, dst), out_ports in index.items():
+        rules.setdefault(dpid, {})[(None, src, dst)] = out_ports
+    return rules
+
+
+def bench_real_tables():
+    """
+    Time the generation of the real slice tables of both topologies.
+    """
+    print("Mode switch table generation (real topologies)")
+    print(f"{'topology':<18}{'scenario':>10}{'rebuilt (us)':>15}{'cached (us)':>15}{'speedup':>10}")
+    first = load_utils("first_topology")
+    for scenario in range(4):
+        rebuilt = best_of(lambda: first.build_slice_to_port(scenario), 200)
+        cached = best_of(lambda: first.slice_to_port(scenario), 20000)
+        print(f"{'first':<18}{scenario:>10}{rebuilt:>15.2f}{cached:>15.3f}{rebuilt / cached:>9.0f}x")
+
+    second = load_utils("second_topology")
+    rebuilt = best_of(second.build_slice_to_port, 200)
+    cached = best_of(second.slice_to_port, 20000)
+    print(f"{'second':<18}{'all':>10}{rebuilt:>15.2f}{cached:>15.3f}{rebuilt / cached:>9.0f}x")
+
+
+def bench_scaling():
+    """
+    Time the steps of a mode switch on topologies made of copies of the real ones, as the host count grows.
+    """
+    print()
+    print("Mode switch on generated topologies")
+    print(f"{'topology':<9}{'hosts':>8}{'switches':>10}{'tables (ms)':>13}{'index (ms)':>12}{'transition (ms)':>17}{'flow-mods':>11}")
+    for topology in ("first_topology", "second_topology"):
+        utils = load_utils(topology)
+        first = topology.startswith("first")
+        if first:
+            index_of = lambda tables, scenario: utils.build_forwarding_index(tables[scenario])
+            before, after = FIRST_SWITCH
+        else:
+            index_of = utils.build_forwarding_index
+            before, after = SECOND_SWITCH
+        host_count = len(utils.MAC_MAPPING)
+        for hosts in HOST_COUNTS:
+            copies = max(1, hosts // host_count)
+            spec = replicate_spec(utils.SPEC, copies)
+            tables = utils.SpecCompiler(spec).compile()
+            old_rules = transition_rules(index_of(tables, before))
+
+            def mode_switch():
+                engine = TransitionEngine()
+                engine.rules = old_rules
+                return engine.transition(transition_rules(index_of(tables, after)))
+
+            number = max(1, 200 // copies)
+            generation = best_of(lambda: utils.SpecCompiler(spec).compile(), max(1, number // 10)) / 1000
+            index = best_of(lambda: index_of(tables, after), number) / 1000
+            plan = best_of(mode_switch, number) / 1000
+            flow_mods = sum(len(to_delete) + len(to_add) for to_delete, to_add in mode_switch().values())
+            switches = copies * len(utils.DPID_MAPPING)
+            print(f"{topology.split('_')[0]:<9}{copies * host_count:>8}{switches:>10}{generation:>13.2f}{index:>12.2f}{plan:>17.2f}{flow_mods:>11}")
+
+
+if __name__ == "__main__":
+    bench_real_tables()
+    bench_scaling()
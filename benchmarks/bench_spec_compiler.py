@@ -0,0 +1,84 @@
+"""
+Benchmark of the specification compiler on large synthetic topologies.
+
+Every topology is a two-tier leaf-spine fabric with hosts attached to the leaves. Each slice groups
+the hosts in small sets spread over different leaves.
+
+Run it from the repository root with: python3 benchmarks/bench_spec_compiler.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "topologies"))
+
+from spec_compiler import SpecCompiler
+
+# (spines, leaves, hosts per leaf, slices, hosts per group)
+SIZES = [
+    (4, 16, 10, 4, 4),
+    (8, 96, 10, 4, 4),
+    (16, 284, 10, 4, 4),
+    (16, 484, 10, 4, 4),
+]
+# Number of compilations of every specification, the best one is reported
+ROUNDS = 3
+
+
+def build_spec(spines, leaves, hosts_per_leaf, slices, group_size, routing):
+    """
+    Build a synthetic leaf-spine specification.
+
+    Args:
+        spines (int): The number of spine switches.
+        leaves (int): The number of leaf switches.
+        hosts_per_leaf (int): The number of hosts attached to every leaf.
+        slices (int): The number of slices.
+        group_size (int): The number of hosts of every group.
+        routing (str): "shortest" or "widest".
+
+    Returns:
+        dict: The specification.
+    """
+    rng = random.Random(42)
+    spec = {"address": "ipv4", "routing": routing, "hosts": {}, "switches": {}, "links": [], "slices": []}
+    for i in range(spines + leaves):
+        spec["switches"][f"s{i + 1}"] = {"dpid": i + 1}
+
+    for leaf in range(leaves):
+        leaf_name = f"s{spines + leaf + 1}"
+        for spine in range(spines):
+            spec["links"].append({"nodes": [leaf_name, f"s{spine + 1}"], "ports": [spine + 1, leaf + 1], "bw": rng.choice([10, 40, 100])})
+        for port in range(hosts_per_leaf):
+            host_index = leaf * hosts_per_leaf + port + 1
+            host_name = f"h{host_index}"
+            spec["hosts"][host_name] = {
+                "ip": f"10.{host_index // 65536}.{host_index // 256 % 256}.{host_index % 256}",
+                "mac": f"00:00:00:{host_index // 65536:02x}:{host_index // 256 % 256:02x}:{host_index % 256:02x}",
+            }
+            spec["links"].append({"nodes": [leaf_name, host_name], "ports": [spines + port + 1, 1], "bw": 10})
+
+    hosts = list(spec["hosts"])
+    for index in range(slices):
+        rng.shuffle(hosts)
+        groups = [hosts[i:i + group_size] for i in range(0, len(hosts), group_size)]
+        spec["slices"].append({"name": f"slice{index}", "groups": groups})
+    return spec
+
+
+if __name__ == "__main__":
+    print(f"{'switches':>9}{'hosts':>7}{'routing':>10}{'entries':>10}{'time (ms)':>11}")
+    for spines, leaves, hosts_per_leaf, slices, group_size in SIZES:
+        for routing in ("shortest", "widest"):
+            spec = build_spec(spines, leaves, hosts_per_leaf, slices, group_size, routing)
+            times = []
+            for _ in range(ROUNDS):
+                tables = None
+                start = time.perf_counter()
+                tables = SpecCompiler(spec).compile()
+                times.append(time.perf_counter() - start)
+            elapsed = min(times) * 1000
+            entries = sum(len(dsts) for table in tables.values() for sources in table.values() for dsts in sources.values())
+            print(f"{len(spec['switches']):>9}{len(spec['hosts']):>7}{routing:>10}{entries:>10}{elapsed:>11.1f}")
@@ -0,0 +1,250 @@
+"""
+Mock OVSDB server speaking the JSON-RPC protocol of ovsdb-server (RFC 7047), without Open vSwitch.
+
+It keeps the Port, QoS and Queue tables in memory and supports the transact, echo and list_dbs methods with the
+insert, select, update, delete and wait operations. Every transaction is atomic: when an operation fails none of
+them is applied, and the transaction fails if a row it deletes is still referenced when it commits. A delay can be
+added to every commit to emulate the disk write of ovsdb-server.
+
+It is used by bench_qos.py, and can be started on its own to try the QoS backends of the second topology:
+python3 benchmarks/mock_ovsdb.py [port]
+then set ovsdb_remote = "tcp:127.0.0.1:<port>" in topologies/second_topology/qos.py.
+"""
+import copy
+import json
+import socketserver
+import sys
+import threading
+import time
+import uuid
+
+# Ports of the switches of the second topology with QoS
+DEFAULT_PORTS = ["s3-eth3", "s2-eth4", "s2-eth5", "s2-eth6", "s1-eth3", "s1-eth4", "s4-eth4", "s4-eth5"]
+
+
+class TransactionError(Exception):
+    """
+    Error of an operation, which aborts the transaction.
+    """
+    def __init__(self, error, details=""):
+        super().__init__(error)
+        self.error = error
+        self.details = details
+
+
+class MockOvsdb:
+    """
+    In-memory Open_vSwitch database.
+
+    Attributes:
+        tables (dict): The rows of every table, {table: {uuid: row}}, with the values in the OVSDB JSON notation.
+        commit_delay (float): The seconds added to every commit.
+        transactions (int): The number of transactions received.
+        busy_time (float): The seconds spent applying the transactions, including the commit delays.
+    """
+    def __init__(self, ports=DEFAULT_PORTS, commit_delay=0):
+        self.tables = {"Port": {}, "QoS": {}, "Queue": {}}
+        for name in ports:
+            self.tables["Port"][str(uuid.uuid4())] = {"name": name, "qos": ["set", []]}
+        self.commit_delay = commit_delay
+        self.transactions = 0
+        self.busy_time = 0.0
+        self.lock = threading.Lock()
+
+    def transact(self, operations):
+        """
+        Apply the operations of a transaction atomically.
+
+        Args:
+            operations (list): The operations.
+
+        Returns:
+            list: The result of every operation, with an error and null for the following ones if one fails.
+        """
+        with self.lock:
+            start = time.perf_counter()
+            try:
+                return self.commit(operations)
+            finally:
+                self.busy_time += time.perf_counter() - start
+
+    def commit(self, operations):
+        """
+        Apply the operations of a transaction to a copy of the tables, which replaces them if no operation fails.
+        """
+        self.transactions += 1
+        tables = copy.deepcopy(self.tables)
+        named_uuids = {}
+        deleted = []
+        results = []
+        for operation in operations:
+            try:
+                results.append(self.apply(tables, named_uuids, deleted, operation))
+            except TransactionError as error:
+                results.append({"error": error.error, "details": error.details})
+                return results + [None] * (len(operations) - len(results))
+        # As in ovsdb-server, the references to the deleted rows are checked when the transaction commits
+        for row_uuid in deleted:
+            if referenced(tables, row_uuid):
+                results.append({"error": "referential integrity violation", "details": f"row {row_uuid} is still referenced"})
+                return results
+        if self.commit_delay:
+            time.sleep(self.commit_delay)
+        self.tables = tables
+        return results
+
+    def apply(self, tables, named_uuids, deleted, operation):
+        """
+        Apply an operation to a copy of the tables.
+        """
+        if operation.get("table") not in tables:
+            raise TransactionError("unknown table", str(operation.get("table")))
+        table = tables[operation["table"]]
+        op = operation["op"]
+
+        if op == "insert":
+            row_uuid = str(uuid.uuid4())
+            if "uuid-name" in operation:
+                named_uuids[operation["uuid-name"]] = row_uuid
+            table[row_uuid] = resolve(operation["row"], named_uuids)
+            return {"uuid": ["uuid", row_uuid]}
+
+        rows = [row_uuid for row_uuid, row in table.items() if matches(row_uuid, row, operation.get("where", []))]
+        if op == "select":
+            columns = operation.get("columns")
+            return {"rows": [project(row_uuid, table[row_uuid], columns) for row_uuid in rows]}
+        if op == "update":
+            for row_uuid in rows:
+                table[row_uuid].update(resolve(operation["row"], named_uuids))
+            return {"count": len(rows)}
+        if op == "delete":
+            for row_uuid in rows:
+                del table[row_uuid]
+                deleted.append(row_uuid)
+            return {"count": len(rows)}
+        if op == "wait":
+            selected = [project(row_uuid, table[row_uuid], operation["columns"]) for row_uuid in rows]
+            equal = sorted(map(json.dumps, selected)) == sorted(map(json.dumps, operation["rows"]))
+            if equal != (operation["until"] == "=="):
+                raise TransactionError("timed out", f"wait on {operation['table']} where {operation.get('where', [])}")
+            return {}
+        raise TransactionError("not supported", f"unknown operation {op}")
+
+
+def resolve(value, named_uuids):
+    """
+    Replace the named UUIDs of a value with the UUIDs of the rows inserted in the transaction.
+    """
+    if isinstance(value, list):
+        if len(value) == 2 and value[0] == "named-uuid":
+            if value[1] not in named_uuids:
+                raise TransactionError("syntax error", f"unknown named-uuid {value[1]}")
+            return ["uuid", named_uuids[value[1]]]
+        return [resolve(item, named_uuids) for item in value]
+    if isinstance(value, dict):
+        return {key: resolve(item, named_uuids) for key, item in value.items()}
+    return value
+
+
+def matches(row_uuid, row, where):
+    """
+    Check whether a row satisfies the "==" and "!=" conditions of an operation.
+    """
+    for column, function, value in where:
+        current = ["uuid", row_uuid] if column == "_uuid" else row.get(column)
+        if function not in ("==", "!="):
+            raise TransactionError("not supported", f"unknown function {function}")
+        if (current == value) != (function == "=="):
+            return False
+    return True
+
+
+def project(row_uuid, row, columns):
+    """
+    Get the given columns of a row, all of them if columns is None.
+    """
+    full_row = {"_uuid": ["uuid", row_uuid], **row}
+    return {column: full_row.get(column) for column in (columns or full_row)}
+
+
+def referenced(tables, row_uuid):
+    """
+    Check whether a row is referenced by another row.
+    """
+    reference = json.dumps(["uuid", row_uuid])
+    return any(reference in json.dumps(row) for table in tables.values() for row in table.values())
+
+
+class MockOvsdbServer(socketserver.ThreadingTCPServer):
+    """
+    TCP server answering the JSON-RPC requests with a MockOvsdb.
+
+    Attributes:
+        database (MockOvsdb): The database.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, database=None):
+        super().__init__((host, port), MockOvsdbHandler)
+        self.database = database or MockOvsdb()
+
+    @property
+    def remote(self):
+        """
+        The address of the server in the notation of the OVSDB clients, "tcp:<host>:<port>".
+        """
+        host, port = self.server_address[:2]
+        return f"tcp:{host}:{port}"
+
+    def start(self):
+        """
+        Serve the requests in a background thread.
+
+        Args: None
+
+        Returns:
+            MockOvsdbServer: The server.
+        """
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class MockOvsdbHandler(socketserver.BaseRequestHandler):
+    """
+    Connection of a client, the JSON-RPC messages are not delimited and are decoded incrementally.
+    """
+    def handle(self):
+        decoder = json.JSONDecoder()
+        buffer = ""
+        while True:
+            data = self.request.recv(65536)
+            if not data:
+                return
+            buffer += data.decode("utf-8")
+            while buffer.strip():
+                try:
+                    message, end = decoder.raw_decode(buffer.lstrip())
+                except ValueError:
+                    break
+                buffer = buffer.lstrip()[end:]
+                self.request.sendall(json.dumps(self.answer(message)).encode("utf-8"))
+
+    def answer(self, message):
+        """
+        Answer a JSON-RPC request.
+        """
+        method, params = message.get("method"), message.get("params", [])
+        if method == "echo":
+            return {"result": params, "error": None, "id": message.get("id")}
+        if method == "list_dbs":
+            return {"result": ["Open_vSwitch"], "error": None, "id": message.get("id")}
+        if method == "transact" and params and params[0] == "Open_vSwitch":
+            return {"result": self.server.database.transact(params[1:]), "error": None, "id": message.get("id")}
+        return {"result": None, "error": {"error": "unknown method", "details": str(method)}, "id": message.get("id")}
+
+
+if __name__ == "__main__":
+    server = MockOvsdbServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 6640)
+    print(f"Mock OVSDB server listening on {server.remote}")
+    server.serve_forever()
@@ -0,0 +1,364 @@
+"""
+Minimal OpenFlow 1.3 switch emulator used by the benchmarks, so that the real controllers can be run without mininet and Open vSwitch.
+
+Every emulated switch connects to the controller over TCP and:
+- answers the hello, features, echo, barrier, port description and statistics requests (the statistics are empty)
+- keeps a flow table updated by the add, delete and delete-strict flow-mods
+- supports the atomic bundles of the ONF extension, unless it is created with bundles=False, in which case it rejects them with an error
+- can send packet-ins, so that the controller installs its reactive flow entries
+
+The flow-mods are decoded with the Ryu parser, so Ryu must be installed.
+"""
+import asyncio
+import struct
+import time
+
+from ryu.ofproto import ofproto_common, ofproto_v1_3, ofproto_v1_3_parser
+
+HEADER = struct.Struct("!BBHI")
+FEATURES = struct.Struct("!QIBB2xII")
+MULTIPART = struct.Struct("!HH4x")
+ERROR = struct.Struct("!HH")
+EXPERIMENTER = struct.Struct("!II")
+BUNDLE_CTRL = struct.Struct("!IHH")
+BUNDLE_ADD = struct.Struct("!I2xH")
+QUEUE_CONFIG = struct.Struct("!I4x")
+PACKET_IN = struct.Struct("!IHBBQ")
+# OXM match with the in_port field only, padded to 8 bytes, followed by the 2 padding bytes of the packet-in
+IN_PORT_MATCH = struct.Struct("!HHII4x2x")
+
+
+class ParserDatapath:
+    """
+    Datapath given to the Ryu parser when decoding the messages of the controller.
+    """
+    ofproto = ofproto_v1_3
+    ofproto_parser = ofproto_v1_3_parser
+    id = None
+
+
+class EmulatedSwitch:
+    """
+    OpenFlow 1.3 switch with a single connection to the controller.
+
+    Attributes:
+        dpid (int): The DPID of the switch.
+        bundles (bool): Whether the switch supports the ONF bundles.
+        flows (dict): The flow table {(table_id, priority, match): (instructions, output ports)}, with hashable descriptions
+            of the match and of the instructions.
+        on_change (callable): Called with the switch after every change of the flow table.
+        connected (asyncio.Event): Set when the controller has asked for the port description, i.e. the handshake is over.
+        flow_mods (int): The number of flow-mods applied.
+    """
+    def __init__(self, dpid, bundles=True, on_change=None):
+        self.dpid = dpid
+        self.bundles = bundles
+        self.flows = {}
+        self.on_change = on_change
+        self.connected = asyncio.Event()
+        self.flow_mods = 0
+        self._open_bundles = {}
+        self._writer = None
+
+    async def run(self, host, port):
+        """
+        Connect to the controller and handle its messages until the connection is closed.
+
+        Args:
+            host (str): The address of the controller.
+            port (int): The OpenFlow port of the controller.
+
+        Returns:
+            None
+        """
+        reader, self._writer = await asyncio.open_connection(host, port)
+        self._send(ofproto_v1_3.OFPT_HELLO, 0)
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                version, msg_type, length, xid = HEADER.unpack(header)
+                body = await reader.readexactly(length - HEADER.size)
+                self.handle(msg_type, xid, header + body)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writer.close()
+
+    def close(self):
+        """
+        Close the connection to the controller.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self._writer is not None:
+            self._writer.close()
+
+    def _send(self, msg_type, xid, body=b""):
+        """
+        Send a message to the controller.
+        """
+        self._writer.write(HEADER.pack(ofproto_v1_3.OFP_VERSION, msg_type, HEADER.size + len(body), xid) + body)
+
+    def _send_error(self, xid, error_type, code, request):
+        """
+        Send an error about a request, with the first 64 bytes of the request as data.
+        """
+        self._send(ofproto_v1_3.OFPT_ERROR, xid, ERROR.pack(error_type, code) + request[:64])
+
+    def packet_in(self, in_port, data):
+        """
+        Send a table-miss packet-in to the controller.
+
+        Args:
+            in_port (int): The port receiving the packet.
+            data (bytes): The frame.
+
+        Returns:
+            None
+        """
+        body = PACKET_IN.pack(ofproto_v1_3.OFP_NO_BUFFER, len(data), ofproto_v1_3.OFPR_NO_MATCH, 0, 0)
+        body += IN_PORT_MATCH.pack(ofproto_v1_3.OFPMT_OXM, 12, ofproto_v1_3.OXM_OF_IN_PORT, in_port)
+        self._send(ofproto_v1_3.OFPT_PACKET_IN, 0, body + data)
+
+    def handle(self, msg_type, xid, buf):
+        """
+        Handle a message of the controller.
+
+        Args:
+            msg_type (int): The type of the message.
+            xid (int): The transaction id of the message.
+            buf (bytes): The whole message, header included.
+
+        Returns:
+            None
+        """
+        if msg_type == ofproto_v1_3.OFPT_ECHO_REQUEST:
+            self._send(ofproto_v1_3.OFPT_ECHO_REPLY, xid, buf[HEADER.size:])
+        elif msg_type == ofproto_v1_3.OFPT_FEATURES_REQUEST:
+            self._send(ofproto_v1_3.OFPT_FEATURES_REPLY, xid, FEATURES.pack(self.dpid, 0, 1, 0, 0, 0))
+        elif msg_type == ofproto_v1_3.OFPT_BARRIER_REQUEST:
+            self._send(ofproto_v1_3.OFPT_BARRIER_REPLY, xid)
+        elif msg_type == ofproto_v1_3.OFPT_MULTIPART_REQUEST:
+            stats_type = MULTIPART.unpack_from(buf, HEADER.size)[0]
+            self._send(ofproto_v1_3.OFPT_MULTIPART_REPLY, xid, MULTIPART.pack(stats_type, 0))
+            if stats_type == ofproto_v1_3.OFPMP_PORT_DESC:
+                self.connected.set()
+        elif msg_type == ofproto_v1_3.OFPT_QUEUE_GET_CONFIG_REQUEST:
+            port_no = QUEUE_CONFIG.unpack_from(buf, HEADER.size)[0]
+            self._send(ofproto_v1_3.OFPT_QUEUE_GET_CONFIG_REPLY, xid, QUEUE_CONFIG.pack(port_no))
+        elif msg_type == ofproto_v1_3.OFPT_FLOW_MOD:
+            self.apply(self.parse_flow_mod(xid, buf))
+        elif msg_type == ofproto_v1_3.OFPT_EXPERIMENTER:
+            self.handle_experimenter(xid, buf)
+
+    def handle_experimenter(self, xid, buf):
+        """
+        Handle the bundle messages of the ONF extension, the other experimenter messages are rejected.
+        """
+        experimenter, exp_type = EXPERIMENTER.unpack_from(buf, HEADER.size)
+        offset = HEADER.size + EXPERIMENTER.size
+        if not self.bundles or experimenter != ofproto_common.ONF_EXPERIMENTER_ID:
+            self._send_error(xid, ofproto_v1_3.OFPET_BAD_REQUEST, ofproto_v1_3.OFPBRC_BAD_EXPERIMENTER, buf)
+            return
+
+        if exp_type == ofproto_v1_3.ONF_ET_BUNDLE_ADD_MESSAGE:
+            bundle_id, flags = BUNDLE_ADD.unpack_from(buf, offset)
+            inner = buf[offset + BUNDLE_ADD.size:]
+            inner_type, inner_length, inner_xid = HEADER.unpack_from(inner)[1:]
+            if bundle_id not in self._open_bundles or inner_type != ofproto_v1_3.OFPT_FLOW_MOD:
+                self._send_error(xid, ofproto_v1_3.OFPET_BAD_REQUEST, ofproto_v1_3.OFPBRC_BAD_TYPE, buf)
+                return
+            self._open_bundles[bundle_id].append(self.parse_flow_mod(inner_xid, inner[:inner_length]))
+        elif exp_type == ofproto_v1_3.ONF_ET_BUNDLE_CONTROL:
+            bundle_id, ctrl_type, flags = BUNDLE_CTRL.unpack_from(buf, offset)
+            if ctrl_type == ofproto_v1_3.ONF_BCT_OPEN_REQUEST:
+                self._open_bundles[bundle_id] = []
+            elif ctrl_type == ofproto_v1_3.ONF_BCT_COMMIT_REQUEST:
+                # The flow-mods of the bundle are applied all together
+                for flow_mod in self._open_bundles.pop(bundle_id, []):
+                    self.apply(flow_mod, notify=False)
+                self._notify()
+            elif ctrl_type == ofproto_v1_3.ONF_BCT_DISCARD_REQUEST:
+                self._open_bundles.pop(bundle_id, None)
+            elif ctrl_type != ofproto_v1_3.ONF_BCT_CLOSE_REQUEST:
+                self._send_error(xid, ofproto_v1_3.OFPET_BAD_REQUEST, ofproto_v1_3.OFPBRC_BAD_EXP_TYPE, buf)
+                return
+            # Every request is answered with the matching reply type
+            body = EXPERIMENTER.pack(experimenter, exp_type) + BUNDLE_CTRL.pack(bundle_id, ctrl_type + 1, flags)
+            self._send(ofproto_v1_3.OFPT_EXPERIMENTER, xid, body)
+
+    @staticmethod
+    def parse_flow_mod(xid, buf):
+        """
+        Decode a flow-mod with the Ryu parser.
+
+        Args:
+            xid (int): The transaction id of the message.
+            buf (bytes): The whole message.
+
+        Returns:
+            OFPFlowMod: The flow-mod.
+        """
+        return ofproto_v1_3_parser.OFPFlowMod.parser(ParserDatapath(), ofproto_v1_3.OFP_VERSION, ofproto_v1_3.OFPT_FLOW_MOD, len(buf), xid, buf)
+
+    @staticmethod
+    def describe_actions(flow_mod):
+        """
+        Get a hashable description of the instructions of a flow-mod and its output ports.
+        """
+        ports = frozenset(
+            action.port
+            for instruction in flow_mod.instructions
+            for action in getattr(instruction, "actions", [])
+            if isinstance(action, ofproto_v1_3_parser.OFPActionOutput)
+        )
+        return tuple(str(instruction) for instruction in flow_mod.instructions), ports
+
+    def apply(self, flow_mod, notify=True):
+        """
+        Apply a flow-mod to the flow table.
+
+        Args:
+            flow_mod (OFPFlowMod): The flow-mod.
+            notify (bool): Whether to call on_change after the change.
+
+        Returns:
+            None
+        """
+        self.flow_mods += 1
+        match = tuple(sorted(flow_mod.match.items()))
+        if flow_mod.command == ofproto_v1_3.OFPFC_ADD:
+            self.flows[(flow_mod.table_id, flow_mod.priority, match)] = self.describe_actions(flow_mod)
+        elif flow_mod.command in (ofproto_v1_3.OFPFC_DELETE, ofproto_v1_3.OFPFC_DELETE_STRICT):
+            strict = flow_mod.command == ofproto_v1_3.OFPFC_DELETE_STRICT
+            fields = set(match)
+            for key, actions in list(self.flows.items()):
+                table_id, priority, entry_match = key
+                if flow_mod.table_id not in (ofproto_v1_3.OFPTT_ALL, table_id):
+                    continue
+                if strict and (priority != flow_mod.priority or entry_match != match):
+                    continue
+                # A non-strict delete removes the entries that are at least as specific as its match
+                if not strict and not fields <= set(entry_match):
+                    continue
+                if flow_mod.out_port != ofproto_v1_3.OFPP_ANY and flow_mod.out_port not in actions[1]:
+                    continue
+                del self.flows[key]
+        if notify:
+            self._notify()
+
+    def _notify(self):
+        """
+        Call on_change after a change of the flow table.
+        """
+        if self.on_change is not None:
+            self.on_change(self)
+
+
+class Fabric:
+    """
+    Group of emulated switches connected to the same controller, tracking when their flow tables change.
+
+    Attributes:
+        switches (dict): The emulated switches {dpid: EmulatedSwitch}.
+        target (callable): Called with the DPID and the flow table of a switch, returns whether the table is the
+            expected one. None if no target is set.
+        matched_at (dict): The last time the flow table of every switch became one matching the target {dpid: time}.
+        last_change (float): The time of the last change of any flow table.
+    """
+    def __init__(self, host="127.0.0.1", port=6633, bundles=True):
+        self.host = host
+        self.port = port
+        self.bundles = bundles
+        self.switches = {}
+        self.target = None
+        self.matched_at = {}
+        self.last_change = time.perf_counter()
+        self._tasks = []
+
+    async def add_switches(self, dpids, timeout=60):
+        """
+        Connect new switches and wait until the controller has completed their handshake.
+
+        Args:
+            dpids (iterable): The DPIDs of the new switches.
+            timeout (float): The maximum time in seconds to wait.
+
+        Returns:
+            None
+        """
+        new = [EmulatedSwitch(dpid, self.bundles, self._changed) for dpid in dpids]
+        for switch in new:
+            self.switches[switch.dpid] = switch
+            self._tasks.append(asyncio.ensure_future(switch.run(self.host, self.port)))
+        await asyncio.wait_for(asyncio.gather(*(switch.connected.wait() for switch in new)), timeout)
+
+    def _changed(self, switch):
+        """
+        Record the change of the flow table of a switch.
+        """
+        now = time.perf_counter()
+        self.last_change = now
+        if self.target is not None:
+            self.matched_at[switch.dpid] = now if self.target(switch.dpid, switch.flows) else None
+
+    async def settle(self, quiet=0.3, timeout=30):
+        """
+        Wait until no flow table has changed for quiet seconds since the call, so that the messages
+        sent just before, which the controller may not have handled yet, are taken into account.
+
+        Args:
+            quiet (float): The time in seconds without changes.
+            timeout (float): The maximum time in seconds to wait.
+
+        Returns:
+            None
+        """
+        start = time.perf_counter()
+        while time.perf_counter() < start + timeout:
+            idle = time.perf_counter() - max(start, self.last_change)
+            if idle >= quiet:
+                return
+            await asyncio.sleep(quiet - idle)
+
+    def expect(self, target):
+        """
+        Set the expected flow tables, the switches whose table already matches are considered matched now.
+
+        Args:
+            target (callable): Called with the DPID and the flow table of a switch, returns whether the table is the expected one.
+
+        Returns:
+            None
+        """
+        self.target = target
+        now = time.perf_counter()
+        self.matched_at = {dpid: now if target(dpid, switch.flows) else None for dpid, switch in self.switches.items()}
+
+    def converged(self):
+        """
+        Check whether every switch has its expected flow table.
+
+        Args: None
+
+        Returns:
+            bool: True if every flow table matches the target.
+        """
+        return all(matched is not None for matched in self.matched_at.values())
+
+    def close(self):
+        """
+        Disconnect every switch.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        for switch in self.switches.values():
+            switch.close()
+        for task in self._tasks:
+            task.cancel()
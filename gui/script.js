@@ -91,18 +91,23 @@ function updateSliceMode(topology, url, caption, activeBtn, ...inactiveBtns) {
         document.getElementById("connectionStatus").style.color = "red"
         throw new Error('ERROR ' + response.statusText)
       }
-      return response.text()
+      return response.json()
     })
     .then(data => {
-      document.getElementById("connectionStatus").textContent = "Slicing mode update was successful"
-      document.getElementById("connectionStatus").style.color = "green"
+      if(data.converged) {
+        document.getElementById("connectionStatus").textContent = "Slicing mode update was successful (applied in " + data.convergence_ms + " ms)"
+        document.getElementById("connectionStatus").style.color = "green"
+      } else {
+        document.getElementById("connectionStatus").textContent = "Slicing mode updated, but some switches did not confirm the change"
+        document.getElementById("connectionStatus").style.color = "orange"
+      }
       if(topology === "first") {
         document.getElementById("firstTopology").textContent = "Current: " + caption
       } else {
-        data = data.split(",").map(value => modeCaptions[value.trim()]).join(", ")
-        if(!data)
-          data = "Default mode"
-        document.getElementById("secondTopology").textContent = "Current: " + data
+        let modes = data.modes.split(",").map(value => modeCaptions[value.trim()]).join(", ")
+        if(!modes)
+          modes = "Default mode"
+        document.getElementById("secondTopology").textContent = "Current: " + modes
       }
       toggleButtonColor(topology, activeBtn, ...inactiveBtns)
     })
@@ -153,11 +158,44 @@ function updateQoS() {
       document.getElementById("connectionStatus").style.color = "red"
       throw new Error('ERROR ' + response.statusText)
     }
-    return response.text()
+    return response.json()
   })
   .then(data => {
-    document.getElementById("connectionStatus").textContent = "Values updated correctly"
+    document.getElementById("connectionStatus").textContent = "Updating the values..."
     document.getElementById("connectionStatus").style.color = "green"
+    checkQoSJob(data.job_id)
+  })
+  .catch(error => {
+    document.getElementById("connectionStatus").textContent = "An error occurred during the update of the values"
+    document.getElementById("connectionStatus").style.color = "red"
+    throw new Error('ERROR ' + error)
+  })
+}
+
+/**
+ * Poll the status of a QoS job until it finishes and show its result
+ * @param {number} jobId - The id of the job returned when the values were sent
+ */
+function checkQoSJob(jobId) {
+  fetch(baseURL + "second/qos/jobs/" + jobId)
+  .then(response => {
+    if (!response.ok) {
+      throw new Error('ERROR ' + response.statusText)
+    }
+    return response.json()
+  })
+  .then(job => {
+    if (job.state === "queued" || job.state === "running") {
+      document.getElementById("connectionStatus").textContent = "Updating the values... " + Math.round(job.progress * 100) + "%"
+      setTimeout(() => checkQoSJob(jobId), 500)
+    } else if (job.state === "done") {
+      document.getElementById("connectionStatus").textContent = "Values updated correctly"
+      document.getElementById("connectionStatus").style.color = "green"
+    } else if (job.state === "failed") {
+      document.getElementById("connectionStatus").textContent = "An error occurred during the update of the values"
+      document.getElementById("connectionStatus").style.color = "red"
+    }
+    // A superseded job is replaced by a newer one, which updates the status
   })
   .catch(error => {
     document.getElementById("connectionStatus").textContent = "An error occurred during the update of the values"
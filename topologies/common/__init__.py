@@ -0,0 +1,3 @@
+"""
+Modules shared by the controllers of both topologies.
+"""
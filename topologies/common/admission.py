@@ -0,0 +1,133 @@
+import time
+
+
+class PendingInstalls:
+    """
+    Remember the flow entries sent to the switches in the last ttl seconds, so that the packet-ins
+    arriving before a switch installs a flow entry do not send the same flow-mod again.
+
+    Attributes:
+        ttl (float): The time in seconds after which a flow entry is no longer considered pending.
+        pending (dict): The expiry time of every pending flow entry {(dpid, match_key, value): expiry},
+            in insertion order, so the oldest entries are the first to expire.
+        duplicates (dict): The number of repeated packet-ins answered with a packet-out only {dpid: count}.
+    """
+    def __init__(self, ttl=1.0):
+        self.ttl = ttl
+        self.pending = {}
+        self.duplicates = {}
+
+    def _expire(self, now):
+        """
+        Remove the flow entries that are no longer pending.
+        """
+        while self.pending:
+            key = next(iter(self.pending))
+            if self.pending[key] > now:
+                break
+            del self.pending[key]
+
+    def claim(self, dpid, match_key, value):
+        """
+        Check whether a flow entry must be sent to a switch, and mark it as pending if so.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            match_key (tuple): The key identifying the match of the flow entry.
+            value: The value describing the actions of the flow entry.
+
+        Returns:
+            bool: True if the flow entry must be sent, False if the same flow entry is already being installed.
+        """
+        now = time.monotonic()
+        self._expire(now)
+        key = (dpid, match_key, value)
+        if key in self.pending:
+            self.duplicates[dpid] = self.duplicates.get(dpid, 0) + 1
+            return False
+        self.pending[key] = now + self.ttl
+        return True
+
+    def clear(self, dpid=None):
+        """
+        Forget the pending flow entries of a switch, or of every switch, e.g. after its flow table changed.
+
+        Args:
+            dpid (int): The DPID of the switch, if None every switch.
+
+        Returns:
+            None
+        """
+        if dpid is None:
+            self.pending.clear()
+        else:
+            self.pending = {key: expiry for key, expiry in self.pending.items() if key[0] != dpid}
+
+
+class PacketInLimiter:
+    """
+    Token bucket limiting the packet-ins handled for every switch, the excess packet-ins are shed.
+
+    Attributes:
+        rate (float): The packet-ins per second accepted from a switch, if None nothing is shed.
+        burst (int): The maximum number of packet-ins accepted at once from a switch.
+        buckets (dict): The state of the bucket of every switch {dpid: [tokens, last refill time]}.
+        admitted (dict): The number of packet-ins accepted {dpid: count}.
+        shed (dict): The number of packet-ins shed {dpid: count}.
+    """
+    def __init__(self, rate=None, burst=100):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.admitted = {}
+        self.shed = {}
+
+    def allow(self, dpid):
+        """
+        Take a token from the bucket of a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            bool: True if the packet-in can be handled, False if it must be shed.
+        """
+        if self.rate is not None:
+            now = time.monotonic()
+            bucket = self.buckets.get(dpid)
+            if bucket is None:
+                bucket = self.buckets[dpid] = [self.burst, now]
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                self.shed[dpid] = self.shed.get(dpid, 0) + 1
+                return False
+            bucket[0] -= 1
+        self.admitted[dpid] = self.admitted.get(dpid, 0) + 1
+        return True
+
+    def forget(self, dpid):
+        """
+        Reset the bucket of a switch, e.g. when it disconnects.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            None
+        """
+        self.buckets.pop(dpid, None)
+
+    def counters(self):
+        """
+        Get the packet-in counters of every switch.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {dpid: {"admitted", "shed"}}.
+        """
+        return {
+            dpid: {"admitted": self.admitted.get(dpid, 0), "shed": self.shed.get(dpid, 0)}
+            for dpid in set(self.admitted) | set(self.shed)
+        }
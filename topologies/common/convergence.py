@@ -0,0 +1,215 @@
+import time
+
+from ryu.lib import hub
+
+from .structured_log import StructuredLogger
+
+log = StructuredLogger("convergence")
+
+
+class Transaction:
+    """
+    Collect the messages of a mode change, grouped by switch, so that they can be applied together.
+
+    Attributes:
+        messages (dict): A dictionary {dpid: (datapath, [messages])}.
+    """
+    def __init__(self):
+        self.messages = {}
+
+    def add(self, datapath, msg):
+        """
+        Add a message for a switch.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            msg (MsgBase): The OpenFlow message.
+
+        Returns:
+            None
+        """
+        self.messages.setdefault(datapath.id, (datapath, []))[1].append(msg)
+
+
+class Waiter:
+    """
+    Wait for a switch to acknowledge the messages of a transaction.
+
+    Attributes:
+        method (str): "bundle" or "barrier".
+        event (hub.Event): Set when the switch replies.
+        start (float): The time at which the messages were sent.
+        end (float): The time at which the switch replied.
+        errors (list): The errors sent by the switch.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.event = hub.Event()
+        self.start = time.perf_counter()
+        self.end = None
+        self.errors = []
+
+    def done(self):
+        """
+        Mark the transaction as acknowledged by the switch.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self.end is None:
+            self.end = time.perf_counter()
+        self.event.set()
+
+
+class ConvergenceTracker:
+    """
+    Apply the transactions of mode changes and measure how long every switch takes to converge.
+
+    The messages of each switch are wrapped in an atomic OpenFlow 1.3 bundle (ONF extension), so that
+    the switch never runs a half-applied slice. If a switch rejects bundles the messages are sent
+    followed by a barrier request, and the barrier reply is used as acknowledgment.
+
+    Attributes:
+        use_bundles (bool): Whether to try bundles before barriers.
+        timeout (float): The maximum time in seconds to wait for the switches.
+        unsupported (set): The switches that rejected bundles.
+        waiting (dict): The waiters of the in-flight transactions {(dpid, xid): Waiter}.
+    """
+    def __init__(self, use_bundles=True, timeout=5.0):
+        self.use_bundles = use_bundles
+        self.timeout = timeout
+        self.unsupported = set()
+        self.waiting = {}
+        self.bundle_id = 0
+
+    def _send(self, datapath, msg, waiter):
+        """
+        Send a message and register the waiter for its replies and errors.
+        """
+        datapath.set_xid(msg)
+        self.waiting[(datapath.id, msg.xid)] = waiter
+        datapath.send_msg(msg)
+        return msg.xid
+
+    def _send_bundle(self, datapath, messages):
+        """
+        Send the messages of a switch in an atomic bundle, followed by the commit request.
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        waiter = Waiter("bundle")
+        self.bundle_id = (self.bundle_id + 1) & 0xffffffff
+        bundle_id = self.bundle_id
+
+        self._send(datapath, parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_OPEN_REQUEST, ofproto.ONF_BF_ATOMIC, []), waiter)
+        for msg in messages:
+            self._send(datapath, parser.ONFBundleAddMsg(datapath, bundle_id, ofproto.ONF_BF_ATOMIC, msg, []), waiter)
+        self._send(datapath, parser.ONFBundleCtrlMsg(datapath, bundle_id, ofproto.ONF_BCT_COMMIT_REQUEST, ofproto.ONF_BF_ATOMIC, []), waiter)
+        return waiter
+
+    def _send_barrier(self, datapath, messages):
+        """
+        Send the messages of a switch followed by a barrier request.
+        """
+        waiter = Waiter("barrier")
+        for msg in messages:
+            self._send(datapath, msg, waiter)
+        self._send(datapath, datapath.ofproto_parser.OFPBarrierRequest(datapath), waiter)
+        return waiter
+
+    def _forget(self, waiter):
+        """
+        Remove the registrations of a waiter.
+        """
+        for key in [key for key, value in self.waiting.items() if value is waiter]:
+            del self.waiting[key]
+
+    def commit(self, transaction, bundles=True, datapaths=None):
+        """
+        Send the messages of a transaction to every switch and wait until all of them have acknowledged them.
+        The messages are sent to every switch before waiting, so the switches converge in parallel.
+
+        Args:
+            transaction (Transaction): The transaction to apply.
+            bundles (bool): Whether the messages can be sent in a bundle, Open vSwitch only bundles flow-mods and port-mods.
+            datapaths (dict): The connected switches {dpid: datapath}, the ones without messages are reported as converged.
+
+        Returns:
+            dict: A dictionary {dpid: {"method", "flow_mods", "converged", "time_ms"}}, method is None for the switches without messages.
+        """
+        waiters = {}
+        for dpid, (datapath, messages) in transaction.messages.items():
+            if bundles and self.use_bundles and dpid not in self.unsupported:
+                waiters[dpid] = self._send_bundle(datapath, messages)
+            else:
+                waiters[dpid] = self._send_barrier(datapath, messages)
+
+        deadline = time.perf_counter() + self.timeout
+        report = {}
+        for dpid, waiter in waiters.items():
+            datapath, messages = transaction.messages[dpid]
+            waiter.event.wait(max(0, deadline - time.perf_counter()))
+            self._forget(waiter)
+
+            if waiter.method == "bundle" and waiter.errors:
+                # The bundle was rejected as a whole, so nothing was applied: retry without bundles
+                log.warning("bundle rejected, falling back to barriers", dpid=dpid)
+                self.unsupported.add(dpid)
+                for msg in messages:
+                    # The messages took the xids of the bundle when it was serialized, they are sent again as new messages
+                    msg.xid = None
+                    msg.buf = None
+                start = waiter.start
+                waiter = self._send_barrier(datapath, messages)
+                waiter.start = start
+                waiter.event.wait(max(0, deadline - time.perf_counter()))
+                self._forget(waiter)
+
+            converged = waiter.end is not None and not waiter.errors
+            report[dpid] = {
+                "method": waiter.method,
+                "flow_mods": len(messages),
+                "converged": converged,
+                "time_ms": round((waiter.end - waiter.start) * 1000, 3) if waiter.end is not None else None,
+            }
+        for dpid in datapaths or ():
+            if dpid not in report:
+                # Nothing to change on the switch
+                report[dpid] = {"method": None, "flow_mods": 0, "converged": True, "time_ms": 0.0}
+        return report
+
+    def reply(self, dpid, xid):
+        """
+        Handle a barrier reply or a bundle commit reply.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            xid (int): The transaction id of the reply.
+
+        Returns:
+            None
+        """
+        waiter = self.waiting.get((dpid, xid))
+        if waiter is not None:
+            waiter.done()
+
+    def error(self, dpid, xid, msg):
+        """
+        Handle an error sent by a switch. An error on a bundle fails the whole bundle.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            xid (int): The transaction id of the message that caused the error.
+            msg (OFPErrorMsg): The error message.
+
+        Returns:
+            None
+        """
+        waiter = self.waiting.get((dpid, xid))
+        if waiter is None:
+            return
+        waiter.errors.append((msg.type, msg.code))
+        if waiter.method == "bundle":
+            waiter.done()
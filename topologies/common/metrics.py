@@ -0,0 +1,254 @@
+import time
+from bisect import bisect_left
+
+# Content type of the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds of the histogram buckets, from 100 us to 10 s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value):
+    """
+    Escape a label value for the text exposition format.
+
+    Args:
+        value: The label value.
+
+    Returns:
+        str: The escaped value.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(label_names, label_values, extra=""):
+    """
+    Format the labels of a sample.
+
+    Args:
+        label_names (tuple): The names of the labels.
+        label_values (tuple): The values of the labels.
+        extra (str): An additional formatted label, e.g. the bucket of a histogram.
+
+    Returns:
+        str: The labels between braces, or an empty string if there are none.
+    """
+    labels = [f'{name}="{escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """
+    Monotonic counter, with a value for every combination of label values.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        label_names (tuple): The names of the labels.
+        values (dict): The value of every combination of label values {label_values: value}.
+    """
+    kind = "counter"
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values = {}
+
+    def inc(self, label_values=(), amount=1):
+        """
+        Increment the counter.
+
+        Args:
+            label_values (tuple): The values of the labels, in the order of label_names.
+            amount (float): The increment.
+
+        Returns:
+            None
+        """
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def samples(self):
+        """
+        Get the lines of the samples of the metric.
+
+        Args: None
+
+        Returns:
+            list: The lines in text exposition format.
+        """
+        return [f"{self.name}{format_labels(self.label_names, labels)} {value}" for labels, value in self.values.items()]
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down, with a value for every combination of label values.
+    """
+    kind = "gauge"
+
+    def set(self, label_values=(), value=0):
+        """
+        Set the value of the gauge.
+
+        Args:
+            label_values (tuple): The values of the labels, in the order of label_names.
+            value (float): The new value.
+
+        Returns:
+            None
+        """
+        self.values[label_values] = value
+
+
+class Timer:
+    """
+    Context manager observing the time spent in its block in a histogram.
+    """
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, self.label_values)
+        return False
+
+
+class Histogram:
+    """
+    Distribution of observed values in cumulative buckets, with a distribution for every combination of label values.
+
+    Attributes:
+        name (str): The name of the metric.
+        documentation (str): The help text of the metric.
+        label_names (tuple): The names of the labels.
+        buckets (tuple): The upper bounds of the buckets, in increasing order.
+        values (dict): The bucket counts, the sum and the count of every combination of label values
+            {label_values: [bucket_counts, sum, count]}.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.values = {}
+
+    def observe(self, value, label_values=()):
+        """
+        Observe a value.
+
+        Args:
+            value (float): The observed value, e.g. a duration in seconds.
+            label_values (tuple): The values of the labels, in the order of label_names.
+
+        Returns:
+            None
+        """
+        state = self.values.get(label_values)
+        if state is None:
+            state = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += value
+        state[2] += 1
+
+    def time(self, label_values=()):
+        """
+        Get a context manager observing the time spent in its block.
+
+        Args:
+            label_values (tuple): The values of the labels, in the order of label_names.
+
+        Returns:
+            Timer: The context manager.
+        """
+        return Timer(self, label_values)
+
+    def samples(self):
+        """
+        Get the lines of the samples of the metric.
+
+        Args: None
+
+        Returns:
+            list: The lines in text exposition format.
+        """
+        lines = []
+        for labels, (bucket_counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                bucket = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, bucket)} {cumulative}")
+            bucket = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, bucket)} {count}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of the metrics of a controller, exposed in the Prometheus text exposition format.
+
+    Attributes:
+        metrics (list): The registered metrics.
+    """
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Register a metric.
+
+        Args:
+            metric (Counter | Gauge | Histogram): The metric.
+
+        Returns:
+            Counter | Gauge | Histogram: The registered metric.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, label_names=()):
+        """
+        Create and register a counter.
+        """
+        return self.register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()):
+        """
+        Create and register a gauge.
+        """
+        return self.register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        """
+        Create and register a histogram.
+        """
+        return self.register(Histogram(name, documentation, label_names, buckets))
+
+    def expose(self):
+        """
+        Get every metric in the Prometheus text exposition format.
+
+        Args: None
+
+        Returns:
+            str: The exposition text.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,118 @@
+import struct
+from collections import namedtuple
+from socket import inet_ntoa
+
+from ryu.lib.packet import packet, ethernet, ether_types, ipv4, tcp, udp, icmp
+from ryu.ofproto import inet
+
+# The header fields used by the controllers, l4_proto is set only if the TCP, UDP or ICMP header
+# is present and l4_dst only for TCP and UDP
+Headers = namedtuple("Headers", ["eth_dst", "eth_src", "ethertype", "ipv4_src", "ipv4_dst", "l4_proto", "l4_dst"])
+
+ETH_HEADER = struct.Struct("!6s6sH")
+IPV4_HEADER = struct.Struct("!BxHxxHxB2x4s4s")
+L4_DST_PORT = struct.Struct("!2xH")
+
+# Minimum length of the transport headers read by the fast path
+L4_MIN_LEN = {inet.IPPROTO_TCP: 20, inet.IPPROTO_UDP: 8, inet.IPPROTO_ICMP: 4}
+
+
+def parse_fast(data):
+    """
+    Parse the Ethernet, IPv4 and TCP/UDP/ICMP header fields of a frame without building the Ryu packet.
+    The fields are read in place through a memoryview, so only the returned values are allocated.
+
+    Args:
+        data (bytes): The frame.
+
+    Returns:
+        Headers: The header fields, or None if the frame needs the full parser (VLAN tags, IPv4 fragments, truncated headers).
+    """
+    view = memoryview(data)
+    if len(view) < ETH_HEADER.size:
+        return None
+    eth_dst, eth_src, ethertype = ETH_HEADER.unpack_from(view)
+    eth_dst = eth_dst.hex(":")
+    eth_src = eth_src.hex(":")
+    if ethertype != ether_types.ETH_TYPE_IP:
+        if ethertype in (ether_types.ETH_TYPE_8021Q, ether_types.ETH_TYPE_8021AD):
+            return None
+        return Headers(eth_dst, eth_src, ethertype, None, None, None, None)
+
+    view = view[ETH_HEADER.size:]
+    if len(view) < IPV4_HEADER.size:
+        return None
+    version_ihl, total_length, flags_offset, proto, src, dst = IPV4_HEADER.unpack_from(view)
+    header_length = (version_ihl & 0xf) * 4
+    if flags_offset & 0x1fff or header_length < IPV4_HEADER.size or total_length < header_length:
+        return None
+
+    min_len = L4_MIN_LEN.get(proto)
+    if min_len is None:
+        return Headers(eth_dst, eth_src, ethertype, inet_ntoa(src), inet_ntoa(dst), None, None)
+    if min(total_length, len(view)) - header_length < min_len:
+        return None
+    l4_dst = None if proto == inet.IPPROTO_ICMP else L4_DST_PORT.unpack_from(view, header_length)[0]
+    return Headers(eth_dst, eth_src, ethertype, inet_ntoa(src), inet_ntoa(dst), proto, l4_dst)
+
+
+def parse_full(data):
+    """
+    Parse the header fields of a frame with the Ryu packet library.
+
+    Args:
+        data (bytes): The frame.
+
+    Returns:
+        Headers: The header fields.
+    """
+    pkt = packet.Packet(data)
+    eth = pkt.get_protocol(ethernet.ethernet)
+    ipv4_pkt = pkt.get_protocol(ipv4.ipv4)
+    if ipv4_pkt is None:
+        return Headers(eth.dst, eth.src, eth.ethertype, None, None, None, None)
+
+    for cls in (tcp.tcp, udp.udp, icmp.icmp):
+        l4_pkt = pkt.get_protocol(cls)
+        if l4_pkt is not None:
+            l4_dst = getattr(l4_pkt, "dst_port", None)
+            return Headers(eth.dst, eth.src, eth.ethertype, ipv4_pkt.src, ipv4_pkt.dst, ipv4_pkt.proto, l4_dst)
+    return Headers(eth.dst, eth.src, eth.ethertype, ipv4_pkt.src, ipv4_pkt.dst, None, None)
+
+
+def parse_headers(data):
+    """
+    Parse the header fields of a frame, falling back to the Ryu packet library only
+    for the frames the fast path does not handle.
+
+    Args:
+        data (bytes): The frame.
+
+    Returns:
+        Headers: The header fields.
+    """
+    headers = parse_fast(data)
+    if headers is None:
+        headers = parse_full(data)
+    return headers
+
+
+def classify_traffic(headers):
+    """
+    Get the traffic class of a frame: HTTP, DNS, ICMP or general IPv4 traffic.
+
+    Args:
+        headers (Headers): The header fields of the frame.
+
+    Returns:
+        str: One of "http", "dns", "icmp", "general" or "non_ip" for the frames without an IPv4 header.
+    """
+    if headers.ipv4_src is None:
+        return "non_ip"
+    if headers.l4_proto == inet.IPPROTO_TCP and headers.l4_dst == 80:
+        return "http"
+    if headers.l4_proto == inet.IPPROTO_UDP and headers.l4_dst == 53:
+        return "dns"
+    if headers.l4_proto == inet.IPPROTO_ICMP:
+        return "icmp"
+    return "general"
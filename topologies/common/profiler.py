@@ -0,0 +1,161 @@
+import os
+import sys
+
+from eventlet import patcher
+
+# ryu-manager monkey patches threading and time, the sampler needs a real thread that
+# keeps running while the green threads of the controller are busy
+real_thread = patcher.original("_thread")
+real_threading = patcher.original("threading")
+real_time = patcher.original("time")
+
+# Directory of the eventlet hubs, whose wait function is running when the controller is idle
+IDLE_PATH = os.path.join("eventlet", "hubs", "")
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler sampling, at a fixed interval, the stack running in the thread of the Ryu hub.
+    The samples are aggregated as collapsed stacks ("frame;frame;frame count"), the input format of
+    flamegraph.pl and speedscope.
+
+    The sampler runs in a real thread, so it also sees the green threads that never yield.
+    The memory is bounded by max_stacks and max_depth, and the profiler stops by itself after max_duration seconds.
+
+    Attributes:
+        interval (float): The seconds between two samples.
+        max_duration (float): The seconds after which the profiler stops.
+        max_depth (int): The maximum number of frames of a stack, the outermost are dropped.
+        max_stacks (int): The maximum number of distinct stacks, the others are counted as "[truncated]".
+        include_idle (bool): Whether to keep the samples taken while the hub waits for events.
+        stacks (dict): The number of samples of every stack {stack: count}.
+        samples (int): The number of samples taken.
+    """
+    def __init__(self, interval=0.01, max_duration=600, max_depth=64, max_stacks=20000, include_idle=False):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self.include_idle = include_idle
+        self.stacks = {}
+        self.samples = 0
+        self.started = None
+        self.stopped = None
+        self._target = None
+        self._thread = None
+        self._stop = real_threading.Event()
+
+    def running(self):
+        """
+        Check whether the profiler is sampling.
+
+        Args: None
+
+        Returns:
+            bool: True if the sampler thread is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        """
+        Start sampling the thread calling this method, which is the thread of the Ryu hub.
+        The samples of the previous run are discarded.
+
+        Args:
+            interval (float): The seconds between two samples, if None the current interval is kept.
+
+        Returns:
+            bool: False if the profiler was already running.
+        """
+        if self.running():
+            return False
+        if interval is not None:
+            self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.started = real_time.time()
+        self.stopped = None
+        self._target = real_thread.get_ident()
+        self._stop.clear()
+        self._thread = real_threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """
+        Stop sampling.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+
+    def _run(self):
+        """
+        Take samples until the profiler is stopped or max_duration is reached.
+        """
+        deadline = real_time.monotonic() + self.max_duration
+        while not self._stop.is_set() and real_time.monotonic() < deadline:
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                break
+            self._sample(frame)
+            del frame
+            real_time.sleep(self.interval)
+        self.stopped = real_time.time()
+
+    def _sample(self, frame):
+        """
+        Add the stack of a frame to the samples.
+        """
+        # The innermost frame is the poll of the eventlet hub when there is nothing to do
+        code = frame.f_code
+        if not self.include_idle and code.co_name == "wait" and IDLE_PATH in code.co_filename:
+            return
+
+        stack = []
+        while frame is not None and len(stack) < self.max_depth:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        stack = tuple(reversed(stack))
+        if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+            stack = ("[truncated]",)
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def collapsed(self):
+        """
+        Get the samples as collapsed stacks, from the most frequent.
+
+        Args: None
+
+        Returns:
+            str: One line "frame;frame;frame count" for every stack, from the outermost frame.
+        """
+        # Copying the dictionary is atomic, so the sampler thread can keep running
+        stacks = dict(self.stacks)
+        lines = [f"{';'.join(stack)} {count}" for stack, count in sorted(stacks.items(), key=lambda item: -item[1])]
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def status(self):
+        """
+        Get the state of the profiler.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {"running", "interval", "samples", "stacks", "started", "stopped"}.
+        """
+        return {
+            "running": self.running(),
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "started": self.started,
+            "stopped": self.stopped,
+        }
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+# Version of the snapshot format, a snapshot written with another version is ignored
+SNAPSHOT_VERSION = 1
+
+
+def freeze(value):
+    """
+    Convert the lists of a decoded JSON value back into tuples, as the match keys and values of the rule sets.
+
+    Args:
+        value: The decoded JSON value.
+
+    Returns:
+        The value with every list converted into a tuple.
+    """
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Snapshot:
+    """
+    Persist the state of a controller (active modes, QoS rates, rule sets) in a compact JSON file, so that
+    a restarted controller resumes it instead of starting from an empty state. The file is written to a
+    temporary file and then renamed, so that a crash never leaves a partial snapshot, and only when the
+    state changed since the last write.
+
+    Attributes:
+        path (str): The path of the snapshot file, None to disable the snapshots.
+        saved (float): The time of the last write.
+        size (int): The size in bytes of the last snapshot written.
+        last_text (str): The content of the last snapshot written.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.saved = None
+        self.size = 0
+        self.last_text = None
+
+    def save(self, modes, rules, **state):
+        """
+        Write the state of the controller, if it changed since the last write.
+
+        Args:
+            modes: The active modes, as JSON values.
+            rules (dict): The rule set of every switch {dpid: {match_key: value}}.
+            **state: Other JSON values of the state, e.g. the QoS rates.
+
+        Returns:
+            bool: True if the snapshot was written.
+        """
+        if self.path is None:
+            return False
+        snapshot = {
+            "version": SNAPSHOT_VERSION,
+            "modes": modes,
+            **state,
+            "rules": {str(dpid): [[match_key, value] for match_key, value in switch_rules.items()] for dpid, switch_rules in rules.items()},
+        }
+        text = json.dumps(snapshot, separators=(",", ":"))
+        if text == self.last_text:
+            return False
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as output_file:
+            output_file.write(text)
+        os.replace(temporary_path, self.path)
+        self.saved = time.time()
+        self.size = len(text)
+        self.last_text = text
+        return True
+
+    def load(self):
+        """
+        Read the last snapshot.
+
+        Args: None
+
+        Returns:
+            dict: The snapshot, whose rules are {dpid: {match_key: value}} with tuples, None if there is no
+            valid snapshot.
+        """
+        if self.path is None or not os.path.isfile(self.path):
+            return None
+        try:
+            with open(self.path) as input_file:
+                text = input_file.read()
+            snapshot = json.loads(text)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(snapshot, dict) or snapshot.get("version") != SNAPSHOT_VERSION:
+            return None
+        snapshot["rules"] = {
+            int(dpid): {freeze(match_key): freeze(value) for match_key, value in switch_rules}
+            for dpid, switch_rules in snapshot.get("rules", {}).items()
+        }
+        self.last_text = text
+        return snapshot
@@ -0,0 +1,219 @@
+from collections import deque
+
+# Counters of the port statistics kept for every port
+PORT_COUNTERS = ("rx_packets", "tx_packets", "rx_bytes", "tx_bytes", "rx_dropped", "tx_dropped", "rx_errors", "tx_errors")
+# Values of the samples that are not cumulative counters, so they have no rate
+GAUGES = ("flows",)
+
+
+class TimeSeries:
+    """
+    Fixed-size ring buffer of timestamped samples, the oldest sample is dropped when it is full.
+
+    Attributes:
+        samples (deque): The samples (timestamp, {counter: value}), from the oldest.
+    """
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+
+    def append(self, timestamp, values):
+        """
+        Add a sample.
+
+        Args:
+            timestamp (float): The time of the sample.
+            values (dict): The value of every counter.
+
+        Returns:
+            None
+        """
+        self.samples.append((timestamp, values))
+
+    def rates(self):
+        """
+        Get the per-second rate of every counter between the last two samples.
+        Counters that decreased, e.g. because a flow entry was replaced, have rate 0.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {counter: rate}, empty if there are less than two samples.
+        """
+        if len(self.samples) < 2:
+            return {}
+        (old_time, old_values), (new_time, new_values) = self.samples[-2], self.samples[-1]
+        elapsed = new_time - old_time
+        if elapsed <= 0:
+            return {}
+        return {
+            counter: round(max(0, value - old_values.get(counter, 0)) / elapsed, 3)
+            for counter, value in new_values.items() if isinstance(value, (int, float)) and counter not in GAUGES
+        }
+
+    def to_list(self):
+        """
+        Get the samples in a JSON serializable form.
+
+        Args: None
+
+        Returns:
+            list: The samples [{"time", counter: value}], from the oldest.
+        """
+        return [{"time": timestamp, **values} for timestamp, values in self.samples]
+
+    def summary(self):
+        """
+        Get the last sample and the current rates.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {"latest", "rates"}.
+        """
+        latest = {"time": self.samples[-1][0], **self.samples[-1][1]} if self.samples else None
+        return {"latest": latest, "rates": self.rates()}
+
+
+class StatsStore:
+    """
+    Keep the statistics polled from the switches with bounded memory: the flow statistics of
+    the last complete reply of every switch and a ring buffer for every port and every slice.
+
+    Attributes:
+        history (int): The number of samples of every time series.
+        flows (dict): The flow statistics of the last complete reply {dpid: [OFPFlowStats]}.
+        ports (dict): The time series of every port {dpid: {port_no: TimeSeries}}.
+        slices (dict): The time series of every slice {slice_name: TimeSeries}.
+    """
+    def __init__(self, history=60):
+        self.history = history
+        self.flows = {}
+        self.ports = {}
+        self.slices = {}
+        self._partial_flows = {}
+
+    def add_flow_stats(self, dpid, body, more):
+        """
+        Add a flow statistics reply, which may be split over several multipart messages.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            body (list): The OFPFlowStats of the message.
+            more (bool): Whether more messages of the same reply follow.
+
+        Returns:
+            None
+        """
+        partial = self._partial_flows.setdefault(dpid, [])
+        partial.extend(body)
+        if not more:
+            self.flows[dpid] = self._partial_flows.pop(dpid)
+
+    def add_port_stats(self, dpid, body, timestamp):
+        """
+        Add a port statistics reply. The local port of the switch is ignored.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            body (list): The OFPPortStats of the message.
+            timestamp (float): The time of the reply.
+
+        Returns:
+            None
+        """
+        ports = self.ports.setdefault(dpid, {})
+        for stat in body:
+            if stat.port_no > 0xffffff00:
+                continue
+            series = ports.get(stat.port_no)
+            if series is None:
+                series = ports[stat.port_no] = TimeSeries(self.history)
+            series.append(timestamp, {counter: getattr(stat, counter) for counter in PORT_COUNTERS})
+
+    def add_slice_samples(self, timestamp, slices):
+        """
+        Add a sample for every slice. The slices already known but not in the sample get a zero sample,
+        so that all the time series are aligned.
+
+        Args:
+            timestamp (float): The time of the sample.
+            slices (dict): The counters of every slice {slice_name: {counter: value}}.
+
+        Returns:
+            None
+        """
+        for slice_name in set(self.slices) | set(slices):
+            series = self.slices.get(slice_name)
+            if series is None:
+                series = self.slices[slice_name] = TimeSeries(self.history)
+            series.append(timestamp, slices.get(slice_name, {"flows": 0, "packets": 0, "bytes": 0}))
+
+    def forget(self, dpid):
+        """
+        Forget the statistics of a switch, e.g. when it disconnects.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            None
+        """
+        self.flows.pop(dpid, None)
+        self.ports.pop(dpid, None)
+        self._partial_flows.pop(dpid, None)
+
+    def summary(self):
+        """
+        Get the last sample and the current rates of every slice and port.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {"slices": {slice_name: summary}, "ports": {dpid: {port_no: summary}}}.
+        """
+        return {
+            "slices": {slice_name: series.summary() for slice_name, series in self.slices.items()},
+            "ports": {
+                str(dpid): {str(port_no): series.summary() for port_no, series in ports.items()}
+                for dpid, ports in self.ports.items()
+            },
+        }
+
+
+def aggregate_slices(entries):
+    """
+    Aggregate the flow statistics of the switches by slice.
+    The packets of a pair of hosts cross every switch of its path, so the counters of a pair
+    are the ones of the switch that forwarded the most bytes, instead of the sum over the switches.
+
+    Args:
+        entries (list): The attributed flow statistics (dpid, (src, dst), slice_names, traffic_class, packets, bytes),
+            traffic_class is None if the topology has no traffic classes.
+
+    Returns:
+        dict: A dictionary {slice_name: {"flows", "packets", "bytes"}}, with the bytes of every
+        traffic class in "classes" if the topology has traffic classes.
+    """
+    per_switch = {}
+    for dpid, pair, slice_names, traffic_class, packets, byte_count in entries:
+        key = (pair, traffic_class, slice_names, dpid)
+        old_packets, old_bytes = per_switch.get(key, (0, 0))
+        per_switch[key] = (old_packets + packets, old_bytes + byte_count)
+
+    per_pair = {}
+    for (pair, traffic_class, slice_names, dpid), counters in per_switch.items():
+        key = (pair, traffic_class, slice_names)
+        if key not in per_pair or counters[1] > per_pair[key][1]:
+            per_pair[key] = counters
+
+    slices = {}
+    for (pair, traffic_class, slice_names), (packets, byte_count) in per_pair.items():
+        for slice_name in slice_names:
+            totals = slices.setdefault(slice_name, {"flows": 0, "packets": 0, "bytes": 0})
+            totals["flows"] += 1
+            totals["packets"] += packets
+            totals["bytes"] += byte_count
+            if traffic_class is not None:
+                classes = totals.setdefault("classes", {})
+                classes[traffic_class] = classes.get(traffic_class, 0) + byte_count
+    return slices
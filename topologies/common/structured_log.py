@@ -0,0 +1,181 @@
+import json
+import logging
+import sys
+
+from eventlet import patcher
+
+# ryu-manager monkey patches threading and queue, the records are written by a real thread
+# so that a slow terminal or disk never blocks the green threads of the controller
+real_queue = patcher.original("queue")
+real_threading = patcher.original("threading")
+
+# Name of the logger receiving the records of the controllers, the StructuredLogger are its children
+ROOT_LOGGER = "slicing"
+
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Format a record and its fields as "time level logger event key=value ..." or as a JSON object.
+
+    Attributes:
+        json_format (bool): Whether to write a JSON object on every line.
+    """
+    def __init__(self, json_format=False):
+        super().__init__()
+        self.json_format = json_format
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        if self.json_format:
+            entry = {"time": record.created, "level": record.levelname, "logger": record.name, "event": record.getMessage(), **fields}
+            return json.dumps(entry, default=str)
+        line = f"{self.formatTime(record)} {record.levelname} {record.name} {record.getMessage()}"
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class QueueLogHandler(logging.Handler):
+    """
+    Handler putting the records in a bounded queue emptied by a writer thread, which formats them
+    and writes them to the target handler. When the queue is full the records are dropped and counted.
+
+    Attributes:
+        target (logging.Handler): The handler writing the records.
+        queue (Queue): The records waiting to be written.
+        dropped (int): The number of records dropped because the queue was full.
+    """
+    def __init__(self, target, queue_size=10000):
+        super().__init__()
+        self.target = target
+        self.queue = real_queue.Queue(queue_size)
+        self.dropped = 0
+        self.writer = real_threading.Thread(target=self._write, name="log-writer", daemon=True)
+        self.writer.start()
+
+    def emit(self, record):
+        # The record is formatted by the writer thread, so its fields must not be changed after logging it
+        try:
+            self.queue.put_nowait(record)
+        except real_queue.Full:
+            self.dropped += 1
+
+    def _write(self):
+        """
+        Write the records until the None sentinel is received.
+        """
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            self.target.handle(record)
+
+    def close(self):
+        """
+        Write the records still in the queue and stop the writer thread.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join(timeout=5)
+        self.target.close()
+        super().close()
+
+
+def setup_logging(level="INFO", json_format=False, queue_size=10000, stream=None):
+    """
+    Send the records of the controllers to a queue written by a background thread.
+    Calling it again returns the handler already installed.
+
+    Args:
+        level (str): The minimum level of the records written.
+        json_format (bool): Whether to write the records as JSON objects instead of key=value pairs.
+        queue_size (int): The maximum number of records waiting to be written.
+        stream: The stream the records are written to, sys.stdout if None.
+
+    Returns:
+        QueueLogHandler: The handler of the records.
+    """
+    logger = logging.getLogger(ROOT_LOGGER)
+    for handler in logger.handlers:
+        if isinstance(handler, QueueLogHandler):
+            return handler
+
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(StructuredFormatter(json_format))
+    # Only the writer thread uses the target, its lock must be a real one
+    target.lock = real_threading.RLock()
+    handler = QueueLogHandler(target, queue_size)
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    # The records are not written again by the handlers of Ryu
+    logger.propagate = False
+    return handler
+
+
+class StructuredLogger:
+    """
+    Logger of records made of an event name and key=value fields, e.g. log.info("switch connected", dpid=1).
+    The records of events repeated for every packet can be sampled with the packet method.
+
+    Attributes:
+        logger (logging.Logger): The logger of the records.
+        sample_every (int): The packet method logs one record every sample_every calls.
+        sampled_out (int): The number of packet records skipped by the sampling.
+    """
+    def __init__(self, name, sample_every=1):
+        self.logger = logging.getLogger(f"{ROOT_LOGGER}.{name}")
+        self.sample_every = max(1, sample_every)
+        self.sampled_out = 0
+        self._calls = 0
+
+    def log(self, level, event, **fields):
+        """
+        Log a record if its level is enabled.
+
+        Args:
+            level (int): The level of the record.
+            event (str): The name of the event.
+            **fields: The fields of the record.
+
+        Returns:
+            None
+        """
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, extra={"fields": fields})
+
+    def debug(self, event, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event, **fields):
+        self.log(logging.ERROR, event, **fields)
+
+    def packet(self, event, **fields):
+        """
+        Log a per-packet record at the INFO level, keeping only one record every sample_every calls.
+
+        Args:
+            event (str): The name of the event.
+            **fields: The fields of the record.
+
+        Returns:
+            None
+        """
+        self._calls += 1
+        if self._calls < self.sample_every:
+            self.sampled_out += 1
+            return
+        self._calls = 0
+        if self.sample_every > 1:
+            fields["sample_every"] = self.sample_every
+        self.log(logging.INFO, event, **fields)
@@ -0,0 +1,153 @@
+from itertools import islice
+
+
+class TransitionEngine:
+    """
+    Keep track of the flow entries installed by the controller on each switch and compute
+    the flow-mods needed to move from one rule set to another, so that a slice change only
+    touches the entries that actually differ.
+
+    Rule sets are dictionaries {dpid: {match_key: value}}, where match_key identifies the
+    match of a flow entry and value describes its actions. The installed rules of every switch
+    are kept from the oldest to the most recently installed.
+
+    Attributes:
+        base_flows (int): number of flow entries reinstalled on every switch after a full wipe.
+        rules (dict): the rule set currently installed on the switches.
+        last_report (dict): statistics of the last transition.
+    """
+    def __init__(self, base_flows=1):
+        self.base_flows = base_flows
+        self.rules = {}
+        self.last_report = None
+
+    def record(self, dpid, match_key, value):
+        """
+        Record a flow entry installed on a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            match_key (tuple): The key identifying the match of the flow entry.
+            value: The value describing the actions of the flow entry.
+
+        Returns:
+            None
+        """
+        rules = self.rules.setdefault(dpid, {})
+        rules.pop(match_key, None)
+        rules[match_key] = value
+
+    def discard(self, dpid, match_key):
+        """
+        Forget a flow entry removed from a switch, e.g. after a timeout.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            match_key (tuple): The key identifying the match of the flow entry.
+
+        Returns:
+            bool: True if the flow entry was recorded.
+        """
+        return self.rules.get(dpid, {}).pop(match_key, None) is not None
+
+    def oldest(self, dpid, count, selected=None):
+        """
+        Get the oldest flow entries recorded for a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            count (int): The maximum number of flow entries.
+            selected (callable): Called with the match key of every flow entry, returns True if it can be returned. Every entry if None.
+
+        Returns:
+            list: A list of (match_key, value) pairs, from the oldest.
+        """
+        entries = self.rules.get(dpid, {}).items()
+        if selected is not None:
+            entries = (entry for entry in entries if selected(entry[0]))
+        return list(islice(entries, count))
+
+    def forget(self, dpid):
+        """
+        Forget every flow entry recorded for a switch, e.g. when it disconnects.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            None
+        """
+        self.rules.pop(dpid, None)
+
+    def installed(self, dpid):
+        """
+        Get the flow entries recorded for a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            dict: A dictionary {match_key: value}.
+        """
+        return self.rules.get(dpid, {})
+
+    @staticmethod
+    def diff(old_rules, new_rules):
+        """
+        Compute the difference between two rule sets of the same switch.
+        A changed value does not need a delete, since an add with the same match and
+        priority overwrites the existing flow entry.
+
+        Args:
+            old_rules (dict): The rules currently installed {match_key: value}.
+            new_rules (dict): The rules that should be installed {match_key: value}.
+
+        Returns:
+            tuple: (to_delete, to_add, unchanged), where to_delete is a list of match keys,
+            to_add a list of (match_key, value) pairs and unchanged the number of kept entries.
+        """
+        to_delete = [key for key in old_rules if key not in new_rules]
+        to_add = [(key, value) for key, value in new_rules.items() if old_rules.get(key) != value]
+        unchanged = len(new_rules) - len(to_add)
+        return to_delete, to_add, unchanged
+
+    def transition(self, new_rules, dpids=None):
+        """
+        Compute the flow-mods needed to move every switch to the new rule set, make the
+        new rule set the installed one and store the statistics of the transition.
+
+        Args:
+            new_rules (dict): The rule set to install {dpid: {match_key: value}}.
+            dpids (set): The switches to move, None for all of them. The rules of the other switches are kept.
+
+        Returns:
+            dict: A dictionary {dpid: (to_delete, to_add)}.
+        """
+        plan = {}
+        report = {"switches": 0, "deleted": 0, "added": 0, "unchanged": 0, "sent": 0, "wipe": 0, "saved": 0}
+        if dpids is None:
+            dpids = set(self.rules) | set(new_rules)
+        for dpid in dpids:
+            to_delete, to_add, unchanged = self.diff(self.rules.get(dpid, {}), new_rules.get(dpid, {}))
+            plan[dpid] = (to_delete, to_add)
+            report["switches"] += 1
+            report["deleted"] += len(to_delete)
+            report["added"] += len(to_add)
+            report["unchanged"] += unchanged
+            # A full wipe sends one delete, reinstalls the base flows and every rule of the new set
+            report["wipe"] += 1 + self.base_flows + len(new_rules.get(dpid, {}))
+
+        report["sent"] = report["deleted"] + report["added"]
+        report["saved"] = report["wipe"] - report["sent"]
+        # Keep the age order: the unchanged entries first, then the ones just installed
+        installed = {dpid: rules for dpid, rules in self.rules.items() if dpid not in dpids}
+        for dpid in dpids:
+            rules = new_rules.get(dpid, {})
+            old_rules = self.rules.get(dpid, {})
+            kept = {key: value for key, value in old_rules.items() if key in rules and rules[key] == value}
+            kept.update((key, value) for key, value in rules.items() if key not in kept)
+            if kept:
+                installed[dpid] = kept
+        self.rules = installed
+        self.last_report = report
+        return plan
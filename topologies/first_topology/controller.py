@@ -3,11 +3,27 @@ from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, set_ev_cls, DEAD_DISPATCHER
 from ryu.ofproto import ofproto_v1_3
 from ryu.app.wsgi import ControllerBase, WSGIApplication, route
-from ryu.lib.packet import packet, ethernet, ether_types, ipv4
+from ryu.lib import hub
+from ryu.lib.packet import ether_types
 from webob import Response
 from enum import Enum
+import json
+import os
+import sys
+import time
 
-from utils import slice_to_port
+# The modules shared by the controllers of both topologies are in topologies/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import slice_to_port, build_forwarding_index
+from common.snapshot import Snapshot
+from common.transition import TransitionEngine
+from common.convergence import ConvergenceTracker, Transaction
+from common.packet_parser import parse_headers, classify_traffic
+from common.admission import PendingInstalls, PacketInLimiter
+from common.stats import StatsStore, aggregate_slices
+from common.metrics import MetricsRegistry, CONTENT_TYPE
+from common.profiler import SamplingProfiler
+from common.structured_log import StructuredLogger, setup_logging
 
 class FirstTopologyModes(Enum):
     """
@@ -23,6 +39,70 @@ current_mode = FirstTopologyModes.NO_GUEST
 first_slicing_instance_name = "first_slicing_api_app"
 url = "/controller/first"
 
+# When enabled, every flow entry of the active slice is pushed to the switches as soon as
+# the mode changes, instead of being installed one by one by the packet-in handler
+PROACTIVE_MODE = True
+
+# When enabled, a mode change only deletes and adds the flow entries that differ between
+# the old and the new slice, instead of wiping every flow table
+DIFF_TRANSITIONS = True
+
+# The flow-mods of a mode change are applied to each switch in an atomic bundle (or followed
+# by a barrier if the switch does not support bundles), and the REST call waits for the
+# switches to acknowledge them for at most CONVERGENCE_TIMEOUT seconds
+USE_BUNDLES = True
+CONVERGENCE_TIMEOUT = 5
+
+# Packet-ins accepted per second from each switch and maximum burst, the excess is shed (None disables the limit)
+PACKET_IN_RATE = 1000
+PACKET_IN_BURST = 200
+# Seconds during which a flow entry sent to a switch is considered being installed, so the repeated
+# packet-ins of the same flow are answered with a packet-out only
+PENDING_INSTALL_TTL = 1.0
+
+# Idle and hard timeouts in seconds of the flow entries installed by the packet-in handler (0 means no timeout),
+# the switches notify the controller when they expire
+REACTIVE_IDLE_TIMEOUT = 30
+REACTIVE_HARD_TIMEOUT = 300
+# Maximum number of flow entries of a switch, when FLOW_EVICTION is enabled the oldest slice flow entries
+# are deleted as soon as the switch uses more than EVICTION_THRESHOLD of its table
+FLOW_TABLE_LIMIT = 1000
+FLOW_EVICTION = False
+EVICTION_THRESHOLD = 0.9
+
+# The state of the controller (active mode and slice flow entries of every switch) is saved to SNAPSHOT_PATH
+# after every change, and every SNAPSHOT_INTERVAL seconds for the entries installed by the packet-ins (None
+# disables the snapshot). After a restart the state is restored, and the flow table of every switch is read
+# and reconciled with the snapshot instead of being wiped, waiting at most RECONCILE_TIMEOUT seconds
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot.json")
+SNAPSHOT_INTERVAL = 5
+RECONCILE_TIMEOUT = 5
+
+# Seconds between two polls of the flow and port statistics of the switches (0 disables the polling)
+# and number of samples kept for every port and slice
+STATS_INTERVAL = 10
+STATS_HISTORY = 60
+
+# Default seconds between two samples of the profiler started on the /profiler/start route
+# and seconds after which it stops by itself, so that a forgotten profiler does not run forever
+PROFILER_INTERVAL = 0.01
+PROFILER_MAX_DURATION = 600
+
+# The records of the controller are written by a background thread, as key=value pairs or as JSON objects.
+# One packet-in record every LOG_PACKET_SAMPLE is written, and the records are dropped if more
+# than LOG_QUEUE_SIZE are waiting to be written
+LOG_LEVEL = "INFO"
+LOG_JSON = False
+LOG_PACKET_SAMPLE = 1
+LOG_QUEUE_SIZE = 10000
+
+# Label of the flow-mod commands in the metrics
+FLOW_MOD_COMMANDS = {
+    ofproto_v1_3.OFPFC_ADD: "add",
+    ofproto_v1_3.OFPFC_DELETE: "delete",
+    ofproto_v1_3.OFPFC_DELETE_STRICT: "delete_strict",
+}
+
 class FirstSlicing(app_manager.RyuApp):
     """
     Ryu application for managing network slicing.
@@ -34,31 +114,122 @@ class FirstSlicing(app_manager.RyuApp):
     def __init__(self, *args, **kwargs):
         super(FirstSlicing, self).__init__(*args, **kwargs)
 
+        self.log_handler = setup_logging(LOG_LEVEL, LOG_JSON, LOG_QUEUE_SIZE)
+        self.log = StructuredLogger("first_controller", LOG_PACKET_SAMPLE)
         self.datapaths = {}
         self.slice_to_port = slice_to_port()
+        self.forwarding_index = build_forwarding_index(self.slice_to_port)
+        self.transition_engine = TransitionEngine(base_flows=1)
+        self.convergence = ConvergenceTracker(USE_BUNDLES, CONVERGENCE_TIMEOUT)
+        self.pending_installs = PendingInstalls(PENDING_INSTALL_TTL)
+        self.packet_in_limiter = PacketInLimiter(PACKET_IN_RATE, PACKET_IN_BURST)
+        self.flow_removed = {} # dpid -> {reason: number of flow entries removed}
+        self.stats = StatsStore(STATS_HISTORY)
+        self.init_metrics()
+        self.profiler = SamplingProfiler(PROFILER_INTERVAL, PROFILER_MAX_DURATION)
+        self.flow_table_requests = {} # (dpid, xid) -> (event set by the last reply, flow entries received)
+        self.snapshot = Snapshot(SNAPSHOT_PATH)
+        # dpid -> last known slice flow entries of a switch, saved before a restart of the controller or when the
+        # switch disconnected, until the switch connects and is reconciled with them
+        self.warm_rules = {}
+        self.reconnected = set() # DPIDs of the switches in warm_rules because they disconnected
+        self.restore_snapshot()
+        if STATS_INTERVAL:
+            self.stats_thread = hub.spawn(self._stats_loop)
+        if SNAPSHOT_PATH is not None and SNAPSHOT_INTERVAL:
+            self.snapshot_thread = hub.spawn(self._snapshot_loop)
 
         wsgi = kwargs["wsgi"]
         wsgi.register(FirstSlicingController, {first_slicing_instance_name: self})
 
+    def init_metrics(self):
+        """
+        Create the metrics exposed on the /metrics route.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        self.metrics = MetricsRegistry()
+        self.packet_in_counter = self.metrics.counter("sdn_packet_in_total", "Packet-ins handled.", ("dpid", "traffic_class"))
+        self.packet_in_shed_counter = self.metrics.counter("sdn_packet_in_shed_total", "Packet-ins shed by the rate limiter.", ("dpid",))
+        self.packet_in_latency = self.metrics.histogram("sdn_packet_in_handler_seconds", "Time spent handling a packet-in.")
+        self.flow_mod_counter = self.metrics.counter("sdn_flow_mods_total", "Flow-mods sent to the switches.", ("dpid", "command"))
+        self.packet_out_counter = self.metrics.counter("sdn_packet_outs_total", "Packet-outs sent to the switches.", ("dpid",))
+        self.mode_switch_duration = self.metrics.histogram("sdn_mode_switch_seconds", "Time needed to apply a mode change and wait for the switches.", ("mode",))
+        self.resync_duration = self.metrics.histogram("sdn_switch_resync_seconds", "Time needed to reconcile the flow table of a switch that connected.", ("reason",))
+        self.flow_entries_gauge = self.metrics.gauge("sdn_flow_entries", "Flow entries installed by the controller.", ("dpid",))
+        self.log_dropped_counter = self.metrics.counter("sdn_log_records_dropped_total", "Log records dropped because the log queue was full.")
+        self.log_sampled_counter = self.metrics.counter("sdn_log_packet_records_sampled_out_total", "Packet-in log records skipped by the sampling.")
+
+    def collect_metrics(self):
+        """
+        Update the metrics sampled when they are exposed and get the exposition text.
+
+        Args: None
+
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        self.flow_entries_gauge.values.clear()
+        for dpid in self.datapaths:
+            self.flow_entries_gauge.set((dpid,), self.flow_occupancy(dpid))
+        self.log_dropped_counter.values[()] = self.log_handler.dropped
+        self.log_sampled_counter.values[()] = self.log.sampled_out
+        return self.metrics.expose()
+
     def update_slice(self, mode):
         """
-        Update the port mappings according to the specified mode, 
-        remove all existing flow entries from the switches and then reinstall a 
-        default flow entry to ensure connectivity.
+        Update the port mappings according to the specified mode and move the switches to the new slice.
+        With DIFF_TRANSITIONS, only the flow entries that differ are deleted and added: the reactive entries
+        still forwarding to the same port and, with PROACTIVE_MODE, the entries of the new slice are kept or
+        installed. Otherwise the flow tables are wiped and the table-miss entry (and with PROACTIVE_MODE the
+        entries of the new slice) installed again.
+        The changes are applied as a transaction and the method waits until every switch acknowledges them.
 
         Args:
             mode (FirstTopologyModes): The mode used to update the slice.
 
         Returns:
-            None
+            dict: The convergence report of every switch.
         """
+        start = time.perf_counter()
         # Get the port mappings for the given mode
         self.slice_to_port = slice_to_port(mode.value)
-        print(f"Slice changed to {mode}!")
+        self.forwarding_index = build_forwarding_index(self.slice_to_port)
+        self.log.info("slice changed", mode=mode.name.lower())
+        # The flow entries being installed may be deleted by the mode change
+        self.pending_installs.clear()
+
+        transaction = Transaction()
+        if DIFF_TRANSITIONS:
+            self.apply_transition(transaction)
+        else:
+            self.wipe_flow_tables(transaction)
+
+        report = self.convergence.commit(transaction, datapaths=self.datapaths)
+        converged = [entry["time_ms"] for entry in report.values() if entry["converged"]]
+        self.log.info("mode change applied", converged=len(converged), switches=len(report), time_ms=max(converged, default=0))
+        self.mode_switch_duration.observe(time.perf_counter() - start, (mode.name.lower(),))
+        self.save_snapshot()
+        return report
+
+    def wipe_flow_tables(self, transaction=None):
+        """
+        Remove all existing flow entries from the switches and then reinstall a
+        default flow entry to ensure connectivity.
 
+        Args:
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
         # Remove all flows tables
         for dp_i in self.datapaths:
             switch_dp = self.datapaths[dp_i]
+            self.transition_engine.forget(dp_i)
             ofp_parser = switch_dp.ofproto_parser
             ofp = switch_dp.ofproto
             mod = ofp_parser.OFPFlowMod(
@@ -68,7 +239,7 @@ class FirstSlicing(app_manager.RyuApp):
                 out_port=ofp.OFPP_ANY,
                 out_group=ofp.OFPG_ANY
             )
-            switch_dp.send_msg(mod)
+            self.send_flow_mod(switch_dp, mod, transaction)
 
         # Reinstall flow tables to avoid losing connectivity
         for dp_i in self.datapaths:
@@ -79,7 +250,258 @@ class FirstSlicing(app_manager.RyuApp):
             actions = [
                 ofp_parser.OFPActionOutput(ofp.OFPP_CONTROLLER, ofp.OFPCML_NO_BUFFER)
             ]
-            self.add_flow(switch_dp, 0, match, actions)
+            self.add_flow(switch_dp, 0, match, actions, transaction)
+
+            if PROACTIVE_MODE:
+                self.install_slice_flows(switch_dp, transaction)
+
+    def apply_transition(self, transaction=None):
+        """
+        Move every switch to the current slice by deleting the flow entries that are
+        no longer valid and adding the missing ones, while the entries shared by the old and
+        the new slice keep forwarding packets.
+
+        Args:
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
+        new_rules = {dpid: self.expected_rules(dpid) for dpid in self.datapaths}
+        self.send_plan(self.transition_engine.transition(new_rules), transaction)
+
+        report = self.transition_engine.last_report
+        self.log.info("slice transition", sent=report["sent"], saved=report["saved"], unchanged=report["unchanged"])
+
+    def send_plan(self, plan, transaction=None):
+        """
+        Send the flow-mods of a transition plan to the switches.
+
+        Args:
+            plan (dict): The flow entries to delete and to add of every switch {dpid: (to_delete, to_add)}.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
+        for dpid, (to_delete, to_add) in plan.items():
+            datapath = self.datapaths.get(dpid)
+            if datapath is None:
+                continue
+            parser = datapath.ofproto_parser
+            for match_key in to_delete:
+                self.delete_flow(datapath, 1, self.slice_match(parser, match_key), transaction)
+            for match_key, out_port in to_add:
+                actions = [parser.OFPActionOutput(out_port)]
+                self.add_flow(datapath, 1, self.slice_match(parser, match_key), actions, transaction)
+
+    def restore_snapshot(self):
+        """
+        Restore the active mode and the slice flow entries saved before a restart.
+        The entries are only trusted once the switches confirm them, see reconcile_switch.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        global current_mode
+        snapshot = self.snapshot.load()
+        if snapshot is None:
+            return
+        if snapshot["modes"] and snapshot["modes"][0] in FirstTopologyModes.__members__:
+            current_mode = FirstTopologyModes[snapshot["modes"][0]]
+            self.slice_to_port = slice_to_port(current_mode.value)
+            self.forwarding_index = build_forwarding_index(self.slice_to_port)
+        self.warm_rules = snapshot["rules"]
+        self.log.info("snapshot restored", mode=current_mode.name.lower(), switches=len(self.warm_rules))
+
+    def save_snapshot(self):
+        """
+        Save the state of the controller, if it changed. The entries of the switches that were not reconciled
+        since the restart are kept.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        global current_mode
+        rules = {dpid: dict(switch_rules) for dpid, switch_rules in self.warm_rules.items()}
+        for dpid, switch_rules in self.transition_engine.rules.items():
+            rules.setdefault(dpid, {}).update(switch_rules)
+        try:
+            self.snapshot.save([current_mode.name], rules)
+        except OSError as error:
+            self.log.error("snapshot not saved", path=self.snapshot.path, error=str(error))
+
+    def _snapshot_loop(self):
+        """
+        Save the state of the controller every SNAPSHOT_INTERVAL seconds, for the flow entries installed by the packet-ins.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        while True:
+            hub.sleep(SNAPSHOT_INTERVAL)
+            self.save_snapshot()
+
+    def read_flow_table(self, datapath):
+        """
+        Request the flow entries of a switch and wait for them. It must run in a green thread
+        other than the event loop, which handles the replies.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            list: The OFPFlowStats of the flow entries, None if the switch did not answer within RECONCILE_TIMEOUT seconds.
+        """
+        req = datapath.ofproto_parser.OFPFlowStatsRequest(datapath)
+        xid = datapath.set_xid(req)
+        event, entries = hub.Event(), []
+        self.flow_table_requests[(datapath.id, xid)] = (event, entries)
+        try:
+            datapath.send_msg(req)
+            received = event.wait(timeout=RECONCILE_TIMEOUT)
+        finally:
+            self.flow_table_requests.pop((datapath.id, xid), None)
+        return entries if received else None
+
+    def reconcile_switch(self, datapath, reference):
+        """
+        Reconcile the flow table of a switch that connected with its last known slice flow entries, saved before
+        a restart of the controller or when it disconnected, without touching the other switches: the entries
+        read from the switch with the same output port are recorded as installed, the other slice flow
+        entries are deleted and only the proactive entries still missing for the current slice are sent, like in a mode change,
+        so that its packets keep being forwarded. If the flow table cannot be read, it is wiped first.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            reference (dict): The last known slice flow entries of the switch {(in_port, src_ip, dst_ip): out_port}.
+
+        Returns:
+            dict: The flow entries adopted, deleted and added.
+        """
+        start = time.perf_counter()
+        dpid = datapath.id
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        entries = self.read_flow_table(datapath)
+        transaction = Transaction()
+        adopted = deleted = 0
+        if entries is None:
+            self.log.warning("flow table not received, wiping it", dpid=dpid)
+            mod = parser.OFPFlowMod(
+                datapath=datapath, table_id=ofproto.OFPTT_ALL, command=ofproto.OFPFC_DELETE,
+                out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY
+            )
+            self.send_flow_mod(datapath, mod, transaction)
+            self.transition_engine.forget(dpid)
+            self.add_flow(datapath, 0, parser.OFPMatch(), [parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)], transaction)
+            entries = []
+
+        installed = self.transition_engine.installed(dpid)
+        for stat in entries:
+            if stat.priority != 1:
+                continue # The table-miss entry was installed again when the switch connected
+            match_key = (stat.match.get("in_port"), stat.match.get("ipv4_src"), stat.match.get("ipv4_dst"))
+            if match_key in installed:
+                continue # Installed again by a packet-in since the switch connected
+            out_ports = [
+                action.port for instruction in stat.instructions for action in getattr(instruction, "actions", ())
+                if isinstance(action, parser.OFPActionOutput)
+            ]
+            expected_match = dict(self.slice_match(parser, match_key).items()) if None not in match_key[1:] else None
+            if dict(stat.match.items()) == expected_match and match_key in reference and out_ports == [reference[match_key]]:
+                self.transition_engine.record(dpid, match_key, reference[match_key])
+                adopted += 1
+            else:
+                self.delete_flow(datapath, stat.priority, stat.match, transaction)
+                deleted += 1
+
+        # The proactive entries missing from the switch (e.g. restarted) are installed again, while the reactive ones
+        # that are missing may have expired and are installed again by the packet-ins
+        plan = self.transition_engine.transition({dpid: self.expected_rules(dpid)}, {dpid})
+        self.send_plan(plan, transaction)
+        report = self.convergence.commit(transaction)
+        self.warm_rules.pop(dpid, None)
+        reason = "reconnect" if dpid in self.reconnected else "restart"
+        self.reconnected.discard(dpid)
+        result = {"adopted": adopted, "deleted": deleted + len(plan[dpid][0]), "added": len(plan[dpid][1])}
+        self.log.info(
+            "switch reconciled", dpid=dpid, reason=reason, **result, converged=report[dpid]["converged"] if dpid in report else True,
+            time_ms=round((time.perf_counter() - start) * 1000, 3)
+        )
+        self.resync_duration.observe(time.perf_counter() - start, (reason,))
+        self.save_snapshot()
+        return result
+
+    def expected_rules(self, dpid):
+        """
+        Compute the flow entries a switch should have with the current slice:
+        the reactive entries that still forward to the same port and, if PROACTIVE_MODE
+        is enabled, every entry of the slice.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            dict: A dictionary {(in_port, src_ip, dst_ip): out_port}, in_port is None for proactive entries.
+        """
+        rules = {}
+        for match_key, out_port in self.transition_engine.installed(dpid).items():
+            in_port, src_ip, dst_ip = match_key
+            if in_port is not None and self.forwarding_index.get((dpid, src_ip, dst_ip)) == out_port:
+                rules[match_key] = out_port
+
+        if PROACTIVE_MODE:
+            for src_ip, entries in self.slice_to_port.get(dpid, {}).items():
+                for entry in entries:
+                    for dst_ip, out_port in entry.items():
+                        rules[(None, src_ip, dst_ip)] = out_port
+        return rules
+
+    @staticmethod
+    def slice_match(parser, match_key):
+        """
+        Build the match of a slice flow entry.
+
+        Args:
+            parser (module): The OpenFlow parser of the datapath.
+            match_key (tuple): The (in_port, src_ip, dst_ip) key, in_port is None for proactive entries.
+
+        Returns:
+            OFPMatch: The match of the flow entry.
+        """
+        in_port, src_ip, dst_ip = match_key
+        fields = {"eth_type": ether_types.ETH_TYPE_IP, "ipv4_src": src_ip, "ipv4_dst": dst_ip}
+        if in_port is not None:
+            fields["in_port"] = in_port
+        return parser.OFPMatch(**fields)
+
+    def install_slice_flows(self, datapath, transaction=None):
+        """
+        Install on a switch every flow entry of the current slice, so that the hosts
+        of the slice can communicate without going through the controller.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
+        parser = datapath.ofproto_parser
+        for src_ip, entries in self.slice_to_port.get(datapath.id, {}).items():
+            for entry in entries:
+                for dst_ip, out_port in entry.items():
+                    match_key = (None, src_ip, dst_ip)
+                    actions = [parser.OFPActionOutput(out_port)]
+                    self.add_flow(datapath, 1, self.slice_match(parser, match_key), actions, transaction)
+                    self.transition_engine.record(datapath.id, match_key, out_port)
 
     @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
     def _state_change_handler(self, ev):
@@ -95,16 +517,24 @@ class FirstSlicing(app_manager.RyuApp):
         datapath = ev.datapath
         if ev.state == MAIN_DISPATCHER:
             self.datapaths[datapath.id] = datapath
-            print(f"Switch {datapath.id} connected.")
+            self.log.info("switch connected", dpid=datapath.id)
         elif ev.state == DEAD_DISPATCHER:
             if datapath.id in self.datapaths:
                 del self.datapaths[datapath.id]
-                print(f"Switch {datapath.id} disconnected.")
+                # The switch may keep its flow table through the disconnection, it is reconciled when it connects again
+                self.warm_rules[datapath.id] = {**self.warm_rules.get(datapath.id, {}), **self.transition_engine.installed(datapath.id)}
+                self.reconnected.add(datapath.id)
+                self.transition_engine.forget(datapath.id)
+                self.pending_installs.clear(datapath.id)
+                self.packet_in_limiter.forget(datapath.id)
+                self.flow_removed.pop(datapath.id, None)
+                self.stats.forget(datapath.id)
+                self.log.info("switch disconnected", dpid=datapath.id)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         """
-        Install a table-miss flow entry in the switch's flow table. 
+        Install a table-miss flow entry in the switch's flow table and provision the switch (see provision_switch).
 
         Args:
             ev (EventOFPSwitchFeatures): The event representing the switch features.
@@ -122,16 +552,40 @@ class FirstSlicing(app_manager.RyuApp):
             parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)
         ]
         self.add_flow(datapath, 0, match, actions)
+        self.provision_switch(datapath)
+
+    def provision_switch(self, datapath):
+        """
+        Bring a switch that connected to the current slice, whether it connects for the first time or again:
+        if it has slice flow entries saved before a restart of the controller or its disconnection, its flow
+        table is reconciled with them, otherwise with PROACTIVE_MODE the flow entries of the current slice are installed.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            None
+        """
+        if datapath.id in self.warm_rules:
+            # The switch kept its flow table through the restart of the controller or its disconnection, which is read in another green thread
+            hub.spawn(self.reconcile_switch, datapath, self.warm_rules[datapath.id])
+        elif PROACTIVE_MODE:
+            # Without them the hosts of the slice would go through the controller until the next mode change
+            self.install_slice_flows(datapath)
 
-    def add_flow(self, datapath, priority, match, actions):
+    def add_flow(self, datapath, priority, match, actions, transaction=None, idle_timeout=0, hard_timeout=0):
         """
         Add a flow entry to the switch's flow table.
+        If the flow entry has a timeout, the switch notifies the controller when it is removed.
 
         Args:
             datapath (Datapath): The datapath of the switch.
             priority (int): The priority of the flow entry.
             match (OFPMatch): The match criteria for the flow entry.
             actions (list): The actions to apply for the flow entry.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+            idle_timeout (int): The seconds without matching packets after which the flow entry is removed, 0 for no timeout.
+            hard_timeout (int): The seconds after which the flow entry is removed, 0 for no timeout.
 
         Returns:
             None
@@ -140,10 +594,297 @@ class FirstSlicing(app_manager.RyuApp):
         parser = datapath.ofproto_parser
 
         inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
+        flags = ofproto.OFPFF_SEND_FLOW_REM if idle_timeout or hard_timeout else 0
+        mod = parser.OFPFlowMod(
+            datapath=datapath, priority=priority, match=match, instructions=inst,
+            idle_timeout=idle_timeout, hard_timeout=hard_timeout, flags=flags
+        )
+        self.send_flow_mod(datapath, mod, transaction)
+
+    def delete_flow(self, datapath, priority, match, transaction=None):
+        """
+        Delete the flow entry with exactly the given priority and match from the switch's flow table.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            priority (int): The priority of the flow entry.
+            match (OFPMatch): The match criteria of the flow entry.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+
+        Returns:
+            None
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
         mod = parser.OFPFlowMod(
-            datapath=datapath, priority=priority, match=match, instructions=inst
+            datapath=datapath,
+            command=ofproto.OFPFC_DELETE_STRICT,
+            priority=priority,
+            match=match,
+            out_port=ofproto.OFPP_ANY,
+            out_group=ofproto.OFPG_ANY,
         )
-        datapath.send_msg(mod)
+        self.send_flow_mod(datapath, mod, transaction)
+
+    def send_flow_mod(self, datapath, mod, transaction=None):
+        """
+        Send a flow-mod to a switch, or add it to a transaction.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            mod (OFPFlowMod): The flow-mod.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+
+        Returns:
+            None
+        """
+        self.flow_mod_counter.inc((datapath.id, FLOW_MOD_COMMANDS.get(mod.command, mod.command)))
+        if transaction is not None:
+            transaction.add(datapath, mod)
+        else:
+            datapath.send_msg(mod)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        """
+        Handle the flow entries removed by the switches after a timeout, so that the
+        flow entries recorded for every switch match its flow table.
+
+        Args:
+            ev (EventOFPFlowRemoved): The event containing the removed flow entry.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        reasons = {ofproto.OFPRR_IDLE_TIMEOUT: "idle_timeout", ofproto.OFPRR_HARD_TIMEOUT: "hard_timeout"}
+        reason = reasons.get(msg.reason)
+        if reason is None:
+            # The flow entries deleted by the controller are already forgotten
+            return
+
+        dpid = msg.datapath.id
+        match_key = (msg.match.get("in_port"), msg.match.get("ipv4_src"), msg.match.get("ipv4_dst"))
+        if self.transition_engine.discard(dpid, match_key):
+            self.count_removed(dpid, reason)
+
+    def count_removed(self, dpid, reason, count=1):
+        """
+        Count the flow entries removed from a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            reason (str): "idle_timeout", "hard_timeout" or "evicted".
+            count (int): The number of flow entries.
+
+        Returns:
+            None
+        """
+        counters = self.flow_removed.setdefault(dpid, {"idle_timeout": 0, "hard_timeout": 0, "evicted": 0})
+        counters[reason] += count
+
+    def flow_occupancy(self, dpid):
+        """
+        Get the number of flow entries installed by the controller on a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            int: The table-miss entry and the slice flow entries of the switch.
+        """
+        return self.transition_engine.base_flows + len(self.transition_engine.installed(dpid))
+
+    def make_room(self, datapath):
+        """
+        If FLOW_EVICTION is enabled and the flow table of a switch is almost full, delete its
+        oldest reactive slice flow entries so that a new one can be installed. The proactive
+        entries (without input port) are never evicted, the packet-ins do not reinstall them.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            None
+        """
+        if not FLOW_EVICTION:
+            return
+        dpid = datapath.id
+        excess = self.flow_occupancy(dpid) + 1 - int(FLOW_TABLE_LIMIT * EVICTION_THRESHOLD)
+        if excess <= 0:
+            return
+
+        evicted = self.transition_engine.oldest(dpid, excess, lambda match_key: match_key[0] is not None)
+        for match_key, out_port in evicted:
+            self.delete_flow(datapath, 1, self.slice_match(datapath.ofproto_parser, match_key))
+            self.transition_engine.discard(dpid, match_key)
+        self.count_removed(dpid, "evicted", len(evicted))
+
+    def flow_table_counters(self):
+        """
+        Get the flow table occupancy of every switch.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {dpid: {"flows", "limit", "idle_timeout", "hard_timeout", "evicted"}}.
+        """
+        counters = {}
+        for dpid in self.datapaths:
+            removed = self.flow_removed.get(dpid, {"idle_timeout": 0, "hard_timeout": 0, "evicted": 0})
+            counters[dpid] = {"flows": self.flow_occupancy(dpid), "limit": FLOW_TABLE_LIMIT, **removed}
+        return counters
+
+    def _stats_loop(self):
+        """
+        Poll the flow and port statistics of every switch every STATS_INTERVAL seconds.
+        The flow statistics of the previous poll are aggregated by slice before sending the new requests.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        while True:
+            if self.stats.flows:
+                self.stats.add_slice_samples(time.time(), self.slice_flow_stats())
+            for datapath in list(self.datapaths.values()):
+                self.request_stats(datapath)
+            hub.sleep(STATS_INTERVAL)
+
+    def request_stats(self, datapath):
+        """
+        Request the flow and port statistics of a switch.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            None
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        datapath.send_msg(parser.OFPFlowStatsRequest(datapath))
+        datapath.send_msg(parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        """
+        Handle the flow statistics replies.
+
+        Args:
+            ev (EventOFPFlowStatsReply): The event containing the flow statistics.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        more = bool(msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE)
+        request = self.flow_table_requests.get((msg.datapath.id, msg.xid))
+        if request is not None:
+            # The flow table requested by read_flow_table
+            request[1].extend(msg.body)
+            if not more:
+                request[0].set()
+            return
+        self.stats.add_flow_stats(msg.datapath.id, msg.body, more)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply_handler(self, ev):
+        """
+        Handle the port statistics replies.
+
+        Args:
+            ev (EventOFPPortStatsReply): The event containing the port statistics.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        self.stats.add_port_stats(msg.datapath.id, msg.body, time.time())
+
+    def slice_flow_stats(self):
+        """
+        Aggregate the last flow statistics of the switches by slice. The slice flow entries that
+        are not in the active slice are counted in "unsliced".
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {slice_name: {"flows", "packets", "bytes"}}.
+        """
+        global current_mode
+        active_slice = (current_mode.name.lower(),)
+        entries = []
+        for dpid, flows in self.stats.flows.items():
+            for stat in flows:
+                if stat.priority != 1:
+                    continue
+                src_ip, dst_ip = stat.match.get("ipv4_src"), stat.match.get("ipv4_dst")
+                slice_names = active_slice if (dpid, src_ip, dst_ip) in self.forwarding_index else ("unsliced",)
+                entries.append((dpid, (src_ip, dst_ip), slice_names, None, stat.packet_count, stat.byte_count))
+        return aggregate_slices(entries)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        """
+        Handle the barrier replies acknowledging the flow-mods of a mode change.
+
+        Args:
+            ev (EventOFPBarrierReply): The event containing the barrier reply.
+
+        Returns:
+            None
+        """
+        self.convergence.reply(ev.msg.datapath.id, ev.msg.xid)
+
+    @set_ev_cls(ofp_event.EventONFBundleCtrlMsg, MAIN_DISPATCHER)
+    def bundle_reply_handler(self, ev):
+        """
+        Handle the bundle commit replies acknowledging the flow-mods of a mode change.
+
+        Args:
+            ev (EventONFBundleCtrlMsg): The event containing the bundle control reply.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        if msg.type == msg.datapath.ofproto.ONF_BCT_COMMIT_REPLY:
+            self.convergence.reply(msg.datapath.id, msg.xid)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def error_msg_handler(self, ev):
+        """
+        Handle the errors sent by the switches, which may reject a bundle or a flow-mod.
+
+        Args:
+            ev (EventOFPErrorMsg): The event containing the error message.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        self.convergence.error(msg.datapath.id, msg.xid, msg)
+
+    def packet_in_counters(self):
+        """
+        Get the packet-in counters of every switch.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {dpid: {"admitted", "shed", "duplicates"}}, where duplicates are the
+            packet-ins answered with a packet-out only because their flow entry was being installed.
+        """
+        counters = self.packet_in_limiter.counters()
+        for dpid, duplicates in self.pending_installs.duplicates.items():
+            counters.setdefault(dpid, {"admitted": 0, "shed": 0})["duplicates"] = duplicates
+        for entry in counters.values():
+            entry.setdefault("duplicates", 0)
+        return counters
 
     def _send_package(self, msg, datapath, in_port, actions):
         """
@@ -170,6 +911,7 @@ class FirstSlicing(app_manager.RyuApp):
             actions=actions,
             data=data,
         )
+        self.packet_out_counter.inc((datapath.id,))
         datapath.send_msg(out)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
@@ -177,12 +919,25 @@ class FirstSlicing(app_manager.RyuApp):
         """
         Handle Packet-In events sent by switches to the controller.
         These events occur when a packet does not match any flow rule or is explicitly 
-        transmitted to the controller. The function processes the packet, extracts the useful information
-        and send it to the correct port by adding a new flow entry.
+        transmitted to the controller. The time spent handling the packet is recorded in the metrics.
 
         Args:
             ev (EventOFPPacketIn): TThe event containing the Packet-In message.
 
+        Returns:
+            None
+        """
+        with self.packet_in_latency.time():
+            self.handle_packet_in(ev)
+
+    def handle_packet_in(self, ev):
+        """
+        Process a Packet-In, extract the useful information and send the packet
+        to the correct port by adding a new flow entry.
+
+        Args:
+            ev (EventOFPPacketIn): The event containing the Packet-In message.
+
         Returns:
             None
         """
@@ -190,28 +945,28 @@ class FirstSlicing(app_manager.RyuApp):
         datapath = msg.datapath
         in_port = msg.match["in_port"]
         dpid = datapath.id
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocol(ethernet.ethernet)
+        if not self.packet_in_limiter.allow(dpid):
+            # Shed the packet-in to protect the event loop during a miss storm
+            self.packet_in_shed_counter.inc((dpid,))
+            return
+
+        headers = parse_headers(msg.data)
+        self.packet_in_counter.inc((dpid, classify_traffic(headers)))
 
-        if eth.ethertype == ether_types.ETH_TYPE_LLDP:
+        if headers.ethertype == ether_types.ETH_TYPE_LLDP:
             # Ignore LLDP packets
             return
 
-        ipv4_pkt = pkt.get_protocol(ipv4.ipv4)
-        if ipv4_pkt is None:
+        if headers.ipv4_src is None:
             return
 
-        src_ip = ipv4_pkt.src
-        dst_ip = ipv4_pkt.dst
-
-        out_port = None
-        for entry in self.slice_to_port.get(dpid, {}).get(src_ip, []):
-            if dst_ip in entry:
-                out_port = entry[dst_ip]
-                break
+        src_ip = headers.ipv4_src
+        dst_ip = headers.ipv4_dst
 
-        print(f"Packet In - In Port: {in_port}, DPID: {dpid}, Out Port: {out_port}, Src IP: {src_ip}, Dst IP: {dst_ip}")
+        out_port = self.forwarding_index.get((dpid, src_ip, dst_ip))
 
+        # The packets of hosts that are not in the same slice are dropped
+        decision = "drop"
         if out_port is not None:
             actions = [datapath.ofproto_parser.OFPActionOutput(out_port)]
             match = datapath.ofproto_parser.OFPMatch(
@@ -220,8 +975,15 @@ class FirstSlicing(app_manager.RyuApp):
                 ipv4_src=src_ip,
                 ipv4_dst=dst_ip,
             )
-            self.add_flow(datapath, 1, match, actions)
+            if self.pending_installs.claim(dpid, (in_port, src_ip, dst_ip), out_port):
+                self.make_room(datapath)
+                self.add_flow(datapath, 1, match, actions, idle_timeout=REACTIVE_IDLE_TIMEOUT, hard_timeout=REACTIVE_HARD_TIMEOUT)
+                self.transition_engine.record(dpid, (in_port, src_ip, dst_ip), out_port)
+                decision = "install"
+            else:
+                decision = "pending"
             self._send_package(msg, datapath, in_port, actions)
+        self.log.packet("packet-in", dpid=dpid, in_port=in_port, src=src_ip, dst=dst_ip, out_port=out_port, decision=decision)
 
 class FirstSlicingController(ControllerBase):
     """
@@ -231,6 +993,28 @@ class FirstSlicingController(ControllerBase):
         super(FirstSlicingController, self).__init__(req, link, data, **config)
         self.first_slicing = data[first_slicing_instance_name]
 
+    @staticmethod
+    def mode_response(caption, report, headers):
+        """
+        Build the response of a mode change, reporting how long every switch took to apply it.
+
+        Args:
+            caption (str): The caption of the new mode.
+            report (dict): The convergence report {dpid: {"method", "flow_mods", "converged", "time_ms"}}.
+            headers (dict): The headers of the response.
+
+        Returns:
+            Response: The response confirming the mode change.
+        """
+        times = [entry["time_ms"] for entry in report.values() if entry["converged"]]
+        body = {
+            "mode": caption,
+            "converged": len(times) == len(report),
+            "convergence_ms": max(times, default=0),
+            "switches": {str(dpid): entry for dpid, entry in report.items()},
+        }
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
     @staticmethod
     def get_cors_headers():
         """
@@ -263,6 +1047,149 @@ class FirstSlicingController(ControllerBase):
         global current_mode
         return Response(status=200, body=str(current_mode.value), headers=headers)
 
+    @route("packet_in", url + "/packet_in", methods=["GET"])
+    def get_packet_in_counters(self, req, **kwargs):
+        """
+        Get the packet-in counters of every switch.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the admitted, shed and duplicate packet-ins of every switch.
+        """
+        headers = self.get_cors_headers()
+        counters = {str(dpid): entry for dpid, entry in self.first_slicing.packet_in_counters().items()}
+        return Response(status=200, body=json.dumps(counters), headers=headers)
+
+    @route("flows", url + "/flows", methods=["GET"])
+    def get_flow_table_counters(self, req, **kwargs):
+        """
+        Get the flow table occupancy of every switch.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the flow entries, the limit and the removed flow entries of every switch.
+        """
+        headers = self.get_cors_headers()
+        counters = {str(dpid): entry for dpid, entry in self.first_slicing.flow_table_counters().items()}
+        return Response(status=200, body=json.dumps(counters), headers=headers)
+
+    @route("stats", url + "/stats", methods=["GET"])
+    def get_stats(self, req, **kwargs):
+        """
+        Get the last statistics sample and the current rates of every slice and port.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the statistics summary.
+        """
+        headers = self.get_cors_headers()
+        body = {"interval": STATS_INTERVAL, "history": STATS_HISTORY, **self.first_slicing.stats.summary()}
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
+    @route("stats_slices", url + "/stats/slices", methods=["GET"])
+    def get_slice_stats(self, req, **kwargs):
+        """
+        Get the time series of the traffic of every slice.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the samples of every slice.
+        """
+        headers = self.get_cors_headers()
+        body = {slice_name: series.to_list() for slice_name, series in self.first_slicing.stats.slices.items()}
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
+    @route("stats_ports", url + "/stats/ports", methods=["GET"])
+    def get_port_stats(self, req, **kwargs):
+        """
+        Get the time series of the counters of every port.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the samples of every port of every switch.
+        """
+        headers = self.get_cors_headers()
+        body = {
+            str(dpid): {str(port_no): series.to_list() for port_no, series in ports.items()}
+            for dpid, ports in self.first_slicing.stats.ports.items()
+        }
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
+    @route("metrics", "/metrics", methods=["GET"])
+    def get_metrics(self, req, **kwargs):
+        """
+        Get the metrics of the controller in the Prometheus text exposition format.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the metrics.
+        """
+        headers = {**self.get_cors_headers(), "Content-Type": CONTENT_TYPE}
+        return Response(status=200, body=self.first_slicing.collect_metrics(), headers=headers)
+
+    @route("profiler", url + "/profiler", methods=["GET"])
+    def get_profiler_status(self, req, **kwargs):
+        """
+        Get the state of the sampling profiler.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing whether the profiler is running and how many samples it took.
+        """
+        headers = self.get_cors_headers()
+        return Response(status=200, body=json.dumps(self.first_slicing.profiler.status()), headers=headers)
+
+    @route("profiler_start", url + "/profiler/start", methods=["GET"])
+    def start_profiler(self, req, **kwargs):
+        """
+        Start the sampling profiler, the optional "interval" parameter sets the seconds between two samples.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing the state of the profiler, 409 if it is already running.
+        """
+        headers = self.get_cors_headers()
+        try:
+            interval = float(req.GET["interval"]) if "interval" in req.GET else None
+        except ValueError:
+            interval = -1
+        if interval is not None and not 0.001 <= interval <= 1:
+            return Response(status=400, body=json.dumps({"error": "interval must be between 0.001 and 1 seconds"}), headers=headers)
+
+        started = self.first_slicing.profiler.start(interval)
+        return Response(status=200 if started else 409, body=json.dumps(self.first_slicing.profiler.status()), headers=headers)
+
+    @route("profiler_stop", url + "/profiler/stop", methods=["GET"])
+    def stop_profiler(self, req, **kwargs):
+        """
+        Stop the sampling profiler and get the collapsed stacks, ready for flamegraph.pl or speedscope.
+
+        Args:
+            req (Request): The request object.
+
+        Returns:
+            Response: The response containing one line "frame;frame;frame count" for every sampled stack.
+        """
+        headers = {**self.get_cors_headers(), "Content-Type": "text/plain; charset=utf-8"}
+        self.first_slicing.profiler.stop()
+        return Response(status=200, body=self.first_slicing.profiler.collapsed(), headers=headers)
+
     @route("always_on_mode", url + "/always_on_mode", methods=["GET"])
     def set_always_on_mode(self, req, **kwargs):
         """
@@ -277,8 +1204,8 @@ class FirstSlicingController(ControllerBase):
         global current_mode
         headers = self.get_cors_headers()
         current_mode = FirstTopologyModes.ALWAYS_ON
-        self.first_slicing.update_slice(current_mode)
-        return Response(status=200, body="Current active mode: Always on", headers=headers)
+        report = self.first_slicing.update_slice(current_mode)
+        return self.mode_response("Always on", report, headers)
 
     @route("listener_mode", url + "/listener_mode", methods=["GET"])
     def set_listener_mode(self, req, **kwargs):
@@ -294,8 +1221,8 @@ class FirstSlicingController(ControllerBase):
         global current_mode
         headers = self.get_cors_headers()
         current_mode = FirstTopologyModes.LISTENER
-        self.first_slicing.update_slice(current_mode)
-        return Response(status=200, body="Current active mode: Listener", headers=headers)
+        report = self.first_slicing.update_slice(current_mode)
+        return self.mode_response("Listener", report, headers)
 
     @route("no_guest_mode", url + "/no_guest_mode", methods=["GET"])
     def set_no_guest_mode(self, req, **kwargs):
@@ -311,8 +1238,8 @@ class FirstSlicingController(ControllerBase):
         global current_mode
         headers = self.get_cors_headers()
         current_mode = FirstTopologyModes.NO_GUEST
-        self.first_slicing.update_slice(current_mode)
-        return Response(status=200, body="Current active mode: No guest", headers=headers)
+        report = self.first_slicing.update_slice(current_mode)
+        return self.mode_response("No guest", report, headers)
 
     @route("speaker_mode", url + "/speaker_mode", methods=["GET"])
     def set_speaker_mode(self, req, **kwargs):
@@ -328,5 +1255,5 @@ class FirstSlicingController(ControllerBase):
         global current_mode
         headers = self.get_cors_headers()
         current_mode = FirstTopologyModes.SPEAKER
-        self.first_slicing.update_slice(current_mode)
-        return Response(status=200, body="Current active mode: Speaker", headers=headers)
+        report = self.first_slicing.update_slice(current_mode)
+        return self.mode_response("Speaker", report, headers)
@@ -1,3 +1,23 @@
+import os
+import sys
+from functools import lru_cache
+from types import MappingProxyType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from spec_compiler import SpecCompiler, link_mapping, load_spec
+
+# The topology and the slices, described once in spec.json and compiled by spec_compiler.py
+SPEC = load_spec(os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec.json"))
+
+# Lookup tables computed once at import time, so that building the slices does not rebuild them at every call
+IP_MAPPING = {name: host["ip"] for name, host in SPEC["hosts"].items()}
+
+MAC_MAPPING = {name: host["mac"] for name, host in SPEC["hosts"].items()}
+
+DPID_MAPPING = {name: switch["dpid"] for name, switch in SPEC["switches"].items()}
+
+LINK_MAPPING = link_mapping(SPEC)
+
 def get_IP_address(host_name: str) -> str:
     """
     Get the IP address for a given host name.
@@ -8,10 +28,7 @@ def get_IP_address(host_name: str) -> str:
     Returns:
         str: The IP address corresponding to the host name.
     """
-    ip_mapping = {
-        f"h{i}": f"192.168.0.{i}" for i in range(1, 11)
-    }
-    return ip_mapping.get(host_name)
+    return IP_MAPPING.get(host_name)
 
 def get_MAC_address (host_name: str) -> str:
     """
@@ -23,10 +40,7 @@ def get_MAC_address (host_name: str) -> str:
     Returns:
         str: The MAC address corresponding to the host name.
     """
-    mac_mapping = {
-        f"h{i}": f"00:00:00:00:00:{i:02x}" for i in range(1, 11)
-    }
-    return mac_mapping.get(host_name)
+    return MAC_MAPPING.get(host_name)
 
 def get_dpid (host_name: str) -> int:
     """
@@ -38,11 +52,7 @@ def get_dpid (host_name: str) -> int:
     Returns:
         int: The DPID corresponding to the switch name.
     """
-    dpid_mapping = {
-        f"s{i}": f"{i:016x}" for i in range(1, 6)
-    }
-    return int(dpid_mapping.get(host_name), 16)
-
+    return DPID_MAPPING[host_name]
 
 def get_port (src: str, dst: str) -> int:
     """
@@ -55,63 +65,60 @@ def get_port (src: str, dst: str) -> int:
     Returns:
         int: The port number for the given source and destination.
     """
-    link_mapping = {
-        "s1": {
-            "h1": 3,
-            "h10": 4,
-            "s2": 1,
-            "s4": 2,
-        },
-        "s2": {
-            "h5": 4,
-            "s1": 1,
-            "s3": 2,
-            "s4": 3,
-        },
-        "s3": {
-            "h2": 3,
-            "h3": 4,
-            "h4": 5,
-            "s2": 1,
-            "s4": 2,
-        },
-        "s4": {
-            "h6": 2,
-            "h7": 3,
-            "h8": 4,
-            "s1": 1,
-            "s2": 2,
-            "s3": 3,
-            "s5": 4,
-        },
-        "s5": {
-            "h6": 2,
-            "h7": 3,
-            "h8": 4,
-            "h9": 5,
-            "s4": 1,
-        }
-    }
-    return link_mapping.get(src).get(dst)
+    return LINK_MAPPING.get(src).get(dst)
+
+def freeze(table):
+    """
+    Recursively convert a port mapping into an immutable structure, so that it can be cached and shared.
+    Dictionaries become read-only mappings and lists become tuples.
 
-def generate_link_entries(src_ip, dst_ips, switch, ports):
+    Args:
+        table: The port mapping to convert.
+
+    Returns:
+        The immutable port mapping.
     """
-    Generate link entries for a given source IP, destination IPs, switch, and ports.
+    if isinstance(table, dict):
+        return MappingProxyType({key: freeze(value) for key, value in table.items()})
+    if isinstance(table, list):
+        return tuple(freeze(value) for value in table)
+    return table
+
+def build_forwarding_index(slice_table):
+    """
+    Flatten the port mappings of a slice into a dictionary that can be queried with a single lookup.
 
     Args:
-        src_ip (str): The source IP address.
-        dst_ips (list): A list of destination IP addresses.
-        switch (str): The switch name.
-        ports (list): A list of ports corresponding to the destination IPs.
+        slice_table (dict): The port mappings returned by slice_to_port.
 
     Returns:
-        dict: A dictionary representing the link entries.
+        dict: A dictionary {(dpid, src_ip, dst_ip): out_port}.
     """
-    return {src_ip: [{dst_ip: get_port(switch, port)} for dst_ip, port in zip(dst_ips, ports)]}
+    return {
+        (dpid, src_ip, dst_ip): out_port
+        for dpid, sources in slice_table.items()
+        for src_ip, entries in sources.items()
+        for entry in entries
+        for dst_ip, out_port in entry.items()
+    }
 
+@lru_cache(maxsize=None)
 def slice_to_port(scenario = 0):
     """
-    Generate port mappings for different slicing scenarios.
+    Get the port mappings for a slicing scenario.
+    The mappings are generated only the first time a scenario is requested, then the cached immutable copy is returned.
+
+    Args:
+        scenario (int): The scenario number (0, 1, 2, or 3). Defaults to 0.
+
+    Returns:
+        MappingProxyType: A read-only mapping representing the port mappings for the given scenario.
+    """
+    return freeze(build_slice_to_port(scenario))
+
+def build_slice_to_port(scenario = 0):
+    """
+    Generate port mappings for different slicing scenarios, compiled from the slices of the specification.
 
     Args:
         scenario (int): The scenario number (0, 1, 2, or 3). Defaults to 0.
@@ -119,122 +126,4 @@ def slice_to_port(scenario = 0):
     Returns:
         dict: A dictionary representing the port mappings for the given scenario.
     """
-    if scenario == 0:
-        return {
-            get_dpid("s1"): {
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h9")], "s1", ["s4"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s1", ["h10"]),
-            },
-            get_dpid("s4"): {
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h9")], "s4", ["s5"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s4", ["s1"]),
-            },
-            get_dpid("s5"): {
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h9")], "s5", ["h9"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s5", ["s4"]),
-            },
-        }
-    elif scenario == 1:
-        return {
-            get_dpid("s1"): {
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h9")], "s1", ["s4"] * 6),
-            },
-            get_dpid("s2"): {
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h5")], "s2", ["h5"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h5")], "s2", ["h5"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h5")], "s2", ["h5"]),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h6"), get_IP_address("h10")], "s2", ["s4"] * 5),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h5")], "s2", ["h5"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h5")], "s2", ["h5"]),
-            },
-            get_dpid("s3"): {
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h10")], "s3", ["h3", "h4"] + ["s4"] * 3),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h2"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h10")], "s3", ["h2", "h4"] + ["s4"] * 3),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h10")], "s3", ["h2", "h3"] + ["s4"] * 3),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4")], "s3", ["h2", "h3", "h4"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4")], "s3", ["h2", "h3", "h4"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4")], "s3", ["h2", "h3", "h4"]),
-            },
-            get_dpid("s4"): {
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h10")], "s4", ["s2", "s5", "s1"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h10")], "s4", ["s2", "s5", "s1"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h10")], "s4", ["s2", "s5", "s1"]),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h6"), get_IP_address("h10")], "s4", ["s3"] * 3 + ["s5", "s1"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h10")], "s4", ["s3"] * 3 + ["s2", "s1"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s4", ["s1"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h9")], "s4", ["s3"] * 3 + ["s2", "s5", "s5"]),
-            },
-            get_dpid("s5"): {
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h6")], "s5", ["h6"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h6")], "s5", ["h6"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h6")], "s5", ["h6"]),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h6")], "s5", ["h6"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h7"), get_IP_address("h8"), get_IP_address("h9"), get_IP_address("h10")], "s5", ["s4"] * 4 + ["h7", "h8", "h9", "s4"]),
-                **generate_link_entries(get_IP_address("h7"), [get_IP_address("h6")], "s5", ["h6"]),
-                **generate_link_entries(get_IP_address("h8"), [get_IP_address("h6")], "s5", ["h6"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h6"), get_IP_address("h10")], "s5", ["h6", "s4"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h6"), get_IP_address("h9")], "s5", ["h6", "h9"]),
-            },
-        }
-    elif scenario == 2:
-        return {
-            get_dpid("s1"): {
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h9"), get_IP_address("h6")], "s1", ["s4", "s4"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s1", ["h10"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h10")], "s1", ["h10"]),
-            },
-            get_dpid("s4"): {
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h9"), get_IP_address("h6")], "s4", ["s5", "s5"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h10")], "s4", ["s1"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h10")], "s4", ["s1"]),
-            },
-            get_dpid("s5"): {
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h9"), get_IP_address("h6")], "s5", ["h9", "h6"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h6"), get_IP_address("h10")], "s5", ["h6", "s4"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h9"), get_IP_address("h10")], "s5", ["h9", "s4"]),
-            },
-        }
-    elif scenario == 3:
-        return {
-            get_dpid("s1"): {
-                **generate_link_entries(get_IP_address("h1"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h6"), get_IP_address("h9"), get_IP_address("h10")], "s1", ["s2"] * 4 + ["s4"] * 2 + ["h10"]),
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h1")], "s1", ["h1"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h1")], "s1", ["h1"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h1")], "s1", ["h1"]),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h1")], "s1", ["h1"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h1"), get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h10")], "s1", ["h1"] + ["s2"] * 4 + ["h10"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h1"), get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5"), get_IP_address("h10")], "s1", ["h1"] + ["s2"] * 4 + ["h10"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h1"), get_IP_address("h6"), get_IP_address("h9")], "s1", ["h1"] + ["s4"] * 2),
-            },
-            get_dpid("s2"): {
-                **generate_link_entries(get_IP_address("h1"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4"), get_IP_address("h5")], "s2", ["s3"] * 3 + ["h5"]),
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h1")], "s2", ["s1"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h1")], "s2", ["s1"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h1")], "s2", ["s1"]),
-                **generate_link_entries(get_IP_address("h5"), [get_IP_address("h1")], "s2", ["s1"]),
-            },
-            get_dpid("s3"): {
-                **generate_link_entries(get_IP_address("h1"), [get_IP_address("h2"), get_IP_address("h3"), get_IP_address("h4")], "s3", ["h2", "h3", "h4"]),
-                **generate_link_entries(get_IP_address("h2"), [get_IP_address("h1")], "s3", ["s2"]),
-                **generate_link_entries(get_IP_address("h3"), [get_IP_address("h1")], "s3", ["s2"]),
-                **generate_link_entries(get_IP_address("h4"), [get_IP_address("h1")], "s3", ["s2"]),
-            },
-            get_dpid("s4"): {
-                **generate_link_entries(get_IP_address("h1"), [get_IP_address("h6"), get_IP_address("h9")], "s4", ["s5", "s5"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h1"), get_IP_address("h10")], "s4", ["s1", "s1"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h1"), get_IP_address("h10")], "s4", ["s1", "s1"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h6"), get_IP_address("h9")], "s4", ["s5", "s5"]),
-            },
-            get_dpid("s5"): {
-                **generate_link_entries(get_IP_address("h1"), [get_IP_address("h6"), get_IP_address("h9")], "s5", ["h6", "h9"]),
-                **generate_link_entries(get_IP_address("h6"), [get_IP_address("h1"), get_IP_address("h9"), get_IP_address("h10")], "s5", ["s4", "h9", "s4"]),
-                **generate_link_entries(get_IP_address("h9"), [get_IP_address("h1"), get_IP_address("h6"), get_IP_address("h10")], "s5", ["s4", "h6", "s4"]),
-                **generate_link_entries(get_IP_address("h10"), [get_IP_address("h6"), get_IP_address("h9")], "s5", ["h6", "h9"]),
-            },
-        }
\ No newline at end of file
+    return SpecCompiler(SPEC).compile_slice(SPEC["slices"][scenario])
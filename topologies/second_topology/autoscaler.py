@@ -0,0 +1,217 @@
+import math
+
+
+class QoSAutoscaler:
+    """
+    Compute the maximum rates of the traffic classes from the queue statistics of the switches, so that the
+    bandwidth of the idle classes is given to the busy ones.
+
+    The rates are in Mb/s, as in the /qos endpoint: every class gets at least 1 and the classes share the
+    total rate of the link, the general traffic getting what the others do not use. The rate of a class is
+    the rate of its busiest queue. A class is saturated when it uses at least the saturation fraction of its
+    maximum rate, and then grows by at least 1; otherwise it shrinks to its rate plus the headroom, only if it
+    gives back at least min_change. Between the two thresholds the class keeps its maximum rate (hysteresis).
+    When the classes need more than the link, the bandwidth is shared in a max-min fair way.
+    A new allocation is applied only if it is proposed by confirm consecutive evaluations and min_interval
+    seconds passed since the last change.
+
+    Attributes:
+        queue_ids (tuple): The ids of the queues of the HTTP, DNS, ICMP and general traffic classes.
+        total (int): The rate of the link in Mb/s.
+        enabled (bool): Whether the allocation is evaluated.
+        allocation (list): The maximum rate in Mb/s of every class, None until the rates of a QoS update are known.
+        rates (dict): The smoothed rate in bit/s of every queue {(dpid, port, queue id): rate}.
+        counters (dict): The last transmitted bytes of every queue {(dpid, port, queue id): (bytes, time)}.
+        proposal (list): The allocation proposed by the last evaluations, None if it is the current one.
+        streak (int): The number of consecutive evaluations proposing it.
+        last_change (float): The time of the last QoS update.
+        last_decision (str): The outcome of the last evaluation.
+    """
+    def __init__(self, queue_ids, total=10, min_change=2, confirm=3, min_interval=30, headroom=0.2, saturation=0.9, smoothing=0.5):
+        self.queue_ids = queue_ids
+        self.total = total
+        self.min_change = min_change
+        self.confirm = confirm
+        self.min_interval = min_interval
+        self.headroom = headroom
+        self.saturation = saturation
+        self.smoothing = smoothing
+        self.enabled = False
+        self.allocation = None
+        self.rates = {}
+        self.counters = {}
+        self.proposal = None
+        self.streak = 0
+        self.last_change = None
+        self.last_decision = None
+
+    def observe(self, dpid, port_no, queue_id, tx_bytes, now):
+        """
+        Record the transmitted bytes of a queue.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            port_no (int): The port of the queue.
+            queue_id (int): The id of the queue.
+            tx_bytes (int): The bytes transmitted by the queue.
+            now (float): The time of the statistics.
+
+        Returns:
+            None
+        """
+        if queue_id not in self.queue_ids:
+            return
+        key = (dpid, port_no, queue_id)
+        previous = self.counters.get(key)
+        self.counters[key] = (tx_bytes, now)
+        # A counter going back means the queue was created again
+        if previous is None or tx_bytes < previous[0] or now <= previous[1]:
+            return
+        rate = (tx_bytes - previous[0]) * 8 / (now - previous[1])
+        old_rate = self.rates.get(key)
+        self.rates[key] = rate if old_rate is None else self.smoothing * rate + (1 - self.smoothing) * old_rate
+
+    def class_rates(self):
+        """
+        Get the rate of every class, the rate of its busiest queue.
+
+        Args: None
+
+        Returns:
+            list: The rate in bit/s of every class, in the order of queue_ids.
+        """
+        rates = [0.0] * len(self.queue_ids)
+        for (dpid, port_no, queue_id), rate in self.rates.items():
+            index = self.queue_ids.index(queue_id)
+            rates[index] = max(rates[index], rate)
+        return rates
+
+    def needs(self, rates):
+        """
+        Get the maximum rate needed by every class, applying the hysteresis to the current allocation.
+
+        Args:
+            rates (list): The rate in bit/s of every class.
+
+        Returns:
+            list: The maximum rate in Mb/s needed by every class.
+        """
+        needs = []
+        for allocated, rate in zip(self.allocation, rates):
+            mbps = rate / 1_000_000
+            if mbps >= self.saturation * allocated:
+                needs.append(max(allocated + 1, math.ceil(allocated * (1 + self.headroom))))
+                continue
+            target = max(1, math.ceil(mbps * (1 + self.headroom)))
+            needs.append(target if target <= allocated - self.min_change else allocated)
+        return needs
+
+    def allocate(self, needs):
+        """
+        Share the link between the classes in a max-min fair way: every class gets 1, then the rest is given
+        1 Mb/s at a time to the class with the lowest rate among the ones needing more, and what is left
+        goes to the general traffic.
+
+        Args:
+            needs (list): The maximum rate in Mb/s needed by every class.
+
+        Returns:
+            list: The maximum rate in Mb/s of every class, summing to total.
+        """
+        allocation = [1] * len(needs)
+        remaining = self.total - len(needs)
+        while remaining > 0:
+            unmet = [index for index, need in enumerate(needs) if need > allocation[index]]
+            if not unmet:
+                break
+            index = min(unmet, key=lambda index: allocation[index])
+            allocation[index] += 1
+            remaining -= 1
+        allocation[-1] += remaining
+        return allocation
+
+    def evaluate(self, now):
+        """
+        Evaluate the allocation with the last statistics.
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            list: The maximum rates in Mb/s of the HTTP, DNS and ICMP traffic to apply, None to keep the current ones.
+        """
+        if self.allocation is None:
+            self.last_decision = "waiting for a QoS update"
+            return None
+        if not self.rates:
+            self.last_decision = "waiting for the queue statistics"
+            return None
+
+        proposal = self.allocate(self.needs(self.class_rates()))
+        if proposal == self.allocation:
+            self.proposal, self.streak = None, 0
+            self.last_decision = "unchanged"
+            return None
+        if proposal == self.proposal:
+            self.streak += 1
+        else:
+            self.proposal, self.streak = proposal, 1
+        if self.streak < self.confirm:
+            self.last_decision = f"proposed {proposal} ({self.streak}/{self.confirm})"
+            return None
+        if self.last_change is not None and now - self.last_change < self.min_interval:
+            self.last_decision = f"proposed {proposal}, waiting for the minimum interval"
+            return None
+
+        self.proposal, self.streak = None, 0
+        self.last_change = now
+        self.last_decision = f"applied {proposal}"
+        return proposal[:-1]
+
+    def applied(self, rates, now):
+        """
+        Record the maximum rates of a QoS update, requested by the autoscaler or through the /qos endpoint.
+
+        Args:
+            rates (list): The maximum rate in bit/s of every class.
+            now (float): The time of the update.
+
+        Returns:
+            None
+        """
+        self.allocation = [round(rate / 1_000_000) for rate in rates]
+        self.proposal, self.streak = None, 0
+        self.last_change = now
+
+    def forget(self, dpid):
+        """
+        Forget the queues of a switch, e.g. when it disconnects.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            None
+        """
+        for key in [key for key in self.counters if key[0] == dpid]:
+            self.counters.pop(key)
+            self.rates.pop(key, None)
+
+    def status(self):
+        """
+        Get the state of the autoscaler.
+
+        Args: None
+
+        Returns:
+            dict: Whether it is enabled, the current and proposed allocations, the rate of every class and the last decision.
+        """
+        return {
+            "enabled": self.enabled,
+            "allocation": self.allocation,
+            "rates": dict(zip(map(str, self.queue_ids), self.class_rates())),
+            "proposal": self.proposal,
+            "streak": self.streak,
+            "last_change": self.last_change,
+            "last_decision": self.last_decision,
+        }
@@ -3,15 +3,31 @@ from ryu.base import app_manager
 from ryu.controller import ofp_event
 from ryu.controller.handler import CONFIG_DISPATCHER, MAIN_DISPATCHER, DEAD_DISPATCHER
 from ryu.controller.handler import set_ev_cls
-from ryu.lib.packet import packet
-from ryu.lib.packet import ethernet
-from ryu.lib.packet import packet, ethernet, ether_types, ipv4, udp, tcp, icmp
-from ryu.ofproto import ofproto_v1_3
+from ryu.lib import hub
+from ryu.lib.packet import ether_types
+from ryu.ofproto import ofproto_v1_3, inet
 from enum import Enum
-from utils import slice_to_port
-from qos import QoS
-from webob import Response
 import json
+import os
+import sys
+import time
+
+# The modules shared by the controllers of both topologies are in topologies/common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import slice_to_port, build_forwarding_index, queue_ports, attached_hosts, switch_neighbors, MAC_MAPPING
+from qos import QoS, QoSJobs, qos_backend, qos_backends, queue_ids, queue_rates, link_rate
+from meters import MeterTable
+from autoscaler import QoSAutoscaler
+from common.snapshot import Snapshot
+from common.transition import TransitionEngine
+from common.convergence import ConvergenceTracker, Transaction
+from common.packet_parser import parse_headers, classify_traffic
+from common.admission import PendingInstalls, PacketInLimiter
+from common.stats import StatsStore, aggregate_slices
+from common.metrics import MetricsRegistry, CONTENT_TYPE
+from common.profiler import SamplingProfiler
+from common.structured_log import StructuredLogger, setup_logging
+from webob import Response
 
 current_modes = []
 
@@ -23,6 +39,106 @@ QUEUE_UDP = 234 # UDP traffic on port 53 is usually for DNS
 QUEUE_ICMP = 345 # ICMP traffic is for ping, its bandwidth is not detectable directly so we could change it?
 QUEUE_GT = 456 # General traffic queue
 
+# Queue and flow entry priority of each traffic class, "any" is the class of the compressed flow
+# entries matching all the IP traffic, which use no queue
+TRAFFIC_CLASSES = {
+    "http": (QUEUE_TCP, 100),
+    "dns": (QUEUE_UDP, 100),
+    "icmp": (QUEUE_ICMP, 100),
+    "general": (QUEUE_GT, 1),
+    "any": (None, 100),
+}
+
+# When enabled, a mode change only deletes and rewrites the flow entries that are no longer
+# valid for the active slices, instead of wiping every flow table
+DIFF_TRANSITIONS = True
+
+# The flow-mods of a mode change are applied to each switch in an atomic bundle (or followed
+# by a barrier if the switch does not support bundles), and the REST call waits for the
+# switches to acknowledge them for at most CONVERGENCE_TIMEOUT seconds
+USE_BUNDLES = True
+CONVERGENCE_TIMEOUT = 5
+
+# Packet-ins accepted per second from each switch and maximum burst, the excess is shed (None disables the limit)
+PACKET_IN_RATE = 1000
+PACKET_IN_BURST = 200
+# Seconds during which a flow entry sent to a switch is considered being installed, so the repeated
+# packet-ins of the same flow are answered with a packet-out only
+PENDING_INSTALL_TTL = 1.0
+
+# Idle and hard timeouts in seconds of the flow entries of each traffic class (0 means no timeout),
+# the switches notify the controller when they expire
+FLOW_TIMEOUTS = {
+    "http": (30, 300),
+    "dns": (10, 60),
+    "icmp": (10, 60),
+    "general": (30, 300),
+    "any": (30, 300),
+}
+# Maximum number of flow entries of a switch, when FLOW_EVICTION is enabled the oldest slice flow entries
+# are deleted as soon as the switch uses more than EVICTION_THRESHOLD of its table
+FLOW_TABLE_LIMIT = 1000
+FLOW_EVICTION = False
+EVICTION_THRESHOLD = 0.9
+# When enabled, the slice flow entries are merged into wider matches where it does not change the forwarding:
+# the entries of a destination that every source reaching a switch forwards through the same output ports
+# do not match the input port, and the entries whose output ports have no queues match all the IP traffic
+# instead of one entry per traffic class
+FLOW_COMPRESSION = True
+# When enabled, the switches use a two-table pipeline: the classifier table matches the traffic class of the IP
+# packets once, writes its queue id to the metadata and to the action set and goes to the forwarding table,
+# whose slice flow entries match the traffic class only when it changes their actions
+MULTI_TABLE = False
+CLASSIFIER_TABLE = 0
+FORWARDING_TABLE = 1
+# Bits of the metadata holding the queue id of the traffic class
+CLASS_METADATA_MASK = 0xffff
+
+# The state of the controller (active modes, QoS rates and slice flow entries of every switch) is saved to
+# SNAPSHOT_PATH after every change, and every SNAPSHOT_INTERVAL seconds for the entries installed by the
+# packet-ins (None disables the snapshot). After a restart the state is restored, and the flow table of every
+# switch is read and reconciled with the snapshot instead of being wiped, waiting at most RECONCILE_TIMEOUT seconds
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot.json")
+SNAPSHOT_INTERVAL = 5
+RECONCILE_TIMEOUT = 5
+
+# Seconds between two polls of the flow and port statistics of the switches (0 disables the polling)
+# and number of samples kept for every port and slice
+STATS_INTERVAL = 10
+STATS_HISTORY = 60
+
+# The autoscaler polls the queue statistics with the other statistics and rebalances the maximum rates of the
+# traffic classes (it is also started and stopped on the /autoscaler routes). A class is saturated when it uses
+# AUTOSCALE_SATURATION of its rate, the rates include AUTOSCALE_HEADROOM over the measured ones and a class
+# shrinks only if it gives back AUTOSCALE_MIN_CHANGE Mb/s. A new allocation is applied when it is proposed by
+# AUTOSCALE_CONFIRM consecutive polls, at least AUTOSCALE_MIN_INTERVAL seconds after the last QoS update
+AUTOSCALE = False
+AUTOSCALE_SATURATION = 0.9
+AUTOSCALE_HEADROOM = 0.2
+AUTOSCALE_MIN_CHANGE = 2
+AUTOSCALE_CONFIRM = 3
+AUTOSCALE_MIN_INTERVAL = 30
+
+# Default seconds between two samples of the profiler started on the /profiler/start route
+# and seconds after which it stops by itself, so that a forgotten profiler does not run forever
+PROFILER_INTERVAL = 0.01
+PROFILER_MAX_DURATION = 600
+
+# The records of the controller are written by a background thread, as key=value pairs or as JSON objects.
+# One packet-in record every LOG_PACKET_SAMPLE is written, and the records are dropped if more
+# than LOG_QUEUE_SIZE are waiting to be written
+LOG_LEVEL = "INFO"
+LOG_JSON = False
+LOG_PACKET_SAMPLE = 1
+LOG_QUEUE_SIZE = 10000
+
+# Label of the flow-mod commands in the metrics
+FLOW_MOD_COMMANDS = {
+    ofproto_v1_3.OFPFC_ADD: "add",
+    ofproto_v1_3.OFPFC_DELETE: "delete",
+    ofproto_v1_3.OFPFC_DELETE_STRICT: "delete_strict",
+}
+
 
 class SecondSlicing(app_manager.RyuApp):
     """
@@ -35,13 +151,242 @@ class SecondSlicing(app_manager.RyuApp):
     def __init__(self, *args, **kwargs):
         super(SecondSlicing, self).__init__(*args, **kwargs)
 
+        self.log_handler = setup_logging(LOG_LEVEL, LOG_JSON, LOG_QUEUE_SIZE)
+        self.log = StructuredLogger("second_controller", LOG_PACKET_SAMPLE)
         self.slice_to_port = slice_to_port()
-        self.queue_exists = {}
+        # (dpid, src, dst) keys of every slice, used to attribute the flow statistics
+        self.slice_pairs = [set(build_forwarding_index(self.slice_to_port, [mode])) for mode in range(len(self.slice_to_port))]
+        self.forwarding_index = {} # (dpid, src, dst) -> out ports of the active slices
+        self.hosts = tuple(MAC_MAPPING.values())
+        self.attached_hosts = attached_hosts() # dpid -> MAC addresses of the hosts linked to the switch
+        self.neighbors = switch_neighbors() # dpid -> {neighbor dpid: port of the neighbor toward the switch}
+        self.merged_ports = {} # (dpid, dst) -> out ports shared by every source reaching the switch, None if they differ
+        self.compression = {} # dpid -> flow entries before and after the last compression
+        self.queue_exists = {} # dpid -> {port: queue ids}
+        self.queue_ports = queue_ports()
+        # Incremented every time the queues of a port change and recorded as the generation of the port. The slice
+        # flow entries are installed with the current generation as cookie: an entry forwarding to a port whose
+        # generation is higher than its cookie was built against older queues of the port
+        self.queue_generation = 0
+        self.queue_generations = {} # dpid -> {port: generation of the last change of its queues}
+        self.flow_generations = {} # dpid -> {(in_port, dst, traffic_class): generation the flow entry was installed with}
+        self.queue_flows_reinstalled = 0
         self.datapaths = {}
+        # The table-miss entry and the HTTP, DNS and ICMP entries are reinstalled after a wipe, in the
+        # pipeline the classifier entries of the four traffic classes and the table-miss entry of both tables
+        self.transition_engine = TransitionEngine(base_flows=6 if MULTI_TABLE else 4)
+        self.convergence = ConvergenceTracker(USE_BUNDLES, CONVERGENCE_TIMEOUT)
+        self.pending_installs = PendingInstalls(PENDING_INSTALL_TTL)
+        self.packet_in_limiter = PacketInLimiter(PACKET_IN_RATE, PACKET_IN_BURST)
+        self.flow_removed = {} # dpid -> {reason: number of flow entries removed}
+        self.stats = StatsStore(STATS_HISTORY)
+        self.init_metrics()
+        self.profiler = SamplingProfiler(PROFILER_INTERVAL, PROFILER_MAX_DURATION)
+        # Backend of the QoS updates, which can be changed through the /qos endpoint
+        self.qos_backend = qos_backend
+        self.meters = MeterTable(queue_ids)
+        self.qos_jobs = QoSJobs(self.qos_job_finished, apply=self.apply_qos)
+        self.autoscaler = QoSAutoscaler(
+            queue_ids, link_rate // 1_000_000, AUTOSCALE_MIN_CHANGE, AUTOSCALE_CONFIRM,
+            AUTOSCALE_MIN_INTERVAL, AUTOSCALE_HEADROOM, AUTOSCALE_SATURATION
+        )
+        self.autoscaler.enabled = AUTOSCALE
+        self.qos_rates = None # maximum rates in bit/s of the traffic classes of the last QoS update
+        self.flow_table_requests = {} # (dpid, xid) -> (event set by the last reply, flow entries received)
+        self.snapshot = Snapshot(SNAPSHOT_PATH)
+        # dpid -> last known slice flow entries of a switch, saved before a restart of the controller or when the
+        # switch disconnected, until the switch connects and is reconciled with them
+        self.warm_rules = {}
+        self.reconnected = set() # DPIDs of the switches in warm_rules because they disconnected
+        self.restore_snapshot()
+        if STATS_INTERVAL:
+            self.stats_thread = hub.spawn(self._stats_loop)
+        if SNAPSHOT_PATH is not None and SNAPSHOT_INTERVAL:
+            self.snapshot_thread = hub.spawn(self._snapshot_loop)
 
         wsgi = kwargs["wsgi"]
         wsgi.register(SecondSlicingController, {second_slicing_instance_name: self})
 
+    def init_metrics(self):
+        """
+        Create the metrics exposed on the /metrics route.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        self.metrics = MetricsRegistry()
+        self.packet_in_counter = self.metrics.counter("sdn_packet_in_total", "Packet-ins handled.", ("dpid", "traffic_class"))
+        self.packet_in_shed_counter = self.metrics.counter("sdn_packet_in_shed_total", "Packet-ins shed by the rate limiter.", ("dpid",))
+        self.packet_in_latency = self.metrics.histogram("sdn_packet_in_handler_seconds", "Time spent handling a packet-in.")
+        self.flow_mod_counter = self.metrics.counter("sdn_flow_mods_total", "Flow-mods sent to the switches.", ("dpid", "command"))
+        self.packet_out_counter = self.metrics.counter("sdn_packet_outs_total", "Packet-outs sent to the switches.", ("dpid",))
+        self.mode_switch_duration = self.metrics.histogram("sdn_mode_switch_seconds", "Time needed to apply a mode change and wait for the switches.", ("mode",))
+        self.resync_duration = self.metrics.histogram("sdn_switch_resync_seconds", "Time needed to reconcile the flow table of a switch that connected.", ("reason",))
+        self.qos_duration = self.metrics.histogram("sdn_qos_update_seconds", "Time needed to create the QoS queues.")
+        self.qos_job_counter = self.metrics.counter("sdn_qos_jobs_total", "QoS jobs finished, by final state.", ("state",))
+        self.queue_generation_gauge = self.metrics.gauge("sdn_queue_cache_generation", "Generation of the queues known by the controller.")
+        self.queue_reinstall_counter = self.metrics.counter("sdn_queue_flows_reinstalled_total", "Flow entries reinstalled because the queues of their output port changed.")
+        self.flow_entries_gauge = self.metrics.gauge("sdn_flow_entries", "Flow entries installed by the controller.", ("dpid",))
+        self.log_dropped_counter = self.metrics.counter("sdn_log_records_dropped_total", "Log records dropped because the log queue was full.")
+        self.log_sampled_counter = self.metrics.counter("sdn_log_packet_records_sampled_out_total", "Packet-in log records skipped by the sampling.")
+
+    def qos_job_finished(self, job):
+        """
+        Record the end of a QoS job in the metrics and the log.
+
+        Args:
+            job (QoSJob): The job, done, failed or superseded.
+
+        Returns:
+            None
+        """
+        self.qos_job_counter.inc((job.state,))
+        if job.state == "superseded":
+            self.log.info("qos job superseded", job_id=job.id, superseded_by=job.superseded_by)
+            return
+        self.qos_duration.observe(job.finished - job.started)
+        if job.state == "failed":
+            self.log.error("qos update failed", job_id=job.id, status=job.report["status"] if job.report else None, error=job.stderr.strip())
+        else:
+            self.log.info("qos updated", job_id=job.id, backend=job.report["backend"], mode=job.report["mode"], rates=job.report["rates"], time_ms=job.report["time_ms"])
+            self.autoscaler.applied(job.report["rates"], job.finished)
+            self.qos_rates = job.report["rates"]
+            self.save_snapshot()
+            # Only the switches with queues are affected
+            for dpid in self.queue_ports:
+                if dpid in self.datapaths:
+                    self.refresh_queues(self.datapaths[dpid])
+
+    def apply_qos(self, job):
+        """
+        Apply a QoS job with its backend, called by the QoS jobs worker. Once the queues are updated,
+        the meters of a previous "meter" update are removed.
+
+        Args:
+            job (QoSJob): The job.
+
+        Returns:
+            dict: The report of the update, see QoS.start_process.
+        """
+        if job.backend == "meter":
+            return self.apply_meters(job.values)
+        report = QoS().start_process(*job.values, backend=job.backend)
+        if report["status"] == 0:
+            self.remove_meters()
+        return report
+
+    def apply_meters(self, values):
+        """
+        Limit the traffic classes with OpenFlow meters on the ports with queues of the connected switches.
+        The switches connecting later get the meters when they connect.
+
+        Args:
+            values (list): The maximum rates in bit/s of the HTTP, DNS and ICMP traffic, as strings.
+
+        Returns:
+            dict: The report of the update, in the format of QoS.start_process. The mode is "update" if the
+            rates of the meters of every switch were modified, "rebuild" if some meters were added.
+        """
+        start = time.perf_counter()
+        rates = queue_rates(values)
+        datapaths = [self.datapaths[dpid] for dpid in self.queue_ports if dpid in self.datapaths]
+        mode = "update" if all(self.meters.installed.get(datapath.id) for datapath in datapaths) else "rebuild"
+        self.meters.rates = rates
+        failed = self.install_meters(datapaths)
+        return {
+            "backend": "meter",
+            "mode": mode,
+            "ports": sum(len(self.queue_ports[datapath.id]) for datapath in datapaths),
+            "rates": rates,
+            "status": 1 if failed else 0,
+            "error": f"The meters were rejected or not acknowledged by the switches {failed}" if failed else "",
+            "time_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+    def install_meters(self, datapaths):
+        """
+        Set the rates of the meters of the switches and wait for them to acknowledge the meter-mods.
+        The slice flow entries of a switch whose meters were added are reinstalled to use them.
+
+        Args:
+            datapaths (list): The datapaths of the switches with queue ports.
+
+        Returns:
+            list: The DPIDs of the switches which rejected or did not acknowledge the meters.
+        """
+        transaction = Transaction()
+        added = []
+        for datapath in datapaths:
+            if not self.meters.installed.get(datapath.id):
+                added.append(datapath)
+            for mod in self.meters.meter_mods(datapath, self.queue_ports[datapath.id], self.meters.rates):
+                transaction.add(datapath, mod)
+        report = self.convergence.commit(transaction, bundles=False)
+
+        failed = []
+        for datapath in datapaths:
+            if report[datapath.id]["converged"]:
+                self.meters.confirm(datapath.id, self.queue_ports[datapath.id])
+            else:
+                # The meters are added again at the next update
+                self.meters.forget(datapath.id)
+                failed.append(datapath.id)
+        for datapath in datapaths:
+            # The entries of all the traffic classes cannot use the meter of each class
+            self.split_class_flows(datapath)
+        for datapath in added:
+            if datapath.id not in failed:
+                self.reinstall_slice_flows(datapath, lambda out_ports, traffic_class: True)
+        self.log.info("meters installed", switches=[datapath.id for datapath in datapaths], failed=failed, rates=self.meters.rates)
+        return failed
+
+    def remove_meters(self):
+        """
+        Stop limiting the traffic classes with meters: the slice flow entries are reinstalled without meters
+        and, once the switches acknowledged them, the meters are deleted.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self.meters.rates is None:
+            return
+        self.meters.rates = None
+        # A switch which rejected some meters may still have the other ones
+        datapaths = [self.datapaths[dpid] for dpid in self.queue_ports if dpid in self.datapaths]
+        transaction = Transaction()
+        for datapath in datapaths:
+            self.reinstall_slice_flows(datapath, lambda out_ports, traffic_class: True, transaction)
+        self.convergence.commit(transaction)
+        # Deleting a meter also deletes the flow entries using it
+        transaction = Transaction()
+        for datapath in datapaths:
+            transaction.add(datapath, self.meters.delete_mod(datapath))
+            self.meters.forget(datapath.id)
+        self.convergence.commit(transaction, bundles=False)
+        self.log.info("meters removed", switches=[datapath.id for datapath in datapaths])
+
+    def collect_metrics(self):
+        """
+        Update the metrics sampled when they are exposed and get the exposition text.
+
+        Args: None
+
+        Returns:
+            str: The metrics in the Prometheus text exposition format.
+        """
+        self.flow_entries_gauge.values.clear()
+        for dpid in self.datapaths:
+            self.flow_entries_gauge.set((dpid,), self.flow_occupancy(dpid))
+        self.log_dropped_counter.values[()] = self.log_handler.dropped
+        self.log_sampled_counter.values[()] = self.log.sampled_out
+        self.queue_generation_gauge.set((), self.queue_generation)
+        self.queue_reinstall_counter.values[()] = self.queue_flows_reinstalled
+        return self.metrics.expose()
+
     @set_ev_cls(ofp_event.EventOFPStateChange, [MAIN_DISPATCHER, DEAD_DISPATCHER])
     def _state_change_handler(self, ev):
         """
@@ -56,19 +401,30 @@ class SecondSlicing(app_manager.RyuApp):
         datapath = ev.datapath
         if ev.state == MAIN_DISPATCHER:
             self.datapaths[datapath.id] = datapath
-            print(f"Switch {datapath.id} connected.")
+            self.log.info("switch connected", dpid=datapath.id)
         elif ev.state == DEAD_DISPATCHER:
             if datapath.id in self.datapaths:
                 del self.datapaths[datapath.id]
-                print(f"Switch {datapath.id} disconnected.")
+                # The switch may keep its flow table through the disconnection, it is reconciled when it connects again
+                self.warm_rules[datapath.id] = {**self.warm_rules.get(datapath.id, {}), **self.transition_engine.installed(datapath.id)}
+                self.reconnected.add(datapath.id)
+                self.transition_engine.forget(datapath.id)
+                self.pending_installs.clear(datapath.id)
+                self.packet_in_limiter.forget(datapath.id)
+                self.queue_exists.pop(datapath.id, None)
+                self.queue_generations.pop(datapath.id, None)
+                self.flow_generations.pop(datapath.id, None)
+                self.meters.forget(datapath.id)
+                self.autoscaler.forget(datapath.id)
+                self.compression.pop(datapath.id, None)
+                self.flow_removed.pop(datapath.id, None)
+                self.stats.forget(datapath.id)
+                self.log.info("switch disconnected", dpid=datapath.id)
 
     @set_ev_cls(ofp_event.EventOFPSwitchFeatures, CONFIG_DISPATCHER)
     def switch_features_handler(self, ev):
         """
-        Handle the switch features event and establish flow entries for packet matching.
-        This method creates:
-        - A flow entry with priority 0 to forward packets that do not match any existing flow rules to the controller.
-        - Flow entries for HTTP (TCP port 80), DNS (UDP port 53), and ICMP packets, that are forwarded to the controller with priority 10.
+        Handle the switch features event and establish flow entries for packet matching (see install_base_flows).
 
         Args:
             ev (EventOFPSwitchFeatures): The event representing the switch features.
@@ -77,6 +433,34 @@ class SecondSlicing(app_manager.RyuApp):
             None
         """
         datapath = ev.msg.datapath
+        self.install_base_flows(datapath)
+
+        self.refresh_queues(datapath)
+        if datapath.id in self.warm_rules:
+            # The switch kept its flow table through the restart of the controller or its disconnection, which is read in another green thread
+            hub.spawn(self.reconcile_switch, datapath, self.warm_rules[datapath.id])
+        elif self.meters.rates is not None and datapath.id in self.queue_ports:
+            # The switch acknowledges the meters through the same event loop, so they are installed in another green thread
+            hub.spawn(self.install_meters, [datapath])
+
+    def install_base_flows(self, datapath, transaction=None):
+        """
+        Install the flow entries that are always on a switch.
+        With a single table this method creates:
+        - A flow entry with priority 0 to forward packets that do not match any existing flow rules to the controller.
+        - Flow entries for HTTP (TCP port 80), DNS (UDP port 53), and ICMP packets, that are forwarded to the controller with priority 10.
+        With MULTI_TABLE it creates:
+        - In the classifier table, a flow entry for every traffic class writing its queue id to the metadata and
+          to the action set before going to the forwarding table, and a table-miss entry for the packets that are not IP.
+        - In the forwarding table, the table-miss entry forwarding to the controller the packets without slice flow entry.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
         ofproto = datapath.ofproto
         parser = datapath.ofproto_parser
 
@@ -86,94 +470,1071 @@ class SecondSlicing(app_manager.RyuApp):
             parser.OFPActionOutput(ofproto.OFPP_CONTROLLER, ofproto.OFPCML_NO_BUFFER)
         ]
         # the table-miss flow entry has priority 0 so that it only matches when no other flow entries match
-        self.add_flow(datapath, 0, match, actions)
+        self.add_flow(datapath, 0, match, actions, transaction)
+
+        if MULTI_TABLE:
+            self.add_flow(datapath, 0, match, actions, transaction, table_id=FORWARDING_TABLE)
+            for traffic_class in ("http", "dns", "icmp", "general"):
+                queue_id, priority = TRAFFIC_CLASSES[traffic_class]
+                # The queue in the action set is used by the forwarding entries that output with write-actions
+                instructions = [
+                    parser.OFPInstructionWriteMetadata(queue_id, CLASS_METADATA_MASK),
+                    parser.OFPInstructionActions(ofproto.OFPIT_WRITE_ACTIONS, [parser.OFPActionSetQueue(queue_id)]),
+                    parser.OFPInstructionGotoTable(FORWARDING_TABLE),
+                ]
+                self.add_flow(datapath, priority, self.class_match(parser, traffic_class), [], transaction, instructions=instructions)
+            return
 
         # If the only rule present is the one for general traffic (priority=1), forward to the controller HTTP, DNS and ICMP packets
+        for traffic_class in ("http", "dns", "icmp"):
+            self.add_flow(datapath, 10, self.class_match(parser, traffic_class), actions, transaction)
+
+    def refresh_queues(self, datapath):
+        """
+        Request the queue configuration of the ports of a switch with queues, derived from the topology.
 
-        match_tcp = parser.OFPMatch(
-            eth_type=ether_types.ETH_TYPE_IP,
-            ip_proto=0x06, # TCP so HTTP
-            tcp_dst=80
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            None
+        """
+        for port_no in self.queue_ports.get(datapath.id, ()):
+            self.request_queue_config(datapath, port_no)
+
+    def request_queue_config(self, datapath, port_no):
+        """
+        Send request messagge for queue configuration on a given port number.
+
+        Args:
+            datapath (datapath): the datapath of the switch
+            port_no (int): the number of the port to know the configuration
+
+        Returns:
+            none
+        """
+        parser = datapath.ofproto_parser
+        req = parser.OFPQueueGetConfigRequest(datapath, port=port_no)
+        datapath.send_msg(req) 
+
+    @set_ev_cls(ofp_event.EventOFPQueueGetConfigReply, MAIN_DISPATCHER)
+    def handle_queue_config_reply(self, ev):
+        """
+        Handles the event of request of queue configuration, sent by request_queue_config. 
+        Put the result in a dictionary used to check, during packets forwarding, if a queue is associated to the candidate port. 
+        When the queues of the port changed, the queue generation is incremented and recorded for the port, and the flow entries using the port are reinstalled.
+
+        Args:
+            ev (EventOFPSwitchFeatures): The event representing the switch features.
+
+        Returns:
+            none   
+        """
+        msg = ev.msg
+        dpid = msg.datapath.id
+        port_no = msg.port
+        queues = msg.queues
+        self.log.debug("queue config", dpid=dpid, port=port_no, queues=[queue.queue_id for queue in queues])
+        if dpid not in self.queue_exists:
+            self.queue_exists[dpid] = {}
+        # Before the first reply the flow entries are installed without queues
+        old_queues = self.queue_exists[dpid].get(port_no, [])
+        new_queues = [queue.queue_id for queue in queues]
+        self.queue_exists[dpid][port_no] = new_queues
+
+        # Verify that a queue exist for a given port, otherwise if the queue doesn't exist the packet would be dropped
+        # The flow entries installed before a change would set a removed queue or skip a new one
+        if set(old_queues) != set(new_queues):
+            self.queue_generation += 1
+            self.queue_generations.setdefault(dpid, {})[port_no] = self.queue_generation
+            changed = set(old_queues) ^ set(new_queues)
+            reinstalled = self.reinstall_queue_flows(msg.datapath, port_no, changed)
+            split = self.split_class_flows(msg.datapath)
+            self.log.info("queues changed", dpid=dpid, port=port_no, queues=new_queues, generation=self.queue_generation, reinstalled=reinstalled, split=split)
+
+    def reinstall_queue_flows(self, datapath, port_no, queue_ids):
+        """
+        Reinstall the slice flow entries of a switch forwarding a traffic class to a port where its queue
+        appeared or disappeared, so that they set the queue only if it exists.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            port_no (int): The port whose queues changed.
+            queue_ids (set): The ids of the queues added to or removed from the port.
+
+        Returns:
+            int: The number of flow entries reinstalled.
+        """
+        reinstalled = self.reinstall_slice_flows(
+            datapath, lambda out_ports, traffic_class: port_no in out_ports and TRAFFIC_CLASSES[traffic_class][0] in queue_ids
         )
-        self.add_flow(datapath, 10, match_tcp, actions)
+        self.queue_flows_reinstalled += reinstalled
+        return reinstalled
+
+    def split_class_flows(self, datapath, transaction=None):
+        """
+        Delete the flow entries of all the traffic classes of a switch whose actions now depend on the class
+        (see class_free), e.g. when a queue disappeared or the meters are enforced. The next packets of every
+        class install their own flow entry.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            int: The number of flow entries deleted.
+        """
+        dpid = datapath.id
+        split = [
+            match_key for match_key, (src, out_ports) in self.transition_engine.installed(dpid).items()
+            if match_key[2] == "any" and not self.class_free(dpid, out_ports)
+        ]
+        for match_key in split:
+            self.delete_slice_flow(datapath, match_key, transaction)
+            self.transition_engine.discard(dpid, match_key)
+        return len(split)
+
+    def reinstall_slice_flows(self, datapath, selected, transaction=None):
+        """
+        Reinstall the slice flow entries of a switch with the current queues and meters.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            selected (callable): Called with the output ports and the traffic class of every flow entry, returns True if it must be reinstalled.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            int: The number of flow entries reinstalled.
+        """
+        reinstalled = 0
+        for (in_port, dst, traffic_class), (src, out_ports) in self.transition_engine.installed(datapath.id).items():
+            if not selected(out_ports, traffic_class):
+                continue
+            # An add with the same match and priority overwrites the flow entry
+            self.install_slice_flow(datapath, (in_port, dst, traffic_class), out_ports, transaction)
+            reinstalled += 1
+        return reinstalled
+
+    def install_slice_flow(self, datapath, match_key, out_ports, transaction=None):
+        """
+        Install a slice flow entry with the current queues and meters. With MULTI_TABLE, an entry of all the
+        traffic classes forwarding to a port with queues writes the output to the action set, so that the
+        packets use the queue written by the classifier table.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            match_key (tuple): The (in_port, dst, traffic_class) key of the flow entry.
+            out_ports (tuple): The output ports.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+
+        Returns:
+            None
+        """
+        parser = datapath.ofproto_parser
+        in_port, dst, traffic_class = match_key
+        queue_id, priority = TRAFFIC_CLASSES[traffic_class]
+        match = self.build_match(parser, in_port, dst, traffic_class)
+        actions, instructions, table_id = self.build_actions(datapath, out_ports, traffic_class), (), 0
+        if MULTI_TABLE:
+            table_id = FORWARDING_TABLE
+            if traffic_class == "any" and set(out_ports) & set(self.queue_ports.get(datapath.id, ())):
+                output = [parser.OFPActionOutput(out_port) for out_port in out_ports]
+                actions, instructions = [], [parser.OFPInstructionActions(datapath.ofproto.OFPIT_WRITE_ACTIONS, output)]
+        idle_timeout, hard_timeout = FLOW_TIMEOUTS[traffic_class]
+        meter_id = self.meters.meter_for(datapath.id, out_ports, queue_id)
+        self.add_flow(datapath, priority, match, actions, transaction, idle_timeout, hard_timeout, self.queue_generation, meter_id, table_id, instructions)
+        self.flow_generations.setdefault(datapath.id, {})[match_key] = self.queue_generation
+
+    def stale_queue_flows(self, dpid):
+        """
+        Get the slice flow entries of a switch built against older queues of one of their output ports.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            list: The (in_port, dst, traffic_class) keys of the flow entries.
+        """
+        port_generations = self.queue_generations.get(dpid, {})
+        flow_generations = self.flow_generations.get(dpid, {})
+        return [
+            match_key for match_key, (src, out_ports) in self.transition_engine.installed(dpid).items()
+            if any(flow_generations.get(match_key, 0) < port_generations.get(out_port, 0) for out_port in out_ports)
+        ]
+
+    def delete_slice_flow(self, datapath, match_key, transaction=None):
+        """
+        Delete a slice flow entry.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            match_key (tuple): The (in_port, dst, traffic_class) key of the flow entry.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+
+        Returns:
+            None
+        """
+        in_port, dst, traffic_class = match_key
+        match = self.build_match(datapath.ofproto_parser, in_port, dst, traffic_class)
+        self.delete_flow(datapath, TRAFFIC_CLASSES[traffic_class][1], match, transaction, FORWARDING_TABLE if MULTI_TABLE else 0)
+
+    def add_flow(self, datapath, priority, match, actions, transaction=None, idle_timeout=0, hard_timeout=0, cookie=0, meter_id=None, table_id=0, instructions=()):
+        """
+        Add a flow entry to the switch's flow table.
+        If the flow entry has a timeout, the switch notifies the controller when it is removed.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            priority (int): The priority of the flow entry.
+            match (OFPMatch): The match criteria for the flow entry.
+            actions (list): The actions to apply for the flow entry.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+            idle_timeout (int): The seconds without matching packets after which the flow entry is removed, 0 for no timeout.
+            hard_timeout (int): The seconds after which the flow entry is removed, 0 for no timeout.
+            cookie (int): The cookie of the flow entry, the queue generation for the slice flow entries.
+            meter_id (int): The meter limiting the packets of the flow entry, None for no meter.
+            table_id (int): The table of the flow entry.
+            instructions (list): The instructions executed after applying the actions, e.g. going to another table.
+
+        Returns:
+            None
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
 
-        match_udp = parser.OFPMatch(
-            eth_type=ether_types.ETH_TYPE_IP,
-            ip_proto=0x11, # UDP so DNS
-            udp_dst=53
+        # construct flow_mod message and send it.
+        inst = list(instructions)
+        if actions or not inst:
+            inst.insert(0, parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions))
+        if meter_id is not None:
+            inst.insert(0, parser.OFPInstructionMeter(meter_id, ofproto.OFPIT_METER))
+        flags = ofproto.OFPFF_SEND_FLOW_REM if idle_timeout or hard_timeout else 0
+        mod = parser.OFPFlowMod(
+            datapath=datapath, cookie=cookie, table_id=table_id, priority=priority, match=match, instructions=inst,
+            idle_timeout=idle_timeout, hard_timeout=hard_timeout, flags=flags
         )
-        self.add_flow(datapath, 10, match_udp, actions)
+        self.send_flow_mod(datapath, mod, transaction)
+
+    def delete_flow(self, datapath, priority, match, transaction=None, table_id=0):
+        """
+        Delete the flow entry with exactly the given priority and match from the switch's flow table.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            priority (int): The priority of the flow entry.
+            match (OFPMatch): The match criteria of the flow entry.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+            table_id (int): The table of the flow entry.
 
-        match_icmp = parser.OFPMatch(
-            eth_type=ether_types.ETH_TYPE_IP,
-            ip_proto=0x01, # ICMP
+        Returns:
+            None
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+
+        mod = parser.OFPFlowMod(
+            datapath=datapath,
+            table_id=table_id,
+            command=ofproto.OFPFC_DELETE_STRICT,
+            priority=priority,
+            match=match,
+            out_port=ofproto.OFPP_ANY,
+            out_group=ofproto.OFPG_ANY,
         )
-        self.add_flow(datapath, 10, match_icmp, actions)
+        self.send_flow_mod(datapath, mod, transaction)
+
+    def send_flow_mod(self, datapath, mod, transaction=None):
+        """
+        Send a flow-mod to a switch, or add it to a transaction.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            mod (OFPFlowMod): The flow-mod.
+            transaction (Transaction): The transaction collecting the flow-mod, if None it is sent immediately.
+
+        Returns:
+            None
+        """
+        self.flow_mod_counter.inc((datapath.id, FLOW_MOD_COMMANDS.get(mod.command, mod.command)))
+        if transaction is not None:
+            transaction.add(datapath, mod)
+        else:
+            datapath.send_msg(mod)
+
+    @set_ev_cls(ofp_event.EventOFPFlowRemoved, MAIN_DISPATCHER)
+    def flow_removed_handler(self, ev):
+        """
+        Handle the flow entries removed by the switches after a timeout, so that the
+        flow entries recorded for every switch match its flow table.
+
+        Args:
+            ev (EventOFPFlowRemoved): The event containing the removed flow entry.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        ofproto = msg.datapath.ofproto
+        reasons = {ofproto.OFPRR_IDLE_TIMEOUT: "idle_timeout", ofproto.OFPRR_HARD_TIMEOUT: "hard_timeout"}
+        reason = reasons.get(msg.reason)
+        if reason is None:
+            # The flow entries deleted by the controller are already forgotten
+            return
+
+        dpid = msg.datapath.id
+        traffic_class = self.match_traffic_class(msg.match, msg.priority)
+        match_key = (msg.match.get("in_port"), msg.match.get("eth_dst"), traffic_class)
+        if self.transition_engine.discard(dpid, match_key):
+            self.count_removed(dpid, reason)
+
+    def count_removed(self, dpid, reason, count=1):
+        """
+        Count the flow entries removed from a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            reason (str): "idle_timeout", "hard_timeout" or "evicted".
+            count (int): The number of flow entries.
+
+        Returns:
+            None
+        """
+        counters = self.flow_removed.setdefault(dpid, {"idle_timeout": 0, "hard_timeout": 0, "evicted": 0})
+        counters[reason] += count
+
+    def flow_occupancy(self, dpid):
+        """
+        Get the number of flow entries installed by the controller on a switch.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            int: The base flow entries (see install_base_flows) and the slice flow entries of the switch.
+        """
+        return self.transition_engine.base_flows + len(self.transition_engine.installed(dpid))
+
+    def make_room(self, datapath):
+        """
+        If FLOW_EVICTION is enabled and the flow table of a switch is almost full, delete its
+        oldest slice flow entries so that a new one can be installed.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            None
+        """
+        if not FLOW_EVICTION:
+            return
+        dpid = datapath.id
+        excess = self.flow_occupancy(dpid) + 1 - int(FLOW_TABLE_LIMIT * EVICTION_THRESHOLD)
+        if excess <= 0:
+            return
+
+        evicted = self.transition_engine.oldest(dpid, excess)
+        for match_key, value in evicted:
+            self.delete_slice_flow(datapath, match_key)
+            self.transition_engine.discard(dpid, match_key)
+        self.count_removed(dpid, "evicted", len(evicted))
+
+    def flow_table_counters(self):
+        """
+        Get the flow table occupancy of every switch.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {dpid: {"flows", "limit", "idle_timeout", "hard_timeout", "evicted", "compression"}}.
+        """
+        counters = {}
+        for dpid in self.datapaths:
+            removed = self.flow_removed.get(dpid, {"idle_timeout": 0, "hard_timeout": 0, "evicted": 0})
+            counters[dpid] = {"flows": self.flow_occupancy(dpid), "limit": FLOW_TABLE_LIMIT, **removed, "compression": self.compression.get(dpid)}
+        return counters
+
+    def _stats_loop(self):
+        """
+        Poll the flow and port statistics of every switch every STATS_INTERVAL seconds.
+        The flow statistics of the previous poll are aggregated by slice before sending the new requests,
+        and the autoscaler evaluates the queue statistics of the previous poll.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        while True:
+            if self.stats.flows:
+                self.stats.add_slice_samples(time.time(), self.slice_flow_stats())
+            if self.autoscaler.enabled:
+                self.autoscale()
+            for datapath in list(self.datapaths.values()):
+                self.request_stats(datapath)
+            hub.sleep(STATS_INTERVAL)
+
+    def request_stats(self, datapath):
+        """
+        Request the flow and port statistics of a switch, and the statistics of its queues when the autoscaler is enabled.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            None
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        datapath.send_msg(parser.OFPFlowStatsRequest(datapath))
+        datapath.send_msg(parser.OFPPortStatsRequest(datapath, 0, ofproto.OFPP_ANY))
+        if self.autoscaler.enabled:
+            for port_no, queues in self.queue_exists.get(datapath.id, {}).items():
+                if queues:
+                    datapath.send_msg(parser.OFPQueueStatsRequest(datapath, 0, port_no, ofproto.OFPQ_ALL))
+
+    @set_ev_cls(ofp_event.EventOFPFlowStatsReply, MAIN_DISPATCHER)
+    def flow_stats_reply_handler(self, ev):
+        """
+        Handle the flow statistics replies.
+
+        Args:
+            ev (EventOFPFlowStatsReply): The event containing the flow statistics.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        more = bool(msg.flags & msg.datapath.ofproto.OFPMPF_REPLY_MORE)
+        request = self.flow_table_requests.get((msg.datapath.id, msg.xid))
+        if request is not None:
+            # The flow table requested by read_flow_table
+            request[1].extend(msg.body)
+            if not more:
+                request[0].set()
+            return
+        self.stats.add_flow_stats(msg.datapath.id, msg.body, more)
+
+    @set_ev_cls(ofp_event.EventOFPPortStatsReply, MAIN_DISPATCHER)
+    def port_stats_reply_handler(self, ev):
+        """
+        Handle the port statistics replies.
+
+        Args:
+            ev (EventOFPPortStatsReply): The event containing the port statistics.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        self.stats.add_port_stats(msg.datapath.id, msg.body, time.time())
+
+    @set_ev_cls(ofp_event.EventOFPQueueStatsReply, MAIN_DISPATCHER)
+    def queue_stats_reply_handler(self, ev):
+        """
+        Handle the queue statistics replies, used by the autoscaler.
+
+        Args:
+            ev (EventOFPQueueStatsReply): The event containing the queue statistics.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        now = time.time()
+        for stat in msg.body:
+            self.autoscaler.observe(msg.datapath.id, stat.port_no, stat.queue_id, stat.tx_bytes, now)
+
+    def autoscale(self):
+        """
+        Evaluate the allocation of the autoscaler and submit a QoS update when it changes.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        values = self.autoscaler.evaluate(time.time())
+        if values is None:
+            self.log.debug("autoscaler", decision=self.autoscaler.last_decision, rates=self.autoscaler.class_rates())
+            return
+        job = self.qos_jobs.submit([str(value * 1_000_000) for value in values], self.qos_backend)
+        self.log.info("qos autoscaled", job_id=job.id, values=values, rates=[round(rate) for rate in self.autoscaler.class_rates()])
+
+    def slice_flow_stats(self):
+        """
+        Aggregate the last flow statistics of the switches by slice and traffic class. A flow entry
+        shared by several active slices is counted in each of them, the flow entries of the hosts that
+        are not in an active slice (whose packets are dropped) are counted in "unsliced".
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {slice_name: {"flows", "packets", "bytes", "classes"}}.
+        """
+        global current_modes
+        entries = []
+        for dpid, flows in self.stats.flows.items():
+            installed = self.transition_engine.installed(dpid)
+            for stat in flows:
+                in_port = stat.match.get("in_port")
+                dst = stat.match.get("eth_dst")
+                traffic_class = self.match_traffic_class(stat.match, stat.priority)
+                if in_port is None:
+                    # The merged flow entries carry the traffic of every source to the destination
+                    if (None, dst, traffic_class) not in installed:
+                        continue
+                    src, sources = None, self.reaching_sources(dpid, dst)
+                else:
+                    src = installed.get((in_port, dst, traffic_class), (None,))[0]
+                    sources = (src,)
+                slice_names = tuple(
+                    SecondSlicingController.index_to_mode_name[mode]
+                    for mode in sorted(current_modes) if any((dpid, source, dst) in self.slice_pairs[mode] for source in sources)
+                ) or ("unsliced",)
+                entries.append((dpid, (src, dst), slice_names, traffic_class, stat.packet_count, stat.byte_count))
+        return aggregate_slices(entries)
+
+    @set_ev_cls(ofp_event.EventOFPBarrierReply, MAIN_DISPATCHER)
+    def barrier_reply_handler(self, ev):
+        """
+        Handle the barrier replies acknowledging the flow-mods of a mode change.
+
+        Args:
+            ev (EventOFPBarrierReply): The event containing the barrier reply.
+
+        Returns:
+            None
+        """
+        self.convergence.reply(ev.msg.datapath.id, ev.msg.xid)
+
+    @set_ev_cls(ofp_event.EventONFBundleCtrlMsg, MAIN_DISPATCHER)
+    def bundle_reply_handler(self, ev):
+        """
+        Handle the bundle commit replies acknowledging the flow-mods of a mode change.
+
+        Args:
+            ev (EventONFBundleCtrlMsg): The event containing the bundle control reply.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        if msg.type == msg.datapath.ofproto.ONF_BCT_COMMIT_REPLY:
+            self.convergence.reply(msg.datapath.id, msg.xid)
+
+    @set_ev_cls(ofp_event.EventOFPErrorMsg, MAIN_DISPATCHER)
+    def error_msg_handler(self, ev):
+        """
+        Handle the errors sent by the switches, which may reject a bundle or a flow-mod.
+
+        Args:
+            ev (EventOFPErrorMsg): The event containing the error message.
+
+        Returns:
+            None
+        """
+        msg = ev.msg
+        self.convergence.error(msg.datapath.id, msg.xid, msg)
+
+    @staticmethod
+    def class_fields(traffic_class):
+        """
+        Get the match fields of the packets of a traffic class.
+
+        Args:
+            traffic_class (str): One of "http", "dns", "icmp", "general" or "any".
+
+        Returns:
+            dict: The match fields.
+        """
+        fields = {"eth_type": ether_types.ETH_TYPE_IP}
+        if traffic_class == "http":
+            fields.update(ip_proto=0x06, tcp_dst=80) # TCP so HTTP
+        elif traffic_class == "dns":
+            fields.update(ip_proto=0x11, udp_dst=53) # UDP so DNS
+        elif traffic_class == "icmp":
+            fields.update(ip_proto=0x01)
+        return fields
+
+    @staticmethod
+    def class_match(parser, traffic_class):
+        """
+        Build the match of the packets of a traffic class, used by the entries forwarding them to the controller
+        and by the classifier table of the pipeline.
+
+        Args:
+            parser (module): The OpenFlow parser of the datapath.
+            traffic_class (str): One of "http", "dns", "icmp" or "general".
+
+        Returns:
+            OFPMatch: The match of the traffic class.
+        """
+        return parser.OFPMatch(**SecondSlicing.class_fields(traffic_class))
+
+    @staticmethod
+    def build_match(parser, in_port, dst, traffic_class):
+        """
+        Build the match of a flow entry for a given traffic class. With MULTI_TABLE, the entries of the
+        forwarding table match the queue id written to the metadata by the classifier table instead.
+
+        Args:
+            parser (module): The OpenFlow parser of the datapath.
+            in_port (int): The input port, None for a merged flow entry matching every input port.
+            dst (str): The destination MAC address.
+            traffic_class (str): One of "http", "dns", "icmp", "general" or "any".
+
+        Returns:
+            OFPMatch: The match of the flow entry.
+        """
+        fields = {"eth_dst": dst} if in_port is None else {"in_port": in_port, "eth_dst": dst}
+        if not MULTI_TABLE:
+            return parser.OFPMatch(**fields, **SecondSlicing.class_fields(traffic_class))
+        fields["eth_type"] = ether_types.ETH_TYPE_IP
+        if traffic_class != "any":
+            fields["metadata"] = (TRAFFIC_CLASSES[traffic_class][0], CLASS_METADATA_MASK)
+        return parser.OFPMatch(**fields)
+
+    @staticmethod
+    def match_traffic_class(match, priority):
+        """
+        Get the traffic class of a flow entry built by build_match.
+
+        Args:
+            match (OFPMatch): The match of the flow entry.
+            priority (int): The priority of the flow entry.
+
+        Returns:
+            str: One of "http", "dns", "icmp", "general" or "any".
+        """
+        metadata = match.get("metadata")
+        if metadata is not None:
+            queue_id = (metadata[0] if isinstance(metadata, tuple) else metadata) & CLASS_METADATA_MASK
+            return next(name for name, (class_queue, _) in TRAFFIC_CLASSES.items() if class_queue == queue_id)
+        if priority == TRAFFIC_CLASSES["general"][1]:
+            return "general"
+        return {0x06: "http", 0x11: "dns", 0x01: "icmp"}.get(match.get("ip_proto"), "any")
+
+    def build_actions(self, datapath, out_ports, traffic_class):
+        """
+        Build the actions forwarding a traffic class to the given ports, using the queue
+        of the class on the ports where it exists.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            out_ports (list): The output ports.
+            traffic_class (str): One of "http", "dns", "icmp" or "general".
+
+        Returns:
+            list: The actions of the flow entry.
+        """
+        parser = datapath.ofproto_parser
+        queue_id = TRAFFIC_CLASSES[traffic_class][0]
+        port_queues = self.queue_exists.get(datapath.id, {})
+        actions = []
+        for out_port in out_ports:
+            if queue_id in port_queues.get(out_port, []):
+                actions.append(parser.OFPActionSetQueue(queue_id)) # If the given QUEUE_ID is associated with the port, add the action otherwise no
+            actions.append(parser.OFPActionOutput(out_port))
+        return actions
+
+    def update_forwarding_index(self):
+        """
+        Rebuild the forwarding index from the active slices. It must be called every time the active modes change.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        global current_modes
+        self.forwarding_index = build_forwarding_index(self.slice_to_port, current_modes)
+        self.merged_ports = {}
+
+    def reaching_sources(self, dpid, dst):
+        """
+        Get the source hosts whose packets to a destination can reach a switch: the hosts linked to the switch,
+        which can send anything, and the sources that a neighbor switch forwards toward it.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            dst (str): The MAC address of the destination.
+
+        Returns:
+            set: The MAC addresses of the sources.
+        """
+        sources = {src for src in self.attached_hosts.get(dpid, ()) if src != dst}
+        for neighbor, port_no in self.neighbors.get(dpid, {}).items():
+            sources.update(src for src in self.hosts if port_no in self.forwarding_index.get((neighbor, src, dst), ()))
+        return sources
+
+    def merged_out_ports(self, dpid, dst):
+        """
+        Get the output ports of a destination shared by every source reaching a switch. The flow entries of the
+        destination can then be merged into a single entry without the input port: any packet matching it would
+        be forwarded to the same ports by the per input port entries, so no slice gets more traffic.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            dst (str): The MAC address of the destination.
+
+        Returns:
+            tuple: The sorted output ports, None if the sources are forwarded differently.
+        """
+        key = (dpid, dst)
+        if key not in self.merged_ports:
+            out_ports = {frozenset(self.forwarding_index.get((dpid, src, dst), ())) for src in self.reaching_sources(dpid, dst)}
+            self.merged_ports[key] = tuple(sorted(out_ports.pop())) if len(out_ports) == 1 else None
+        return self.merged_ports[key]
+
+    def widest_match(self, dpid, in_port, dst, traffic_class, out_ports):
+        """
+        Get the widest flow entry that forwards a packet like the entry of its input port and traffic class:
+        the input port is left out when every source reaching the switch shares the output ports, and the
+        traffic class when the actions do not depend on it (see class_free).
+
+        Args:
+            dpid (int): The DPID of the switch.
+            in_port (int): The input port, None for a merged flow entry.
+            dst (str): The destination MAC address.
+            traffic_class (str): One of "http", "dns", "icmp", "general" or "any".
+            out_ports (tuple): The output ports of the flow entry.
+
+        Returns:
+            tuple: The (in_port, dst, traffic_class) key of the flow entry.
+        """
+        if self.merged_out_ports(dpid, dst) == tuple(sorted(out_ports)):
+            in_port = None
+        if self.class_free(dpid, out_ports):
+            traffic_class = "any"
+        return (in_port, dst, traffic_class)
+
+    def class_free(self, dpid, out_ports):
+        """
+        Check whether the flow entries forwarding to the given ports can serve all the traffic classes: none
+        of the ports has queues, or with MULTI_TABLE the packets go to a single port having the queues of
+        every class, which they get from the classifier table, and no meter is enforced.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            out_ports (tuple): The output ports.
+
+        Returns:
+            bool: True if the traffic class does not change the actions.
+        """
+        if not set(out_ports) & set(self.queue_ports.get(dpid, ())):
+            return True
+        if not MULTI_TABLE or len(out_ports) != 1 or self.meters.rates is not None:
+            return False
+        class_queues = {queue_id for queue_id, priority in TRAFFIC_CLASSES.values() if queue_id is not None}
+        return class_queues <= set(self.queue_exists.get(dpid, {}).get(out_ports[0], ()))
+
+    def compress_flows(self, datapath, transaction=None):
+        """
+        Merge the slice flow entries of a switch into the widest entries forwarding their packets the same way
+        (see widest_match): the wider entry is added and the entries it replaces are deleted.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            dict: The flow entries of the switch before and after the compression and the entries merged.
+        """
+        dpid = datapath.id
+        before = self.flow_occupancy(dpid)
+        installed = self.transition_engine.installed(dpid)
+        groups = {}
+        for match_key, (src, out_ports) in installed.items():
+            wide_key = self.widest_match(dpid, *match_key, out_ports)
+            if wide_key != match_key:
+                value = (None, self.merged_out_ports(dpid, match_key[1])) if wide_key[0] is None else (src, out_ports)
+                groups.setdefault(wide_key, []).append((match_key, value))
+
+        merged = 0
+        for wide_key, entries in groups.items():
+            # A single entry is merged only if the wider entry already exists, otherwise nothing is saved
+            if len(entries) < 2 and wide_key not in installed:
+                continue
+            value = entries[0][1]
+            if installed.get(wide_key) != value:
+                self.install_slice_flow(datapath, wide_key, value[1], transaction)
+                self.transition_engine.record(dpid, wide_key, value)
+            for match_key, _ in entries:
+                self.delete_slice_flow(datapath, match_key, transaction)
+                self.transition_engine.discard(dpid, match_key)
+            merged += len(entries)
+
+        self.compression[dpid] = {"before": before, "after": self.flow_occupancy(dpid), "merged": merged}
+        if merged:
+            self.log.info("flow entries compressed", dpid=dpid, **self.compression[dpid])
+        return self.compression[dpid]
+
+    def apply_transition(self, transaction=None):
+        """
+        Move every switch to the active slices by deleting the flow entries whose hosts can no longer
+        communicate and rewriting the ones whose output ports changed, while the other entries
+        keep forwarding packets.
+
+        Args:
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
+        new_rules = {dpid: self.expected_rules(dpid) for dpid in self.datapaths}
+        self.send_plan(self.transition_engine.transition(new_rules), transaction)
+
+        report = self.transition_engine.last_report
+        self.log.info("slice transition", sent=report["sent"], saved=report["saved"], unchanged=report["unchanged"])
+        if FLOW_COMPRESSION:
+            for dpid, datapath in self.datapaths.items():
+                self.compress_flows(datapath, transaction)
+
+    def send_plan(self, plan, transaction=None):
+        """
+        Send the flow-mods of a transition plan to the switches.
+
+        Args:
+            plan (dict): The flow entries to delete and to add of every switch {dpid: (to_delete, to_add)}.
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
+
+        Returns:
+            None
+        """
+        for dpid, (to_delete, to_add) in plan.items():
+            datapath = self.datapaths.get(dpid)
+            if datapath is None:
+                continue
+            for match_key in to_delete:
+                self.delete_slice_flow(datapath, match_key, transaction)
+            for match_key, (src, out_ports) in to_add:
+                self.install_slice_flow(datapath, match_key, out_ports, transaction)
+
+    def restore_snapshot(self):
+        """
+        Restore the active modes, the QoS rates and backend and the slice flow entries saved before a restart.
+        The entries are only trusted once the switches confirm them, see reconcile_switch.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        global current_modes
+        snapshot = self.snapshot.load()
+        if snapshot is None:
+            return
+        current_modes[:] = [mode for mode in snapshot["modes"] if mode in SecondSlicingController.index_to_mode_name]
+        self.update_forwarding_index()
+        qos = snapshot.get("qos", {})
+        if qos.get("backend") in qos_backends:
+            self.qos_backend = qos["backend"]
+        if qos.get("rates"):
+            self.qos_rates = qos["rates"]
+            self.autoscaler.applied(self.qos_rates, time.time())
+        # The meters still on the switches are confirmed when they are reconciled
+        self.meters.rates = qos.get("meter_rates")
+        self.warm_rules = snapshot["rules"]
+        self.log.info("snapshot restored", modes=current_modes, backend=self.qos_backend, rates=self.qos_rates, switches=len(self.warm_rules))
+
+    def save_snapshot(self):
+        """
+        Save the state of the controller, if it changed. The entries of the switches that were not reconciled
+        since the restart are kept.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        global current_modes
+        rules = {dpid: dict(switch_rules) for dpid, switch_rules in self.warm_rules.items()}
+        for dpid, switch_rules in self.transition_engine.rules.items():
+            rules.setdefault(dpid, {}).update(switch_rules)
+        qos = {"backend": self.qos_backend, "rates": self.qos_rates, "meter_rates": self.meters.rates}
+        try:
+            self.snapshot.save(list(current_modes), rules, qos=qos)
+        except OSError as error:
+            self.log.error("snapshot not saved", path=self.snapshot.path, error=str(error))
+
+    def _snapshot_loop(self):
+        """
+        Save the state of the controller every SNAPSHOT_INTERVAL seconds, for the flow entries installed by the packet-ins.
 
+        Args: None
 
-        for port_no in range(1, 6):  # Request queue config for each port
-            self.request_queue_config(datapath, port_no)
+        Returns:
+            None
+        """
+        while True:
+            hub.sleep(SNAPSHOT_INTERVAL)
+            self.save_snapshot()
 
-    def request_queue_config(self, datapath, port_no):
+    def read_flow_table(self, datapath):
         """
-        Send request messagge for queue configuration on a given port number.
+        Request the flow entries of every table of a switch and wait for them. It must run in a green thread
+        other than the event loop, which handles the replies.
 
         Args:
-            datapath (datapath): the datapath of the switch
-            port_no (int): the number of the port to know the configuration
+            datapath (Datapath): The datapath of the switch.
 
         Returns:
-            none
+            list: The OFPFlowStats of the flow entries, None if the switch did not answer within RECONCILE_TIMEOUT seconds.
         """
-        parser = datapath.ofproto_parser
-        req = parser.OFPQueueGetConfigRequest(datapath, port=port_no)
-        datapath.send_msg(req) 
-
-    @set_ev_cls(ofp_event.EventOFPQueueGetConfigReply, MAIN_DISPATCHER)
-    def handle_queue_config_reply(self, ev):
+        req = datapath.ofproto_parser.OFPFlowStatsRequest(datapath)
+        xid = datapath.set_xid(req)
+        event, entries = hub.Event(), []
+        self.flow_table_requests[(datapath.id, xid)] = (event, entries)
+        try:
+            datapath.send_msg(req)
+            received = event.wait(timeout=RECONCILE_TIMEOUT)
+        finally:
+            self.flow_table_requests.pop((datapath.id, xid), None)
+        return entries if received else None
+
+    def slice_flow_key(self, datapath, stat):
         """
-        Handles the event of request of queue configuration, sent by request_queue_config. 
-        Put the result in a dictionary used to check, during packets forwarding, if a queue is associated to the candidate port. 
+        Get the key and the output ports of a flow entry read from a switch, if it is a slice flow entry
+        in the form the controller installs it.
 
         Args:
-            ev (EventOFPSwitchFeatures): The event representing the switch features.
+            datapath (Datapath): The datapath of the switch.
+            stat (OFPFlowStats): The flow entry.
 
         Returns:
-            none   
+            tuple: The (in_port, dst, traffic_class) key and the output ports, None if the entry is not a slice flow entry.
         """
-        msg = ev.msg
-        dpid = msg.datapath.id
-        port_no = msg.port
-        queues = msg.queues
-        print(dpid, " ", port_no, ": ", queues)
-        if dpid not in self.queue_exists:
-            self.queue_exists[dpid] = {}
-        self.queue_exists[dpid][port_no] = [queue.queue_id for queue in queues]
-
-        # Verify that a queue exist for a given port, otherwise if the queue doesn't exist the packet would be dropped
+        dst = stat.match.get("eth_dst")
+        if dst is None or stat.priority not in (TRAFFIC_CLASSES["general"][1], TRAFFIC_CLASSES["http"][1]):
+            return None
+        match_key = (stat.match.get("in_port"), dst, self.match_traffic_class(stat.match, stat.priority))
+        table_id = FORWARDING_TABLE if MULTI_TABLE else 0
+        if stat.table_id != table_id or dict(stat.match.items()) != dict(self.build_match(datapath.ofproto_parser, *match_key).items()):
+            return None
+        out_ports = tuple(
+            action.port for instruction in stat.instructions for action in getattr(instruction, "actions", ())
+            if isinstance(action, datapath.ofproto_parser.OFPActionOutput)
+        )
+        return match_key, out_ports
 
-    def add_flow(self, datapath, priority, match, actions):
+    def reconcile_switch(self, datapath, reference):
         """
-        Add a flow entry to the switch's flow table.
+        Reconcile the flow table of a switch that connected with its last known slice flow entries, saved before
+        a restart of the controller or when it disconnected, without touching the other switches: the entries
+        read from the switch with the same output ports are recorded as installed, the other slice flow
+        entries are deleted and only the entries still missing for the active slices are sent, like in a mode change,
+        so that its packets keep being forwarded. If the flow table cannot be read, it is wiped first.
 
         Args:
             datapath (Datapath): The datapath of the switch.
-            priority (int): The priority of the flow entry.
-            match (OFPMatch): The match criteria for the flow entry.
-            actions (list): The actions to apply for the flow entry.
+            reference (dict): The last known slice flow entries of the switch {match_key: (src, out_ports)}.
 
         Returns:
-            None
+            dict: The flow entries adopted, deleted and added.
         """
+        start = time.perf_counter()
+        dpid = datapath.id
         ofproto = datapath.ofproto
-        parser = datapath.ofproto_parser
-
-        # construct flow_mod message and send it.
-        inst = [parser.OFPInstructionActions(ofproto.OFPIT_APPLY_ACTIONS, actions)]
-        mod = parser.OFPFlowMod(
-            datapath=datapath, priority=priority, match=match, instructions=inst
+        entries = self.read_flow_table(datapath)
+        transaction = Transaction()
+        adopted = deleted = 0
+        if entries is None:
+            self.log.warning("flow table not received, wiping it", dpid=dpid)
+            mod = datapath.ofproto_parser.OFPFlowMod(
+                datapath=datapath, table_id=ofproto.OFPTT_ALL, command=ofproto.OFPFC_DELETE,
+                out_port=ofproto.OFPP_ANY, out_group=ofproto.OFPG_ANY
+            )
+            self.send_flow_mod(datapath, mod, transaction)
+            self.transition_engine.forget(dpid)
+            self.install_base_flows(datapath, transaction)
+            entries = []
+
+        installed = self.transition_engine.installed(dpid)
+        for stat in entries:
+            if stat.priority == 0 or "eth_dst" not in dict(stat.match.items()):
+                continue # The base flow entries were installed again when the switch connected
+            key = self.slice_flow_key(datapath, stat)
+            if key is not None and key[0] in installed:
+                continue # Installed again by a packet-in since the switch connected
+            saved = reference.get(key[0]) if key is not None else None
+            if saved is not None and tuple(sorted(saved[1])) == tuple(sorted(key[1])):
+                self.transition_engine.record(dpid, key[0], saved)
+                adopted += 1
+            else:
+                self.delete_flow(datapath, stat.priority, stat.match, transaction, stat.table_id)
+                deleted += 1
+
+        # The entries of the snapshot missing from the switch (e.g. restarted) are installed again if they are still valid
+        expected = self.expected_rules(dpid, {**reference, **self.transition_engine.installed(dpid)})
+        plan = self.transition_engine.transition({dpid: expected}, {dpid})
+        self.send_plan(plan, transaction)
+        if FLOW_COMPRESSION:
+            self.compress_flows(datapath, transaction)
+        report = self.convergence.commit(transaction)
+        self.warm_rules.pop(dpid, None)
+        reason = "reconnect" if dpid in self.reconnected else "restart"
+        self.reconnected.discard(dpid)
+
+        if self.meters.rates is not None and dpid in self.queue_ports:
+            if adopted:
+                # The meters used by the adopted entries are still on the switch, their rates are set again
+                self.meters.confirm(dpid, self.queue_ports[dpid])
+            self.install_meters([datapath])
+        result = {"adopted": adopted, "deleted": deleted + len(plan[dpid][0]), "added": len(plan[dpid][1])}
+        self.log.info(
+            "switch reconciled", dpid=dpid, reason=reason, **result, converged=report[dpid]["converged"] if dpid in report else True,
+            time_ms=round((time.perf_counter() - start) * 1000, 3)
         )
-        datapath.send_msg(mod)
+        self.resync_duration.observe(time.perf_counter() - start, (reason,))
+        self.save_snapshot()
+        return result
+
+    def expected_rules(self, dpid, installed=None):
+        """
+        Compute the flow entries a switch should keep with the active slices. Entries whose hosts
+        can no longer communicate are dropped, so that the next packet goes through the controller again.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            installed (dict): The flow entries of the switch to check, the installed ones if None.
+
+        Returns:
+            dict: A dictionary {(in_port, dst, traffic_class): (src, out_ports)}.
+        """
+        rules = {}
+        if installed is None:
+            installed = self.transition_engine.installed(dpid)
+        for match_key, (src, out_ports) in installed.items():
+            in_port, dst, traffic_class = match_key
+            if in_port is None:
+                # A merged flow entry is kept only while every source is still forwarded to the same ports
+                new_out_ports = self.merged_out_ports(dpid, dst)
+                src = None
+            else:
+                new_out_ports = self.forwarding_index.get((dpid, src, dst), ())
+                if not new_out_ports and out_ports:
+                    continue
+            # An entry of all the traffic classes cannot use the queues of its new ports
+            if new_out_ports is not None and (traffic_class != "any" or self.class_free(dpid, new_out_ports)):
+                rules[match_key] = (src, new_out_ports)
+        return rules
+
+    def packet_in_counters(self):
+        """
+        Get the packet-in counters of every switch.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {dpid: {"admitted", "shed", "duplicates"}}, where duplicates are the
+            packet-ins answered with a packet-out only because their flow entry was being installed.
+        """
+        counters = self.packet_in_limiter.counters()
+        for dpid, duplicates in self.pending_installs.duplicates.items():
+            counters.setdefault(dpid, {"admitted": 0, "shed": 0})["duplicates"] = duplicates
+        for entry in counters.values():
+            entry.setdefault("duplicates", 0)
+        return counters
 
     def _send_package(self, msg, datapath, in_port, actions):
         """
@@ -200,6 +1561,7 @@ class SecondSlicing(app_manager.RyuApp):
             actions=actions,
             data=data,
         )
+        self.packet_out_counter.inc((datapath.id,))
         datapath.send_msg(out)
 
     @set_ev_cls(ofp_event.EventOFPPacketIn, MAIN_DISPATCHER)
@@ -207,8 +1569,21 @@ class SecondSlicing(app_manager.RyuApp):
         """
         Handle Packet-In events sent by switches to the controller.
         These events occur when a packet does not match any flow rule or is explicitly
-        transmitted to the controller. The function processes the packet, determining its type
-        (HTTP, DNS, ICMP, or normal traffic) and creates appropriate actions and flow rules.
+        transmitted to the controller. The time spent handling the packet is recorded in the metrics.
+
+        Args:
+            ev (EventOFPPacketIn): The event containing the Packet-In message.
+
+        Returns:
+            None
+        """
+        with self.packet_in_latency.time():
+            self.handle_packet_in(ev)
+
+    def handle_packet_in(self, ev):
+        """
+        Process a Packet-In, determining its type (HTTP, DNS, ICMP, or normal traffic)
+        and create appropriate actions and flow rules.
 
         Args:
             ev (EventOFPPacketIn): The event containing the Packet-In message.
@@ -221,97 +1596,49 @@ class SecondSlicing(app_manager.RyuApp):
         datapath = msg.datapath
         dpid = datapath.id
         in_port = msg.match['in_port']
-        ofp_parser = datapath.ofproto_parser # contains the parser
-        pkt = packet.Packet(msg.data)
-        eth = pkt.get_protocol(ethernet.ethernet)
-        # ip_pkt = pkt.get_protocol(ipv4.ipv4) # If we want to change and add IP as a service
-        tcp_pkt = pkt.get_protocol(tcp.tcp)
-        udp_pkt = pkt.get_protocol(udp.udp)
-        icmp_pkt = pkt.get_protocol(icmp.icmp)
-
-        src = eth.src # MAC source
-        dst = eth.dst # MAC destination to create match rules
-
-        ipv4_pkt = pkt.get_protocol(ipv4.ipv4)
-        if ipv4_pkt is None: # Packets that not contains ipv4 layer will be dropped, need to check this
+        if not self.packet_in_limiter.allow(dpid): # Shed the packet-in to protect the event loop during a miss storm
+            self.packet_in_shed_counter.inc((dpid,))
             return
 
-        out_ports = []
-        switch_map = None
-        entries = None
-        for slice in current_modes: # Check if the communication requested is in one of the active slices
-            if out_ports:
-                break
-            if dpid in self.slice_to_port[slice]:
-                switch_map = self.slice_to_port[slice].get(dpid, {})
-                if src in switch_map:
-                    entries = switch_map.get(src, [])
-                    for entry in entries:
-                        if dst in entry:
-                            out_ports.append(entry[dst])
-
-
-        actions =[]
-        if tcp_pkt and tcp_pkt.dst_port == 80:
+        headers = parse_headers(msg.data) # Ethernet, IPv4 and TCP/UDP/ICMP fields, without building the full packet
+        self.packet_in_counter.inc((dpid, classify_traffic(headers)))
+
+        src = headers.eth_src # MAC source
+        dst = headers.eth_dst # MAC destination to create match rules
+
+        if headers.ipv4_src is None: # Packets that not contains ipv4 layer will be dropped, need to check this
+            return
+
+        out_ports = self.forwarding_index.get((dpid, src, dst), ()) # Check if the communication requested is in one of the active slices
+
+        if headers.l4_proto == inet.IPPROTO_TCP and headers.l4_dst == 80:
             # HTTP traffic
-            print("HTTP traffic")
-            for out_port in out_ports:
-                if QUEUE_TCP in self.queue_exists[datapath.id].get(out_port, []):
-                    actions.append(ofp_parser.OFPActionSetQueue(QUEUE_TCP)) # If the given QUEUE_ID is associated with the port, add the action otherwise no
-                actions.append(ofp_parser.OFPActionOutput(out_port))
-            match = ofp_parser.OFPMatch( # Create match rule for Flow Table
-                in_port=in_port,
-                eth_dst=dst,
-                eth_type=ether_types.ETH_TYPE_IP,
-                ip_proto=0x06,
-                tcp_dst=80,
-            )
-            self.add_flow(datapath, 100, match, actions)
-            self._send_package(msg, datapath, in_port, actions)
-        elif udp_pkt and udp_pkt.dst_port == 53:
+            traffic_class = "http"
+        elif headers.l4_proto == inet.IPPROTO_UDP and headers.l4_dst == 53:
             # DNS traffic
-            print("DNS detected")
-            for out_port in out_ports:
-                if QUEUE_UDP in self.queue_exists[datapath.id].get(out_port, []):
-                    actions.append(ofp_parser.OFPActionSetQueue(QUEUE_UDP))
-                actions.append(ofp_parser.OFPActionOutput(out_port))
-            match = ofp_parser.OFPMatch(
-                in_port=in_port,
-                eth_dst=dst,
-                eth_type=ether_types.ETH_TYPE_IP,
-                ip_proto=0x11,
-                udp_dst=53,
-            )
-            self.add_flow(datapath, 100, match, actions)
-            self._send_package(msg, datapath, in_port, actions)
-        elif icmp_pkt:
+            traffic_class = "dns"
+        elif headers.l4_proto == inet.IPPROTO_ICMP:
             # ICMP traffic
-            print("ICMP traffic")
-            for out_port in out_ports:
-                if QUEUE_ICMP in self.queue_exists[datapath.id].get(out_port, []):
-                    actions.append(ofp_parser.OFPActionSetQueue(QUEUE_ICMP))
-                actions.append(ofp_parser.OFPActionOutput(out_port))
-            match = ofp_parser.OFPMatch(
-                in_port=in_port,
-                eth_dst=dst,
-                eth_type=ether_types.ETH_TYPE_IP,
-                ip_proto=0x01,
-            )
-            self.add_flow(datapath, 100, match, actions)
-            self._send_package(msg, datapath, in_port, actions)
+            traffic_class = "icmp"
         else:
-            print("General traffic")
-            for out_port in out_ports:
-                if QUEUE_ICMP in self.queue_exists[datapath.id].get(out_port, []):
-                    actions.append(ofp_parser.OFPActionSetQueue(QUEUE_GT))
-                actions.append(ofp_parser.OFPActionOutput(out_port))
-            match = datapath.ofproto_parser.OFPMatch(
-                in_port=in_port,
-                eth_dst=dst,
-                eth_type=ether_types.ETH_TYPE_IP,
-            )
-            self.add_flow(datapath, 1, match, actions)
-            self._send_package(msg, datapath, in_port, actions)
+            traffic_class = "general"
+
+        match_key = (in_port, dst, traffic_class)
+        if FLOW_COMPRESSION: # A merged entry may serve every input port or traffic class
+            match_key = self.widest_match(dpid, in_port, dst, traffic_class, out_ports)
+        elif MULTI_TABLE and self.class_free(dpid, out_ports): # The classifier table already chose the queue
+            match_key = (in_port, dst, "any")
+        value = (None, self.merged_out_ports(dpid, dst)) if match_key[0] is None else (src, out_ports)
+        actions = self.build_actions(datapath, out_ports, traffic_class)
+        if self.pending_installs.claim(dpid, match_key, value): # The same flow entry may already be on its way to the switch
+            self.make_room(datapath)
+            self.install_slice_flow(datapath, match_key, value[1]) # Create the flow entry, matching the class only if needed
+            self.transition_engine.record(dpid, match_key, value)
+            decision = "install"
+        else:
+            decision = "pending"
+        self._send_package(msg, datapath, in_port, actions)
+        self.log.packet("packet-in", dpid=dpid, in_port=in_port, src=src, dst=dst, traffic_class=traffic_class, out_ports=list(out_ports), decision=decision)
 
 class SecondSlicingController(ControllerBase):
     """
@@ -348,17 +1675,19 @@ class SecondSlicingController(ControllerBase):
             'Content-Type': 'application/json'
         }
 
-    def clear_flow_tables(self):
+    def clear_flow_tables(self, transaction=None):
         """
         Clear all flow tables of the switches and reapply default flow rules.
 
-        Args: None
+        Args:
+            transaction (Transaction): The transaction collecting the flow-mods, if None they are sent immediately.
 
         Returns: None
         """
         # Remove all flows tables
         for dp_i in self.second_slicing.datapaths:
             switch_dp = self.second_slicing.datapaths[dp_i]
+            self.second_slicing.transition_engine.forget(dp_i)
             ofp_parser = switch_dp.ofproto_parser
             ofp = switch_dp.ofproto
             mod = ofp_parser.OFPFlowMod(
@@ -368,41 +1697,11 @@ class SecondSlicingController(ControllerBase):
                 out_port=ofp.OFPP_ANY,
                 out_group=ofp.OFPG_ANY
             )
-            switch_dp.send_msg(mod)
+            self.second_slicing.send_flow_mod(switch_dp, mod, transaction)
 
         # Reinstall flow tables to avoid losing connectivity
         for dp_i in self.second_slicing.datapaths:
-            datapath = self.second_slicing.datapaths[dp_i]
-            parser = switch_dp.ofproto_parser
-            ofp = switch_dp.ofproto
-            match = ofp_parser.OFPMatch()
-            actions = [
-                ofp_parser.OFPActionOutput(ofp.OFPP_CONTROLLER, ofp.OFPCML_NO_BUFFER)
-            ]
-            self.second_slicing.add_flow(datapath, 0, match, actions)
-
-             # If the only rule present is the one for general traffic (priority=1), forward to the controller HTTP, DNS and ICMP packets
-
-            match_tcp = parser.OFPMatch(
-                eth_type=ether_types.ETH_TYPE_IP,
-                ip_proto=0x06, # TCP so HTTP
-                tcp_dst=80
-
-            )
-            self.second_slicing.add_flow(datapath, 10, match_tcp, actions)
-
-            match_udp = parser.OFPMatch(
-                eth_type=ether_types.ETH_TYPE_IP,
-                ip_proto=0x11, # UDP so DNS
-                udp_dst=53
-            )
-            self.second_slicing.add_flow(datapath, 10, match_udp, actions)
-
-            match_icmp = parser.OFPMatch(
-                eth_type=ether_types.ETH_TYPE_IP,
-                ip_proto=0x01, # ICMP
-            )
-            self.second_slicing.add_flow(datapath, 10, match_icmp, actions)
+            self.second_slicing.install_base_flows(self.second_slicing.datapaths[dp_i], transaction)
 
     def get_active_modes(self):
         """
@@ -421,18 +1720,55 @@ class SecondSlicingController(ControllerBase):
         """
         Toggle the specified mode in the current modes list.
 
+        The changes are applied as a transaction and the method waits until every switch acknowledges them.
+
         Args:
             mode_name (str): The mode to set (e.g., "first_mode", "second_mode", "third_mode").
 
-        Returns: None
+        Returns:
+            dict: The convergence report of every switch.
         """
         global current_modes
+        start = time.perf_counter()
         mode_value = self.mode_name_to_index[mode_name]
         if mode_value in current_modes:
             current_modes.remove(mode_value)
         else:
             current_modes.append(mode_value)
-        self.clear_flow_tables()
+        self.second_slicing.update_forwarding_index()
+        self.second_slicing.pending_installs.clear() # The flow entries being installed may be deleted by the mode change
+        transaction = Transaction()
+        if DIFF_TRANSITIONS:
+            self.second_slicing.apply_transition(transaction)
+        else:
+            self.clear_flow_tables(transaction)
+
+        report = self.second_slicing.convergence.commit(transaction, datapaths=self.second_slicing.datapaths)
+        converged = [entry["time_ms"] for entry in report.values() if entry["converged"]]
+        self.second_slicing.log.info("mode change applied", mode=mode_name, converged=len(converged), switches=len(report), time_ms=max(converged, default=0))
+        self.second_slicing.mode_switch_duration.observe(time.perf_counter() - start, (mode_name,))
+        self.second_slicing.save_snapshot()
+        return report
+
+    def mode_response(self, report, headers):
+        """
+        Build the response of a mode change, reporting how long every switch took to apply it.
+
+        Args:
+            report (dict): The convergence report {dpid: {"method", "flow_mods", "converged", "time_ms"}}.
+            headers (dict): The headers of the response.
+
+        Returns:
+            Response: The response containing the updated active modes.
+        """
+        times = [entry["time_ms"] for entry in report.values() if entry["converged"]]
+        body = {
+            "modes": self.get_active_modes(),
+            "converged": len(times) == len(report),
+            "convergence_ms": max(times, default=0),
+            "switches": {str(dpid): entry for dpid, entry in report.items()},
+        }
+        return Response(status=200, body=json.dumps(body), headers=headers)
 
     @route("active_modes", url + "/active_modes", methods=["GET"])
     def fetch_active_modes(self, req, **kwargs):
@@ -454,6 +1790,248 @@ class SecondSlicingController(ControllerBase):
             modes = "No active modes"
         return Response(status=200, body=modes, headers=headers)
 
+    @route("packet_in", url + "/packet_in", methods=["GET"])
+    def fetch_packet_in_counters(self, req, **kwargs):
+        """
+        Return the packet-in counters of every switch.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the admitted, shed and duplicate packet-ins of every switch.
+        """
+        headers = self.get_cors_headers()
+        counters = {str(dpid): entry for dpid, entry in self.second_slicing.packet_in_counters().items()}
+        return Response(status=200, body=json.dumps(counters), headers=headers)
+
+    @route("flows", url + "/flows", methods=["GET"])
+    def fetch_flow_table_counters(self, req, **kwargs):
+        """
+        Return the flow table occupancy of every switch.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the flow entries, the limit and the removed flow entries of every switch.
+        """
+        headers = self.get_cors_headers()
+        counters = {str(dpid): entry for dpid, entry in self.second_slicing.flow_table_counters().items()}
+        return Response(status=200, body=json.dumps(counters), headers=headers)
+
+    @route("flows_compress", url + "/flows/compress", methods=["GET"])
+    def compress_flow_tables(self, req, **kwargs):
+        """
+        Merge the slice flow entries of every switch into wider matches where the forwarding does not change.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the flow entries of every switch before and after the compression and the entries merged.
+        """
+        headers = self.get_cors_headers()
+        report = {str(dpid): self.second_slicing.compress_flows(datapath) for dpid, datapath in list(self.second_slicing.datapaths.items())}
+        return Response(status=200, body=json.dumps(report), headers=headers)
+
+    @route("stats", url + "/stats", methods=["GET"])
+    def fetch_stats(self, req, **kwargs):
+        """
+        Return the last statistics sample and the current rates of every slice and port.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the statistics summary.
+        """
+        headers = self.get_cors_headers()
+        body = {"interval": STATS_INTERVAL, "history": STATS_HISTORY, **self.second_slicing.stats.summary()}
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
+    @route("stats_slices", url + "/stats/slices", methods=["GET"])
+    def fetch_slice_stats(self, req, **kwargs):
+        """
+        Return the time series of the traffic of every slice.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the samples of every slice.
+        """
+        headers = self.get_cors_headers()
+        body = {slice_name: series.to_list() for slice_name, series in self.second_slicing.stats.slices.items()}
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
+    @route("stats_ports", url + "/stats/ports", methods=["GET"])
+    def fetch_port_stats(self, req, **kwargs):
+        """
+        Return the time series of the counters of every port.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the samples of every port of every switch.
+        """
+        headers = self.get_cors_headers()
+        body = {
+            str(dpid): {str(port_no): series.to_list() for port_no, series in ports.items()}
+            for dpid, ports in self.second_slicing.stats.ports.items()
+        }
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
+    @route("metrics", "/metrics", methods=["GET"])
+    def fetch_metrics(self, req, **kwargs):
+        """
+        Return the metrics of the controller in the Prometheus text exposition format.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the metrics.
+        """
+        headers = {**self.get_cors_headers(), "Content-Type": CONTENT_TYPE}
+        return Response(status=200, body=self.second_slicing.collect_metrics(), headers=headers)
+
+    @route("profiler", url + "/profiler", methods=["GET"])
+    def fetch_profiler_status(self, req, **kwargs):
+        """
+        Return the state of the sampling profiler.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing whether the profiler is running and how many samples it took.
+        """
+        headers = self.get_cors_headers()
+        return Response(status=200, body=json.dumps(self.second_slicing.profiler.status()), headers=headers)
+
+    @route("profiler_start", url + "/profiler/start", methods=["GET"])
+    def start_profiler(self, req, **kwargs):
+        """
+        Start the sampling profiler, the optional "interval" parameter sets the seconds between two samples.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the state of the profiler, 409 if it is already running.
+        """
+        headers = self.get_cors_headers()
+        try:
+            interval = float(req.GET["interval"]) if "interval" in req.GET else None
+        except ValueError:
+            interval = -1
+        if interval is not None and not 0.001 <= interval <= 1:
+            return Response(status=400, body=json.dumps({"error": "interval must be between 0.001 and 1 seconds"}), headers=headers)
+
+        started = self.second_slicing.profiler.start(interval)
+        return Response(status=200 if started else 409, body=json.dumps(self.second_slicing.profiler.status()), headers=headers)
+
+    @route("profiler_stop", url + "/profiler/stop", methods=["GET"])
+    def stop_profiler(self, req, **kwargs):
+        """
+        Stop the sampling profiler and return the collapsed stacks, ready for flamegraph.pl or speedscope.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing one line "frame;frame;frame count" for every sampled stack.
+        """
+        headers = {**self.get_cors_headers(), "Content-Type": "text/plain; charset=utf-8"}
+        self.second_slicing.profiler.stop()
+        return Response(status=200, body=self.second_slicing.profiler.collapsed(), headers=headers)
+
+    @route("autoscaler", url + "/autoscaler", methods=["GET"])
+    def fetch_autoscaler_status(self, req, **kwargs):
+        """
+        Return the state of the QoS autoscaler.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing whether the autoscaler is enabled, the current and proposed rates of the traffic classes, their measured rates and the last decision.
+        """
+        headers = self.get_cors_headers()
+        return Response(status=200, body=json.dumps(self.second_slicing.autoscaler.status()), headers=headers)
+
+    @route("autoscaler_start", url + "/autoscaler/start", methods=["GET"])
+    def start_autoscaler(self, req, **kwargs):
+        """
+        Start the QoS autoscaler, which needs the statistics polling (STATS_INTERVAL).
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the state of the autoscaler, 409 if the statistics are not polled.
+        """
+        headers = self.get_cors_headers()
+        autoscaler = self.second_slicing.autoscaler
+        if not STATS_INTERVAL:
+            return Response(status=409, body=json.dumps({"error": "The autoscaler needs the statistics polling, STATS_INTERVAL is 0"}), headers=headers)
+        autoscaler.enabled = True
+        return Response(status=200, body=json.dumps(autoscaler.status()), headers=headers)
+
+    @route("autoscaler_stop", url + "/autoscaler/stop", methods=["GET"])
+    def stop_autoscaler(self, req, **kwargs):
+        """
+        Stop the QoS autoscaler, the current rates of the traffic classes are kept.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the state of the autoscaler.
+        """
+        headers = self.get_cors_headers()
+        autoscaler = self.second_slicing.autoscaler
+        autoscaler.enabled = False
+        return Response(status=200, body=json.dumps(autoscaler.status()), headers=headers)
+
+    @route("queues", url + "/queues", methods=["GET"])
+    def fetch_queues(self, req, **kwargs):
+        """
+        Return the queues of every port with queues, as reported by the switches.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the queue generation, the flow entries reinstalled after a change of the queues,
+            the queue ids and the generation of every port and the flow entries built against older queues.
+        """
+        headers = self.get_cors_headers()
+        body = {
+            "generation": self.second_slicing.queue_generation,
+            "reinstalled": self.second_slicing.queue_flows_reinstalled,
+            "queues": {str(dpid): {str(port): queues for port, queues in ports.items()} for dpid, ports in self.second_slicing.queue_exists.items()},
+            "generations": {str(dpid): {str(port): generation for port, generation in ports.items()} for dpid, ports in self.second_slicing.queue_generations.items()},
+            "stale": {str(dpid): len(self.second_slicing.stale_queue_flows(dpid)) for dpid in self.second_slicing.datapaths},
+        }
+        return Response(status=200, body=json.dumps(body), headers=headers)
+
     @route("first_mode", url + "/first_mode", methods=["GET"])
     def toggle_first_mode(self, req, **kwargs):
         """
@@ -467,8 +2045,8 @@ class SecondSlicingController(ControllerBase):
             Response: A response containing the updated active modes.
         """
         headers = self.get_cors_headers()
-        self.set_mode("first_mode")
-        return Response(status=200, body=self.get_active_modes(), headers=headers)
+        report = self.set_mode("first_mode")
+        return self.mode_response(report, headers)
 
     @route("second_mode", url + "/second_mode", methods=["GET"])
     def toggle_second_mode(self, req, **kwargs):
@@ -483,8 +2061,8 @@ class SecondSlicingController(ControllerBase):
             Response: A response containing the updated active modes.
         """
         headers = self.get_cors_headers()
-        self.set_mode("second_mode")
-        return Response(status=200, body=self.get_active_modes(), headers=headers)
+        report = self.set_mode("second_mode")
+        return self.mode_response(report, headers)
 
     @route("third_mode", url + "/third_mode", methods=["GET"])
     def toggle_third_mode(self, req, **kwargs):
@@ -499,20 +2077,44 @@ class SecondSlicingController(ControllerBase):
             Response: A response containing the updated active modes.
         """
         headers = self.get_cors_headers()
-        self.set_mode("third_mode")
-        return Response(status=200, body=self.get_active_modes(), headers=headers)
+        report = self.set_mode("third_mode")
+        return self.mode_response(report, headers)
+
+    @route("qos_backend", url + "/qos", methods=["GET"])
+    def fetch_qos(self, req, **kwargs):
+        """
+        Return the QoS backend used by the updates.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
+
+        Returns:
+            Response: A response containing the backend, the available backends, the rates of the last update, and the rates and meters of every switch when the meters are enforced.
+        """
+        headers = self.get_cors_headers()
+        meters = self.second_slicing.meters
+        body = {
+            "backend": self.second_slicing.qos_backend,
+            "backends": list(qos_backends),
+            "rates": self.second_slicing.qos_rates,
+            "meter_rates": meters.rates,
+            "meters": {str(dpid): sorted(meter_ids) for dpid, meter_ids in meters.installed.items()},
+        }
+        return Response(status=200, body=json.dumps(body), headers=headers)
 
     @route("qos", url + "/qos", methods=["POST", "OPTIONS"])
     def set_qos(self, req, **kwargs):
         """
-        Set the QoS values for the network slicing.
+        Set the QoS values for the network slicing. The optional "backend" of the request selects the backend
+        of this update and of the following ones.
 
         Args:
             req: The request object.
             **kwargs: Additional parameters.
 
         Returns:
-            Response: A response containing the status of the request.
+            Response: A response containing the id of the job applying the values, whose status is returned by /qos/jobs/{job_id}.
         """
         headers = self.get_cors_headers()
 
@@ -521,14 +2123,34 @@ class SecondSlicingController(ControllerBase):
 
         data = json.loads(req.body.decode("utf-8"))
         values = data["values"]
+        backend = data.get("backend", self.second_slicing.qos_backend)
 
+        if backend not in qos_backends:
+            return Response(status=400, body=f"The backend must be one of {', '.join(qos_backends)}", headers=headers)
         if len(values) != 3 or sum(values) > 9 or any(value < 1 for value in values):
             return Response(status=400, body="The request must contain 3 values of total sum 9, with each value being greater than or equal to 1", headers=headers)
 
         values = [value * 1_000_000 for value in values] # convert the values into MBs
         values = [str(value) for value in values] # convert the values into strings to pass them as arguments
 
-        qos = QoS()
-        qos.start_process(*values)
+        self.second_slicing.qos_backend = backend
+        job = self.second_slicing.qos_jobs.submit(values, backend)
+        return Response(status=202, body=json.dumps({"job_id": job.id, "state": job.state, "backend": job.backend}), headers=headers)
+
+    @route("qos_job", url + "/qos/jobs/{job_id}", methods=["GET"], requirements={"job_id": r"[0-9]+"})
+    def fetch_qos_job(self, req, **kwargs):
+        """
+        Return the status of a QoS job.
+
+        Args:
+            req: The request object.
+            **kwargs: Additional parameters.
 
-        return Response(status=200, body="Values updated correctly" + str(values), headers=headers)
+        Returns:
+            Response: A response containing the state, progress, duration, exit status and error output of the job.
+        """
+        headers = self.get_cors_headers()
+        job = self.second_slicing.qos_jobs.get(int(kwargs["job_id"]))
+        if job is None:
+            return Response(status=404, body=json.dumps({"error": "Unknown QoS job"}), headers=headers)
+        return Response(status=200, body=json.dumps(job.status()), headers=headers)
@@ -5,102 +5,12 @@ QUEUE_2=$2
 QUEUE_3=$3
 QUEUE_4=$(expr 10000000 - $QUEUE_1 - $QUEUE_2 - $QUEUE_3)
 
+# Ports with the queues, set by qos.py from the links between the switches of the topology
+QOS_PORTS=${QOS_PORTS:-"s1-eth3 s1-eth4 s2-eth4 s2-eth5 s2-eth6 s3-eth3 s4-eth4 s4-eth5"}
 
-
-# Switch 3 - eth3
-sudo ovs-vsctl set port s3-eth3 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-# Switch 2 - eth4
-sudo ovs-vsctl set port s2-eth4 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-# Switch 2 - eth5
-sudo ovs-vsctl set port s2-eth5 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-# Switch 2 - eth6 
-sudo ovs-vsctl set port s2-eth6 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-# Switch 1 - eth3
-sudo ovs-vsctl set port s1-eth3 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-# Switch 1 - eth4
-sudo ovs-vsctl set port s1-eth4 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-
-# Switch 4 - eth4
-sudo ovs-vsctl set port s4-eth4 qos=@newqos -- \
---id=@newqos create QoS type=linux-htb \
-other-config:max-rate=10000000 \
-queues:123=@1q \
-queues:234=@2q \
-queues:345=@3q \
-queues:456=@4q -- \
---id=@1q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_1 -- \
---id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
---id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
---id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
-
-# Switch 4 - eth5
-sudo ovs-vsctl set port s4-eth5 qos=@newqos -- \
+for PORT in $QOS_PORTS
+do
+sudo ovs-vsctl set port $PORT qos=@newqos -- \
 --id=@newqos create QoS type=linux-htb \
 other-config:max-rate=10000000 \
 queues:123=@1q \
@@ -111,6 +21,7 @@ queues:456=@4q -- \
 --id=@2q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_2 -- \
 --id=@3q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_3 -- \
 --id=@4q create queue other-config:min-rate=1 other-config:max-rate=$QUEUE_4 
+done
 
 mkdir -p qos_data
 
@@ -0,0 +1,120 @@
+# The meter of a queue on a port has id port number * METER_PORT_BASE + queue id, e.g. 4123 for the queue 123 of port 4
+METER_PORT_BASE = 1000
+
+
+def meter_id(port_no, queue_id):
+    """
+    Get the id of the meter limiting the traffic class of a queue on a port.
+
+    Args:
+        port_no (int): The port number.
+        queue_id (int): The id of the queue of the traffic class.
+
+    Returns:
+        int: The meter id.
+    """
+    return port_no * METER_PORT_BASE + queue_id
+
+
+class MeterTable:
+    """
+    Keep track of the OpenFlow meters enforcing the bandwidth of the traffic classes, as an alternative
+    to the linux-htb queues. Every port with queues gets a meter for each traffic class, which drops the
+    packets above the rate of the class, and the flow entries forwarding the class to the port use it.
+
+    Attributes:
+        queue_ids (tuple): The ids of the queues of the traffic classes, in the order of the rates.
+        rates (list): The maximum rate in bit/s of every traffic class, None if the meters are not enforced.
+        installed (dict): The meters acknowledged by every switch {dpid: set of meter ids}.
+    """
+    def __init__(self, queue_ids):
+        self.queue_ids = queue_ids
+        self.rates = None
+        self.installed = {}
+
+    def meter_mods(self, datapath, ports, rates):
+        """
+        Build the meter-mods setting the rates on the ports of a switch. The meters already acknowledged
+        by the switch are modified, otherwise all the meters of the switch (e.g. left by a previous run
+        of the controller) are deleted and the meters are added.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+            ports (tuple): The port numbers.
+            rates (list): The maximum rate in bit/s of every traffic class.
+
+        Returns:
+            list: The meter-mods.
+        """
+        ofproto = datapath.ofproto
+        parser = datapath.ofproto_parser
+        mods = []
+        command = ofproto.OFPMC_MODIFY
+        if not self.installed.get(datapath.id):
+            mods.append(self.delete_mod(datapath))
+            command = ofproto.OFPMC_ADD
+        for port_no in ports:
+            for queue_id, rate in zip(self.queue_ids, rates):
+                bands = [parser.OFPMeterBandDrop(rate=rate // 1000, burst_size=0)]
+                mods.append(parser.OFPMeterMod(datapath, command, ofproto.OFPMF_KBPS, meter_id(port_no, queue_id), bands))
+        return mods
+
+    @staticmethod
+    def delete_mod(datapath):
+        """
+        Build the meter-mod deleting all the meters of a switch. The switch also removes the flow entries using them.
+
+        Args:
+            datapath (Datapath): The datapath of the switch.
+
+        Returns:
+            OFPMeterMod: The meter-mod.
+        """
+        ofproto = datapath.ofproto
+        return datapath.ofproto_parser.OFPMeterMod(datapath, ofproto.OFPMC_DELETE, 0, ofproto.OFPM_ALL)
+
+    def confirm(self, dpid, ports):
+        """
+        Record the meters of the ports of a switch, once the switch acknowledged them.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            ports (tuple): The port numbers.
+
+        Returns:
+            None
+        """
+        self.installed[dpid] = {meter_id(port_no, queue_id) for port_no in ports for queue_id in self.queue_ids}
+
+    def meter_for(self, dpid, out_ports, queue_id):
+        """
+        Get the meter of a flow entry forwarding a traffic class. OpenFlow 1.3 applies a single meter to a
+        flow entry, so the meter of the first output port with meters is used.
+
+        Args:
+            dpid (int): The DPID of the switch.
+            out_ports (list): The output ports of the flow entry.
+            queue_id (int): The id of the queue of the traffic class, None if the flow entry uses no queue.
+
+        Returns:
+            int: The meter id, None if the meters are not enforced or the ports have none.
+        """
+        if self.rates is None or queue_id is None:
+            return None
+        installed = self.installed.get(dpid, ())
+        for port_no in out_ports:
+            if meter_id(port_no, queue_id) in installed:
+                return meter_id(port_no, queue_id)
+        return None
+
+    def forget(self, dpid):
+        """
+        Forget the meters of a switch, e.g. when it disconnects.
+
+        Args:
+            dpid (int): The DPID of the switch.
+
+        Returns:
+            None
+        """
+        self.installed.pop(dpid, None)
@@ -0,0 +1,159 @@
+import json
+import socket
+
+
+class OvsdbError(Exception):
+    """
+    Error returned by the OVSDB server, or raised when the server cannot be reached.
+
+    Attributes:
+        operation (str): The operation of the transaction which failed (e.g. "wait"), None if it is not an operation.
+        error (str): The error returned by the server for the operation (e.g. "timed out"), None if it is not an operation.
+    """
+    def __init__(self, message, operation=None, error=None):
+        super().__init__(message)
+        self.operation = operation
+        self.error = error
+
+
+class OvsdbClient:
+    """
+    Minimal OVSDB JSON-RPC client (RFC 7047), used to apply several changes in a single transaction.
+
+    Attributes:
+        remote (str): The address of the server, "unix:<path>" or "tcp:<host>:<port>".
+        database (str): The name of the database.
+        timeout (float): The maximum time in seconds to wait for the server.
+    """
+    def __init__(self, remote, database="Open_vSwitch", timeout=10):
+        self.remote = remote
+        self.database = database
+        self.timeout = timeout
+        self._socket = None
+        self._buffer = ""
+        self._next_id = 0
+
+    def connect(self):
+        """
+        Connect to the server, if not connected yet.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self._socket is not None:
+            return
+        try:
+            if self.remote.startswith("unix:"):
+                self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self._socket.settimeout(self.timeout)
+                self._socket.connect(self.remote[len("unix:"):])
+            elif self.remote.startswith("tcp:"):
+                host, port = self.remote[len("tcp:"):].rsplit(":", 1)
+                self._socket = socket.create_connection((host, int(port)), self.timeout)
+            else:
+                raise OvsdbError(f"Unsupported OVSDB remote {self.remote}")
+        except OSError as error:
+            self.close()
+            raise OvsdbError(f"Cannot connect to {self.remote}: {error}") from error
+
+    def close(self):
+        """
+        Close the connection to the server.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        if self._socket is not None:
+            self._socket.close()
+        self._socket = None
+        self._buffer = ""
+
+    def _send(self, message):
+        """
+        Send a JSON-RPC message.
+        """
+        self._socket.sendall(json.dumps(message).encode("utf-8"))
+
+    def _receive(self):
+        """
+        Receive the next JSON-RPC message. The messages are not delimited, so the buffer is decoded incrementally.
+        """
+        decoder = json.JSONDecoder()
+        while True:
+            text = self._buffer.lstrip()
+            if text:
+                try:
+                    message, end = decoder.raw_decode(text)
+                    self._buffer = text[end:]
+                    return message
+                except ValueError:
+                    pass
+            data = self._socket.recv(65536)
+            if not data:
+                raise OvsdbError("The OVSDB server closed the connection")
+            self._buffer += data.decode("utf-8")
+
+    def call(self, method, params):
+        """
+        Call a method of the server and wait for its result. The echo requests of the server are answered meanwhile.
+
+        Args:
+            method (str): The name of the method.
+            params (list): The parameters of the method.
+
+        Returns:
+            The result of the method.
+        """
+        self.connect()
+        self._next_id += 1
+        request_id = self._next_id
+        try:
+            self._send({"method": method, "params": params, "id": request_id})
+            while True:
+                message = self._receive()
+                if message.get("method") == "echo":
+                    self._send({"result": message.get("params"), "error": None, "id": message.get("id")})
+                elif message.get("id") == request_id:
+                    break
+        except (OSError, ValueError) as error:
+            self.close()
+            raise OvsdbError(f"{method} failed: {error}") from error
+
+        if message.get("error") is not None:
+            raise OvsdbError(f"{method} failed: {message['error']}")
+        return message.get("result")
+
+    def transact(self, operations):
+        """
+        Apply operations in a single atomic transaction: if one of them fails, none is applied.
+
+        Args:
+            operations (list): The OVSDB operations, e.g. {"op": "insert", "table": "Queue", "row": {...}}.
+
+        Returns:
+            list: The result of every operation, e.g. {"uuid": ["uuid", "..."]} for an insert.
+        """
+        results = self.call("transact", [self.database, *operations])
+        # A failed operation has an error result, a failed commit adds an error after the results of the operations
+        for index, result in enumerate(results):
+            if result is not None and "error" in result:
+                operation = operations[index]["op"] if index < len(operations) else "commit"
+                raise OvsdbError(f"{operation} failed: {result['error']} {result.get('details', '')}".strip(), operation, result["error"])
+        return results
+
+
+def ovsdb_map(values):
+    """
+    Encode a dictionary as an OVSDB map.
+
+    Args:
+        values (dict): The dictionary.
+
+    Returns:
+        list: The map ["map", [[key, value], ...]].
+    """
+    return ["map", [[key, value] for key, value in values.items()]]
@@ -1,5 +1,14 @@
-import subprocess
 import os
+import time
+from collections import OrderedDict
+
+# ryu-manager monkey patches subprocess (hub.patch), the green module is imported explicitly so that the other
+# green threads run while ovs-vsctl runs even when the module is loaded without the patch, e.g. by the benchmarks
+from eventlet.green import subprocess
+from ryu.lib import hub
+
+from ovsdb import OvsdbClient, OvsdbError, ovsdb_map
+from utils import queue_port_names
 
 qos_path = "qos_data"
 current_queues_path = os.path.join(qos_path, "current_queues.txt")
@@ -7,35 +16,660 @@ old_queues_path = os.path.join(qos_path, "old_queues.txt")
 stderr_path = os.path.join(qos_path, "stderr.txt")
 create_queue_script = "./createQueue.sh"
 
+# How the queues are created: "ovsdb" sends a single transaction to the OVSDB server, "vsctl" runs a single
+# ovs-vsctl command for all the ports and "script" runs createQueue.sh, which calls ovs-vsctl for every port.
+# With "meter" the controller limits the traffic classes with OpenFlow meters instead of queues (see meters.py)
+qos_backend = "ovsdb"
+queue_backends = ("ovsdb", "vsctl", "script")
+qos_backends = queue_backends + ("meter",)
+ovsdb_remote = "unix:/var/run/openvswitch/db.sock"
+vsctl_command = ["sudo", "ovs-vsctl"]
+
+# Ports with the queues (the links between the switches of the topology), ids of the HTTP, DNS, ICMP
+# and general traffic queues and rate of the links in bit/s
+qos_ports = queue_port_names()
+queue_ids = (123, 234, 345, 456)
+link_rate = 10_000_000
+
+# Number of QoS jobs whose status is kept after they finish
+qos_job_history = 20
+
+
+def queue_rates(args):
+    """
+    Get the maximum rate of every queue, the general traffic queue gets the rest of the link.
+
+    Args:
+        args (list): The maximum rates in bit/s of the HTTP, DNS and ICMP queues, as strings.
+
+    Returns:
+        list: The maximum rate of every queue.
+    """
+    rates = [int(value) for value in args]
+    return rates + [link_rate - sum(rates)]
+
+
+def queue_rows(port_queues):
+    """
+    Get the UUIDs of the QoS and queues of the ports, in the order ovs-vsctl prints them when it creates them.
+
+    Args:
+        port_queues (dict): The QoS of every port, see QoS.port_queues.
+
+    Returns:
+        list: The UUIDs.
+    """
+    uuids = []
+    for entry in port_queues.values():
+        uuids += [entry["qos"]] + [entry["queues"][queue_id] for queue_id in sorted(entry["queues"])]
+    return uuids
+
+
+def rate_updates(port_queues, rates):
+    """
+    Get the queues of the ports whose maximum rate changes.
+
+    Args:
+        port_queues (dict): The QoS of every port, see QoS.port_queues.
+        rates (list): The new maximum rate of every queue.
+
+    Returns:
+        list: The (port, queue id, queue UUID, rate) of the queues to update.
+    """
+    updates = []
+    for port, entry in port_queues.items():
+        for queue_id, rate in zip(queue_ids, rates):
+            if entry["rates"].get(queue_id) != rate:
+                updates.append((port, queue_id, entry["queues"][queue_id], rate))
+    return updates
+
+
+def ovsdb_discover_operations():
+    """
+    Build the OVSDB operations reading the QoS of the ports and their queues.
+
+    Args: None
+
+    Returns:
+        list: The operations.
+    """
+    return [
+        {"op": "select", "table": "Port", "where": [], "columns": ["name", "qos"]},
+        {"op": "select", "table": "QoS", "where": [], "columns": ["_uuid", "queues"]},
+        {"op": "select", "table": "Queue", "where": [], "columns": ["_uuid", "other_config"]},
+    ]
+
+
+def discovered_queues(results, ports):
+    """
+    Get the QoS of the given ports from the results of the operations of ovsdb_discover_operations.
+    The QoS of the other ports are not managed by the controller and are ignored.
+
+    Args:
+        results (list): The results of the operations.
+        ports (list): The names of the ports managed by the controller.
+
+    Returns:
+        dict: The QoS of every port of ports with a QoS, see QoS.port_queues.
+    """
+    port_rows, qos_rows, queues = (result["rows"] for result in results)
+    queue_rates_by_uuid = {row["_uuid"][1]: dict(row["other_config"][1]).get("max-rate") for row in queues}
+    qos_queues = {row["_uuid"][1]: {queue_id: value[1] for queue_id, value in row["queues"][1]} for row in qos_rows}
+    port_queues = {}
+    for row in port_rows:
+        # An empty optional reference is encoded as an empty set
+        if row["name"] not in ports or row["qos"][0] != "uuid" or row["qos"][1] not in qos_queues:
+            continue
+        entry_queues = qos_queues[row["qos"][1]]
+        rates = {queue_id: int(queue_rates_by_uuid[uuid]) for queue_id, uuid in entry_queues.items() if queue_rates_by_uuid.get(uuid) is not None}
+        port_queues[row["name"]] = {"qos": row["qos"][1], "queues": entry_queues, "rates": rates}
+    return port_queues
+
+
+def ovsdb_update_operations(port_queues, updates):
+    """
+    Build the OVSDB operations changing the maximum rate of the queues in place. The transaction is aborted
+    if the QoS of a port is no longer the known one.
+
+    Args:
+        port_queues (dict): The QoS of every port, see QoS.port_queues.
+        updates (list): The (port, queue id, queue UUID, rate) of the queues to update.
+
+    Returns:
+        list: The operations.
+    """
+    operations = []
+    for port, entry in port_queues.items():
+        operations.append({"op": "wait", "table": "Port", "timeout": 0, "where": [["name", "==", port]], "columns": ["qos"], "until": "==", "rows": [{"qos": ["uuid", entry["qos"]]}]})
+    for _, _, uuid, rate in updates:
+        operations.append({"op": "update", "table": "Queue", "where": [["_uuid", "==", ["uuid", uuid]]], "row": {"other_config": ovsdb_map({"min-rate": "1", "max-rate": str(rate)})}})
+    return operations
+
+
+def ovsdb_operations(ports, rates, old_uuids):
+    """
+    Build the OVSDB operations creating the QoS and queues of the ports and destroying the old ones.
+    The ports must exist, otherwise the whole transaction is aborted.
+
+    Args:
+        ports (list): The names of the ports.
+        rates (list): The maximum rate of every queue.
+        old_uuids (list): The UUIDs of the QoS and queues to destroy.
+
+    Returns:
+        list: The operations.
+    """
+    operations = []
+    for index, port in enumerate(ports):
+        operations.append({"op": "wait", "table": "Port", "timeout": 0, "where": [["name", "==", port]], "columns": ["name"], "until": "==", "rows": [{"name": port}]})
+        for queue_id, rate in zip(queue_ids, rates):
+            operations.append({
+                "op": "insert",
+                "table": "Queue",
+                "uuid-name": f"queue_{index}_{queue_id}",
+                "row": {"other_config": ovsdb_map({"min-rate": "1", "max-rate": str(rate)})},
+            })
+        operations.append({
+            "op": "insert",
+            "table": "QoS",
+            "uuid-name": f"qos_{index}",
+            "row": {
+                "type": "linux-htb",
+                "other_config": ovsdb_map({"max-rate": str(link_rate)}),
+                "queues": ["map", [[queue_id, ["named-uuid", f"queue_{index}_{queue_id}"]] for queue_id in queue_ids]],
+            },
+        })
+        operations.append({"op": "update", "table": "Port", "where": [["name", "==", port]], "row": {"qos": ["named-uuid", f"qos_{index}"]}})
+
+    # The old QoS are no longer referenced by the ports, so they can be destroyed in the same transaction
+    for uuid in old_uuids:
+        for table in ("QoS", "Queue"):
+            operations.append({"op": "delete", "table": table, "where": [["_uuid", "==", ["uuid", uuid]]]})
+    return operations
+
+
+def vsctl_arguments(ports, rates, old_uuids):
+    """
+    Build the arguments of a single ovs-vsctl command creating the QoS and queues of the ports and destroying the old ones.
+
+    Args:
+        ports (list): The names of the ports.
+        rates (list): The maximum rate of every queue.
+        old_uuids (list): The UUIDs of the QoS and queues to destroy.
+
+    Returns:
+        list: The arguments.
+    """
+    arguments = []
+    for index, port in enumerate(ports):
+        arguments += ["--", "set", "port", port, f"qos=@qos{index}"]
+        arguments += ["--", f"--id=@qos{index}", "create", "QoS", "type=linux-htb", f"other-config:max-rate={link_rate}"]
+        arguments += [f"queues:{queue_id}=@q{index}_{queue_id}" for queue_id in queue_ids]
+        for queue_id, rate in zip(queue_ids, rates):
+            arguments += ["--", f"--id=@q{index}_{queue_id}", "create", "queue", "other-config:min-rate=1", f"other-config:max-rate={rate}"]
+    for uuid in old_uuids:
+        arguments += ["--", "--if-exists", "destroy", "QoS", uuid, "--", "--if-exists", "destroy", "Queue", uuid]
+    # The first argument separates the global options from the commands
+    return arguments[1:]
+
+
+def vsctl_update_arguments(updates):
+    """
+    Build the arguments of a single ovs-vsctl command changing the maximum rate of the queues in place.
+
+    Args:
+        updates (list): The (port, queue id, queue UUID, rate) of the queues to update.
+
+    Returns:
+        list: The arguments.
+    """
+    arguments = []
+    for _, _, uuid, rate in updates:
+        arguments += ["--", "set", "queue", uuid, f"other-config:max-rate={rate}"]
+    return arguments[1:]
+
+
 class QoS:
     """
     Singleton class to manage the QoS process
 
+    When the queues of the ports are known and only their rates change, the "ovsdb" and "vsctl" backends update
+    the maximum rate of the existing queues in place, so that the htb classes of the ports are not rebuilt and the
+    traffic is not disrupted. The QoS and queues are created again only when the ports change or are unknown.
+
     Attributes:
         _instance: instance of the class
-        _running: process id of the running QoS process
+        _running: exit status of the last QoS process (0 on success)
+        backend: backend of the running or last update
+        last_apply: backend, mode, number of ports, queue rates, exit status, error and duration in ms of the last update
+        port_queues: QoS of every port, {port: {"qos": uuid, "queues": {queue id: uuid}, "rates": {queue id: rate}}},
+            None if unknown. The "ovsdb" backend reads it from the database, the "vsctl" one knows only the queues it created
     """
     _instance = None
     _running = None
+    backend = None
+    last_apply = None
+    port_queues = None
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super(QoS, cls).__new__(cls, *args, **kwargs)
         return cls._instance
 
-    def start_process(self, *args):
+    def progress(self):
+        """
+        Get the fraction of the ports whose queues have been created by the running update. Only createQueue.sh
+        reports its progress, as it writes the UUIDs of the QoS and queues of every port once they are created,
+        the single transaction of the other backends is applied at once.
+
+        Args: None
+
+        Returns:
+            float: The fraction of the ports, between 0 and 1.
+        """
+        if self.backend != "script" or not os.path.isfile(current_queues_path):
+            return 0.0
+        with open(current_queues_path, "r") as input_file:
+            uuids = len(input_file.read().split())
+        return min(1.0, uuids / (len(qos_ports) * (1 + len(queue_ids))))
+
+    def can_update(self):
+        """
+        Check whether the queues of every port are known, so that their rates can be updated in place.
+
+        Args: None
+
+        Returns:
+            bool: True if the ports are the known ones and each has all the queues.
+        """
+        if self.port_queues is None or set(self.port_queues) != set(qos_ports):
+            return False
+        return all(set(entry["queues"]) == set(queue_ids) for entry in self.port_queues.values())
+
+    def rebuild_plan(self):
+        """
+        Get the QoS and queues to destroy when all the queues are created again.
+
+        Args: None
+
+        Returns:
+            list: The UUIDs of the known QoS and queues of qos_ports, including the ones of the last update.
+        """
+        old_uuids = []
+        if os.path.isfile(current_queues_path):
+            with open(current_queues_path, "r") as input_file:
+                old_uuids = input_file.read().split()
+        known = self.port_queues or {}
+        old_uuids += [uuid for uuid in queue_rows(known) if uuid not in old_uuids]
+        return old_uuids
+
+    def save(self):
+        """
+        Save the UUIDs of the QoS and queues in use.
+
+        Args: None
+
+        Returns:
+            None
+        """
+        with open(current_queues_path, "w") as stdout_file:
+            stdout_file.write("".join(f"{uuid}\n" for uuid in queue_rows(self.port_queues)))
+
+    def update_ovsdb(self, client, rates):
+        """
+        Change the maximum rate of the known queues in place with a single transaction sent to the OVSDB server.
+
+        Args:
+            client (OvsdbClient): The client connected to the OVSDB server.
+            rates (list): The maximum rate of every queue.
+
+        Returns:
+            str: "unchanged" or "update", None if queues are missing and must be created again.
+
+        Raises:
+            OvsdbError: The transaction failed, with the "wait" operation if the QoS of a port is no longer the known one.
+        """
+        if not self.can_update():
+            return None
+        updates = rate_updates(self.port_queues, rates)
+        if not updates:
+            return "unchanged"
+        results = client.transact(ovsdb_update_operations(self.port_queues, updates))
+        # Every queue must still exist, otherwise they are created again
+        if not all(result.get("count", 1) == 1 for result in results):
+            return None
+        for port, queue_id, _, rate in updates:
+            self.port_queues[port]["rates"][queue_id] = rate
+        return "update"
+
+    def apply_ovsdb(self, rates):
+        """
+        Update the queues with transactions sent to the OVSDB server.
+
+        Args:
+            rates (list): The maximum rate of every queue.
+
+        Returns:
+            str: "unchanged", "update" if the rates were changed in place or "rebuild" if the queues were created again.
+        """
+        client = OvsdbClient(ovsdb_remote)
+        try:
+            if self.port_queues is None:
+                self.port_queues = discovered_queues(client.transact(ovsdb_discover_operations()), qos_ports)
+            try:
+                mode = self.update_ovsdb(client, rates)
+            except OvsdbError as error:
+                if error.operation != "wait":
+                    raise
+                # The QoS of the ports were changed by someone else: the queues found are updated in place as well
+                self.port_queues = discovered_queues(client.transact(ovsdb_discover_operations()), qos_ports)
+                mode = self.update_ovsdb(client, rates)
+            if mode is not None:
+                return mode
+
+            operations = ovsdb_operations(qos_ports, rates, self.rebuild_plan())
+            results = client.transact(operations)
+            names = {operation["uuid-name"]: result["uuid"][1] for operation, result in zip(operations, results) if "uuid-name" in operation}
+            self.port_queues = {
+                port: {
+                    "qos": names[f"qos_{index}"],
+                    "queues": {queue_id: names[f"queue_{index}_{queue_id}"] for queue_id in queue_ids},
+                    "rates": dict(zip(queue_ids, rates)),
+                }
+                for index, port in enumerate(qos_ports)
+            }
+            return "rebuild"
+        finally:
+            client.close()
+
+    def run_vsctl(self, arguments):
         """
-        Start the QoS process by creating new queues
+        Run ovs-vsctl, writing its error output to the stderr file.
+
+        Args:
+            arguments (list): The arguments of the command.
+
+        Returns:
+            tuple: The exit status and the output of the command.
+        """
+        with open(stderr_path, "w") as error_file:
+            process = subprocess.Popen(vsctl_command + arguments, stdout=subprocess.PIPE, stderr=error_file, universal_newlines=True)
+            output = process.stdout.read()
+            return process.wait(), output
+
+    def apply_vsctl(self, rates):
+        """
+        Update the queues with a single ovs-vsctl command.
+
+        Args:
+            rates (list): The maximum rate of every queue.
+
+        Returns:
+            str: "unchanged", "update" if the rates were changed in place or "rebuild" if the queues were created again.
+        """
+        if self.can_update():
+            updates = rate_updates(self.port_queues, rates)
+            if not updates:
+                return "unchanged"
+            status, _ = self.run_vsctl(vsctl_update_arguments(updates))
+            if status == 0:
+                for port, queue_id, _, rate in updates:
+                    self.port_queues[port]["rates"][queue_id] = rate
+                return "update"
+
+        status, output = self.run_vsctl(vsctl_arguments(qos_ports, rates, self.rebuild_plan()))
+        if status != 0:
+            raise OSError(status, f"ovs-vsctl exited with status {status}")
+        # ovs-vsctl prints the UUID of every QoS followed by the ones of its queues
+        uuids = output.split()
+        size = 1 + len(queue_ids)
+        self.port_queues = {
+            port: {
+                "qos": uuids[index * size],
+                "queues": dict(zip(queue_ids, uuids[index * size + 1:(index + 1) * size])),
+                "rates": dict(zip(queue_ids, rates)),
+            }
+            for index, port in enumerate(qos_ports)
+        }
+        return "rebuild"
+
+    def start_process(self, *args, backend=None):
+        """
+        Start the QoS process by updating the queues
 
         This method performs the following steps:
         1. Create a new directory if it doesn't exist
-        2. Save the current queues in a file to remove them after the new ones are created
-        3. Run the QoS process
+        2. Update the rates of the existing queues in place, or create new queues and destroy the old ones
+           with the selected backend if the ports changed
+        3. Save the UUIDs of the queues in use, if the update succeeded
+
+        createQueue.sh always creates new queues: the current queues are saved in a file so that it removes them
+        after the new ones are created.
+
+        Args:
+            *args: The maximum rates in bit/s of the HTTP, DNS and ICMP queues, as strings.
+            backend (str): One of queue_backends, qos_backend if None.
+
+        Returns:
+            dict: The report of the update, also stored in last_apply.
         """
+        self.backend = backend or qos_backend
         os.makedirs(qos_path, exist_ok=True)
-        if os.path.isfile(current_queues_path):
-            with open(current_queues_path, "r") as input_file, open(old_queues_path, "w") as output_file:
-                output_file.write(input_file.read())
+        rates = queue_rates(args)
+        mode = "rebuild"
+        error = ""
+        start = time.perf_counter()
+        if self.backend == "script":
+            if os.path.isfile(current_queues_path):
+                with open(current_queues_path, "r") as input_file, open(old_queues_path, "w") as output_file:
+                    output_file.write(input_file.read())
+            with open(current_queues_path, "w") as stdout_file, open(stderr_path, "w") as error_file:
+                environment = {**os.environ, "QOS_PORTS": " ".join(qos_ports)}
+                self._running = subprocess.call([create_queue_script, *args], stdout=stdout_file, stderr=error_file, env=environment)
+            with open(stderr_path, "r") as error_file:
+                error = error_file.read().strip()
+            # The queues created by the script are not tracked
+            self.port_queues = None
+        else:
+            open(stderr_path, "w").close()
+            try:
+                mode = self.apply_vsctl(rates) if self.backend == "vsctl" else self.apply_ovsdb(rates)
+                self._running = 0
+                self.save()
+            except (OvsdbError, OSError) as apply_error:
+                # The transaction is atomic: when it fails the old queues are still in use and remain the current ones,
+                # the queues of the ports are read again at the next update
+                with open(stderr_path, "a") as error_file:
+                    error_file.write(f"{apply_error}\n")
+                self.port_queues = None
+                self._running = 1
+                mode = None
+            with open(stderr_path, "r") as error_file:
+                error = error_file.read().strip()
+
+        self.last_apply = {
+            "backend": self.backend,
+            "mode": mode,
+            "ports": len(qos_ports),
+            "rates": rates,
+            "status": self._running,
+            "error": error,
+            "time_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+        return self.last_apply
+
+
+def apply_queues(job):
+    """
+    Apply a QoS job by updating the queues of the ports.
 
-        with open(current_queues_path, "w") as stdout_file, open(stderr_path, "w") as error_file:
-            self._running = subprocess.call([create_queue_script, *args], stdout=stdout_file, stderr=error_file)
\ No newline at end of file
+    Args:
+        job (QoSJob): The job, with one of queue_backends.
+
+    Returns:
+        dict: The report of the update, see QoS.start_process.
+    """
+    return QoS().start_process(*job.values, backend=job.backend)
+
+
+class QoSJob:
+    """
+    QoS update requested through the REST API.
+
+    Attributes:
+        id (int): The id of the job.
+        values (list): The maximum rates in bit/s of the HTTP, DNS and ICMP queues, as strings.
+        backend (str): The backend applying the values, one of qos_backends.
+        state (str): "queued", "running", "done", "failed" or "superseded".
+        created (float): The time the job was requested.
+        started (float): The time the update started, None if it did not start yet.
+        finished (float): The time the update finished or the job was superseded, None before.
+        report (dict): The report of the update, see QoS.start_process, None before it finishes.
+        stderr (str): The error output of the update, once it finishes.
+        superseded_by (int): The id of the newer job which replaced it while it was queued.
+    """
+    def __init__(self, job_id, values, backend):
+        self.id = job_id
+        self.values = values
+        self.backend = backend
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.report = None
+        self.stderr = ""
+        self.superseded_by = None
+
+    def status(self):
+        """
+        Get the status of the job. The error output of a running update of the queues is read from the file it is writing.
+
+        Args: None
+
+        Returns:
+            dict: The state, progress, duration in ms, exit status and error output of the job.
+        """
+        if self.state == "running" and self.backend in queue_backends:
+            progress = QoS().progress()
+            stderr = ""
+            if os.path.isfile(stderr_path):
+                with open(stderr_path, "r") as error_file:
+                    stderr = error_file.read()
+        else:
+            progress = 1.0 if self.state in ("done", "failed") else 0.0
+            stderr = self.stderr
+        duration = None
+        if self.started is not None:
+            duration = round(((self.finished or time.time()) - self.started) * 1000, 3)
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "values": self.values,
+            "backend": self.backend,
+            "progress": progress,
+            "duration_ms": duration,
+            "exit_status": self.report["status"] if self.report else None,
+            "stderr": stderr,
+            "report": self.report,
+            "superseded_by": self.superseded_by,
+        }
+
+
+class QoSJobs:
+    """
+    Queue of the QoS updates, applied one at a time by a green thread so that the REST requests return at once.
+    Only the latest values matter, so a job still waiting in the queue is superseded by a newer one.
+
+    Attributes:
+        jobs (OrderedDict): The jobs by id, the finished ones beyond qos_job_history are forgotten.
+        pending (QoSJob): The job waiting to be applied, None if there is none.
+        running (QoSJob): The job being applied, None if there is none.
+        on_finish (callable): Called with every job once it is done, failed or superseded.
+        apply (callable): Applies a job and returns the report of the update, see QoS.start_process.
+            By default the queues are updated, the controller also applies the "meter" backend.
+    """
+    def __init__(self, on_finish=None, history=qos_job_history, apply=None):
+        self.jobs = OrderedDict()
+        self.pending = None
+        self.running = None
+        self.on_finish = on_finish
+        self.apply = apply or apply_queues
+        self.history = history
+        self._next_id = 0
+        self._worker = None
+
+    def submit(self, values, backend=None):
+        """
+        Queue a QoS update, superseding the one already queued.
+
+        Args:
+            values (list): The maximum rates in bit/s of the HTTP, DNS and ICMP queues, as strings.
+            backend (str): The backend applying the values, qos_backend if None.
+
+        Returns:
+            QoSJob: The new job.
+        """
+        self._next_id += 1
+        job = QoSJob(self._next_id, values, backend or qos_backend)
+        if self.pending is not None:
+            self.pending.state = "superseded"
+            self.pending.superseded_by = job.id
+            self.pending.finished = time.time()
+            self._finish(self.pending)
+        self.pending = job
+        self.jobs[job.id] = job
+        self._forget()
+        if self._worker is None:
+            self._worker = hub.spawn(self._run)
+        return job
+
+    def get(self, job_id):
+        """
+        Get a job by id.
+
+        Args:
+            job_id (int): The id of the job.
+
+        Returns:
+            QoSJob: The job, None if it is unknown or forgotten.
+        """
+        return self.jobs.get(job_id)
+
+    def _run(self):
+        """
+        Apply the queued jobs until there is none left.
+        """
+        try:
+            while self.pending is not None:
+                job, self.pending = self.pending, None
+                self.running = job
+                job.state = "running"
+                job.started = time.time()
+                try:
+                    job.report = self.apply(job)
+                    job.state = "done" if job.report["status"] == 0 else "failed"
+                    job.stderr = job.report["error"]
+                except Exception as error:
+                    job.state = "failed"
+                    job.stderr = str(error)
+                job.finished = time.time()
+                self.running = None
+                self._finish(job)
+        finally:
+            self.running = None
+            self._worker = None
+
+    def _finish(self, job):
+        """
+        Notify the end of a job.
+        """
+        if self.on_finish is not None:
+            self.on_finish(job)
+
+    def _forget(self):
+        """
+        Forget the oldest finished jobs beyond the history size.
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished is not None]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
@@ -1,3 +1,5 @@
+import os
+import sys
 from mininet.topo import Topo
 from mininet.net import Mininet
 from mininet.node import OVSKernelSwitch, RemoteController
@@ -6,6 +8,11 @@ from mininet.link import TCLink
 from mininet.log import setLogLevel
 from qos import QoS
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from spec_compiler import add_spec_nodes, load_spec
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec.json")
+
 HTTP_SIZE = "4" + "0" * 6 # 4Mbps
 DNS_SIZE = "2" + "0" * 6
 ICMP_SIZE = "3" + "0" * 6
@@ -22,36 +29,8 @@ class SecondTopology(Topo):
         # Initialize topology
         Topo.__init__(self)
 
-        link_config = dict()
-        host_link_config = dict()
-
-        # Add hosts
-        host_list = dict(inNamespace=True)
-        for i in range(10):
-            self.addHost("h%s" % (i + 1), **host_list)
-
-        # Add switches
-        for i in range(4):
-            sconfig = {"dpid": "%016x" % (i + 1)}
-            self.addSwitch("s%s" % (i + 1), **sconfig)
-
-        # Add host links
-        self.addLink("h1", "s1", **link_config)
-        self.addLink("h2", "s1", **link_config)
-        self.addLink("h3", "s2", **link_config)
-        self.addLink("h4", "s2", **link_config)
-        self.addLink("h5", "s2", **link_config)
-        self.addLink("h6", "s3", **link_config)
-        self.addLink("h7", "s3", **link_config)
-        self.addLink("h8", "s4", **link_config)
-        self.addLink("h9", "s4", **link_config)
-        self.addLink("h10", "s4", **link_config)
-
-        # Add switch links
-        self.addLink("s1", "s2", **host_link_config)
-        self.addLink("s1", "s4", **host_link_config)
-        self.addLink("s2", "s3", **host_link_config)
-        self.addLink("s2", "s4", **host_link_config)
+        # Add the hosts, the switches and the links described in spec.json, without limiting their bandwidth
+        add_spec_nodes(self, load_spec(SPEC_PATH), shaped=False)
 
 topos = {"sdn_slicing_second": (lambda: SecondTopology())}
 
@@ -1,3 +1,23 @@
+import os
+import sys
+from functools import lru_cache
+from types import MappingProxyType
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from spec_compiler import SpecCompiler, link_mapping, load_spec
+
+# The topology and the slices, described once in spec.json and compiled by spec_compiler.py
+SPEC = load_spec(os.path.join(os.path.dirname(os.path.abspath(__file__)), "spec.json"))
+
+# Lookup tables computed once at import time, so that building the slices does not rebuild them at every call
+IP_MAPPING = {name: host["ip"] for name, host in SPEC["hosts"].items()}
+
+MAC_MAPPING = {name: host["mac"] for name, host in SPEC["hosts"].items()}
+
+DPID_MAPPING = {name: switch["dpid"] for name, switch in SPEC["switches"].items()}
+
+LINK_MAPPING = link_mapping(SPEC)
+
 def get_IP_address(host_name: str) -> str:
     """
     Get the IP address for a given host name.
@@ -8,10 +28,7 @@ def get_IP_address(host_name: str) -> str:
     Returns:
         str: The IP address corresponding to the host name.
     """
-    ip_mapping = {
-        f"h{i}": f"10.0.0.{i}" for i in range(1, 11)
-    }
-    return ip_mapping.get(host_name)
+    return IP_MAPPING.get(host_name)
 
 def get_MAC_address(host_name: str) -> str:
     """
@@ -23,10 +40,7 @@ def get_MAC_address(host_name: str) -> str:
     Returns:
         str: The MAC address corresponding to the host name.
     """
-    mac_mapping = {
-        f"h{i}": f"00:00:00:00:00:{i:02x}" for i in range(1, 11)
-    }
-    return mac_mapping.get(host_name)
+    return MAC_MAPPING.get(host_name)
 
 def get_dpid(host_name: str) -> int:
     """
@@ -38,10 +52,7 @@ def get_dpid(host_name: str) -> int:
     Returns:
         int: The DPID corresponding to the switch name.
     """
-    dpid_mapping = {
-        f"s{i}": f"{i:016x}" for i in range(1, 5)
-    }
-    return int(dpid_mapping.get(host_name), 16)
+    return DPID_MAPPING[host_name]
 
 def get_port(src: str, dst: str) -> int:
     """
@@ -54,110 +65,121 @@ def get_port(src: str, dst: str) -> int:
     Returns:
         int: The port number for the given source and destination.
     """
-    link_mapping = {
-        "s1": {
-            "h1": 1,
-            "h2": 2,
-            "s2": 3,
-            "s4": 4,
-        },
-        "s2": {
-            "h3": 1,
-            "h4": 2,
-            "h5": 3,
-            "s1": 4,
-            "s3": 5,
-            "s4": 6,
-        },
-        "s3": {
-            "h6": 1,
-            "h7": 2,
-            "s2": 3,
-        },
-        "s4": {
-            "h8": 1,
-            "h9": 2,
-            "h10": 3,
-            "s1": 4,
-            "s2": 5,
-        },
+    return LINK_MAPPING.get(src).get(dst)
+
+def queue_ports():
+    """
+    Get the ports with the QoS queues: the ports linking a switch to another switch, where the traffic classes share the bandwidth.
+
+    Args: None
+
+    Returns:
+        dict: A dictionary {dpid: ports}, where ports is a tuple of port numbers.
+    """
+    return {
+        get_dpid(switch): tuple(port for peer, port in links.items() if peer in DPID_MAPPING)
+        for switch, links in LINK_MAPPING.items()
     }
-    return link_mapping.get(src).get(dst)
 
-def generate_link_entries(src_ip, dst_ips, switch, ports):
+def queue_port_names():
     """
-    Generate link entries for a given source IP, destination IPs, switch, and ports.
+    Get the names of the ports with the QoS queues, as named by mininet (e.g., "s1-eth3").
 
-    Args:
-        src_ip (str): The source IP address.
-        dst_ips (list): A list of destination IP addresses.
-        switch (str): The switch name.
-        ports (list): A list of ports corresponding to the destination IPs.
+    Args: None
 
     Returns:
-        dict: A dictionary representing the link entries.
+        list: The names of the ports.
     """
-    return {src_ip: [{dst_ip: get_port(switch, port)} for dst_ip, port in zip(dst_ips, ports)]}
+    return [f"{switch}-eth{port}" for switch, links in LINK_MAPPING.items() for peer, port in links.items() if peer in DPID_MAPPING]
 
-def slice_to_port():
+def attached_hosts():
     """
-    Generate port mappings for different slicing scenarios.
+    Get the MAC addresses of the hosts attached to every switch.
 
     Args: None
 
     Returns:
-        dict: A dictionary representing the port mappings for different scenarios.
+        dict: A dictionary {dpid: macs}, where macs is a tuple of MAC addresses.
     """
-    first_scenario =  {
-        get_dpid("s1"): {
-            **generate_link_entries(get_MAC_address("h1"), [get_MAC_address("h6"), get_MAC_address("h7")], "s1", ["s2", "s2"]),
-            **generate_link_entries(get_MAC_address("h6"), [get_MAC_address("h1")], "s1", ["h1"]),
-            **generate_link_entries(get_MAC_address("h7"), [get_MAC_address("h1")], "s1", ["h1"]),
-        },
-        get_dpid("s2"): {
-            **generate_link_entries(get_MAC_address("h1"), [get_MAC_address("h6"), get_MAC_address("h7")], "s2", ["s3", "s3"]),
-            **generate_link_entries(get_MAC_address("h6"), [get_MAC_address("h1")], "s2", ["s1"]),
-            **generate_link_entries(get_MAC_address("h7"), [get_MAC_address("h1")], "s2", ["s1"]),
-        },
-        get_dpid("s3"): {
-            **generate_link_entries(get_MAC_address("h1"), [get_MAC_address("h6"), get_MAC_address("h7")], "s3", ["h6", "h7"]),
-            **generate_link_entries(get_MAC_address("h6"), [get_MAC_address("h1"), get_MAC_address("h7")], "s3", ["s2", "h7"]),
-            **generate_link_entries(get_MAC_address("h7"), [get_MAC_address("h1"), get_MAC_address("h6")], "s3", ["s2", "h6"]),
-        },
-    }
-    second_scenario = {
-        get_dpid("s1"): {
-            **generate_link_entries(get_MAC_address("h2"), [get_MAC_address("h5"), get_MAC_address("h8")], "s1", ["s2", "s4"]),
-            **generate_link_entries(get_MAC_address("h5"), [get_MAC_address("h2"), get_MAC_address("h8")], "s1", ["h2", "s4"]),
-            **generate_link_entries(get_MAC_address("h8"), [get_MAC_address("h2"), get_MAC_address("h5")], "s1", ["h2", "s2"]),
-        },
-        get_dpid("s2"): {
-            **generate_link_entries(get_MAC_address("h2"), [get_MAC_address("h5")], "s2", ["h5"]),
-            **generate_link_entries(get_MAC_address("h5"), [get_MAC_address("h2"), get_MAC_address("h8")], "s2", ["s1", "s1"]),
-            **generate_link_entries(get_MAC_address("h8"), [get_MAC_address("h5")], "s2", ["h5"]),
-        },
-        get_dpid("s4"): {
-            **generate_link_entries(get_MAC_address("h2"), [get_MAC_address("h8")], "s4", ["h8"]),
-            **generate_link_entries(get_MAC_address("h5"), [get_MAC_address("h8")], "s4", ["h8"]),
-            **generate_link_entries(get_MAC_address("h8"), [get_MAC_address("h2"), get_MAC_address("h5")], "s4", ["s1", "s1"]),
-        }
-    }
-    third_scenario = {
-        get_dpid("s2"): {
-            **generate_link_entries(get_MAC_address("h3"), [get_MAC_address("h4"), get_MAC_address("h9"), get_MAC_address("h10")], "s2", ["h4", "s4", "s4"]),
-            **generate_link_entries(get_MAC_address("h4"), [get_MAC_address("h3"), get_MAC_address("h9"), get_MAC_address("h10")], "s2", ["h3", "s4", "s4"]),
-            **generate_link_entries(get_MAC_address("h9"), [get_MAC_address("h3"), get_MAC_address("h4")], "s2", ["h3", "h4"]),
-            **generate_link_entries(get_MAC_address("h10"), [get_MAC_address("h3"), get_MAC_address("h4")], "s2", ["h3", "h4"]),
-        },
-        get_dpid("s4"): {
-            **generate_link_entries(get_MAC_address("h3"), [get_MAC_address("h9"), get_MAC_address("h10")], "s4", ["h9", "h10"]),
-            **generate_link_entries(get_MAC_address("h4"), [get_MAC_address("h9"), get_MAC_address("h10")], "s4", ["h9", "h10"]),
-            **generate_link_entries(get_MAC_address("h9"), [get_MAC_address("h3"), get_MAC_address("h4"), get_MAC_address("h10")], "s4", ["s2", "s2", "h10"]),
-            **generate_link_entries(get_MAC_address("h10"), [get_MAC_address("h3"), get_MAC_address("h4"),get_MAC_address("h9")], "s4", ["s2", "s2", "h9"]),
-        }
+    return {
+        get_dpid(switch): tuple(get_MAC_address(peer) for peer in links if peer in MAC_MAPPING)
+        for switch, links in LINK_MAPPING.items()
     }
+
+def switch_neighbors():
+    """
+    Get the neighbors of every switch, with the port through which each neighbor reaches the switch.
+
+    Args: None
+
+    Returns:
+        dict: A dictionary {dpid: {neighbor dpid: port of the neighbor}}.
+    """
     return {
-        0: first_scenario,
-        1: second_scenario,
-        2: third_scenario
+        get_dpid(switch): {get_dpid(peer): get_port(peer, switch) for peer in links if peer in DPID_MAPPING}
+        for switch, links in LINK_MAPPING.items()
     }
+
+def freeze(table):
+    """
+    Recursively convert a port mapping into an immutable structure, so that it can be cached and shared.
+    Dictionaries become read-only mappings and lists become tuples.
+
+    Args:
+        table: The port mapping to convert.
+
+    Returns:
+        The immutable port mapping.
+    """
+    if isinstance(table, dict):
+        return MappingProxyType({key: freeze(value) for key, value in table.items()})
+    if isinstance(table, list):
+        return tuple(freeze(value) for value in table)
+    return table
+
+def build_forwarding_index(slice_tables, modes):
+    """
+    Merge the port mappings of the active slices into a dictionary that can be queried with a single lookup.
+    The output ports of a pair of hosts that belongs to more than one slice are deduplicated.
+
+    Args:
+        slice_tables (dict): The port mappings of every slice returned by slice_to_port.
+        modes (list): The indexes of the active slices.
+
+    Returns:
+        dict: A dictionary {(dpid, src, dst): out_ports}, where out_ports is a tuple.
+    """
+    index = {}
+    for mode in modes:
+        for dpid, sources in slice_tables[mode].items():
+            for src, entries in sources.items():
+                for entry in entries:
+                    for dst, out_port in entry.items():
+                        out_ports = index.get((dpid, src, dst), ())
+                        if out_port not in out_ports:
+                            index[(dpid, src, dst)] = out_ports + (out_port,)
+    return index
+
+@lru_cache(maxsize=None)
+def slice_to_port():
+    """
+    Get the port mappings for the different slicing scenarios.
+    The mappings are generated only at the first call, then the cached immutable copy is returned.
+
+    Args: None
+
+    Returns:
+        MappingProxyType: A read-only mapping representing the port mappings for different scenarios.
+    """
+    return freeze(build_slice_to_port())
+
+def build_slice_to_port():
+    """
+    Generate port mappings for different slicing scenarios, compiled from the slices of the specification.
+
+    Args: None
+
+    Returns:
+        dict: A dictionary representing the port mappings for different scenarios.
+    """
+    return SpecCompiler(SPEC).compile()
@@ -0,0 +1,591 @@
+"""
+Compile a declarative topology and slice specification into the per-switch forwarding tables
+used by the controllers and into a mininet topology.
+
+A specification is a JSON (or YAML, if PyYAML is installed) file with the following keys:
+- "address": the field used to identify the hosts in the forwarding tables, "ipv4" or "mac"
+- "routing": "shortest" (fewest hops) or "widest" (largest bottleneck bandwidth)
+- "prefix": the prefix length of the hosts' IP addresses
+- "hosts": {name: {"ip": str, "mac": str}}
+- "switches": {name: {"dpid": int}}
+- "links": [{"nodes": [a, b], "ports": [port_a, port_b], "bw": Mbps}]
+- "slices": [{"name": str, "groups": [[host, ...], ...], "links": [[switch, switch], ...]}]
+  every host of a group can communicate with every other host of the same group; "links" is optional
+  and restricts the switch-to-switch links the slice can use
+- "entries" (optional, in a slice): [{"switch": str, "sources": [host, ...], "destinations": [host, ...], "to": node}]
+  static entries added to the routes, forwarding the packets of the sources to the destinations towards a linked node
+
+Usage:
+    python3 spec_compiler.py first_topology/spec.json [--output tables.json] [--check reference_tables.json]
+    sudo python3 spec_compiler.py first_topology/spec.json --mininet
+"""
+import argparse
+import gc
+import json
+import time
+from itertools import chain
+
+
+def load_spec(path):
+    """
+    Load a specification from a JSON or YAML file.
+
+    Args:
+        path (str): The path of the specification.
+
+    Returns:
+        dict: The specification.
+    """
+    with open(path, "r") as spec_file:
+        if path.endswith((".yaml", ".yml")):
+            import yaml
+            return yaml.safe_load(spec_file)
+        return json.load(spec_file)
+
+
+
+def link_mapping(spec):
+    """
+    Get the port of every switch towards each of its linked hosts and switches.
+
+    Args:
+        spec (dict): The specification.
+
+    Returns:
+        dict: A dictionary {switch: {node: port}}, listing the hosts then the switches, each by port.
+    """
+    links = {switch: [] for switch in spec["switches"]}
+    for link in spec["links"]:
+        for node, peer, port in zip(link["nodes"], reversed(link["nodes"]), link["ports"]):
+            if node in links:
+                links[node].append((peer in links, port, peer))
+    return {switch: {peer: port for _, port, peer in sorted(peers)} for switch, peers in links.items()}
+
+class SpecCompiler:
+    """
+    Compile the slices of a specification into forwarding tables.
+
+    Attributes:
+        spec (dict): The specification.
+        attachments (dict): The switch and switch port of every host {host: (switch, port)}.
+        adjacency (dict): The switch-to-switch links {switch: [(neighbor, port, bw, neighbor_port)]}.
+        host_keys (dict): The IP or MAC address identifying every host in the forwarding tables.
+    """
+    def __init__(self, spec):
+        self.spec = spec
+        self.attachments = {}
+        self.adjacency = {switch: [] for switch in spec["switches"]}
+
+        hosts = spec["hosts"]
+        address = "mac" if spec.get("address", "ipv4") == "mac" else "ip"
+        self.host_keys = {name: host[address] for name, host in hosts.items()}
+
+        for link in spec["links"]:
+            (a, b), (port_a, port_b) = link["nodes"], link["ports"]
+            bw = link.get("bw", 0)
+            if a in hosts or b in hosts:
+                host, switch, port = (a, b, port_b) if a in hosts else (b, a, port_a)
+                if switch not in self.adjacency:
+                    raise ValueError(f"Host {host} is connected to unknown switch {switch}")
+                self.attachments[host] = (switch, port)
+                continue
+            if a not in self.adjacency or b not in self.adjacency:
+                raise ValueError(f"Link {a}-{b} connects an unknown node")
+            self.adjacency[a].append((b, port_a, bw, port_b))
+            self.adjacency[b].append((a, port_b, bw, port_a))
+
+    def slice_adjacency(self, slice_spec):
+        """
+        Get the switch-to-switch links a slice can use.
+
+        Args:
+            slice_spec (dict): The specification of the slice.
+
+        Returns:
+            dict: The adjacency {switch: [(neighbor, port, bw, neighbor_port)]}.
+        """
+        if "links" not in slice_spec:
+            return self.adjacency
+        allowed = {frozenset(link) for link in slice_spec["links"]}
+        return {
+            switch: [edge for edge in edges if frozenset((switch, edge[0])) in allowed]
+            for switch, edges in self.adjacency.items()
+        }
+
+    @staticmethod
+    def bandwidth_levels(adjacency):
+        """
+        Compute the groups of switches connected by links at least as wide as every link bandwidth, with Kruskal's
+        union-find over the links from the widest. In an undirected graph, the bottleneck bandwidth of the widest
+        path between two switches is the largest bandwidth at which they are in the same group.
+
+        Args:
+            adjacency (dict): The adjacency {switch: [(neighbor, port, bw, neighbor_port)]}.
+
+        Returns:
+            list: The (bandwidth, groups) levels from the widest, where groups is a dictionary {switch: group}.
+        """
+        parent = {switch: switch for switch in adjacency}
+
+        def find(switch):
+            while parent[switch] != switch:
+                parent[switch] = parent[parent[switch]]
+                switch = parent[switch]
+            return switch
+
+        by_bandwidth = {}
+        for a, edges in adjacency.items():
+            for b, _, bw, _ in edges:
+                if a < b:
+                    by_bandwidth.setdefault(bw, []).append((a, b))
+        levels = []
+        for bw in sorted(by_bandwidth, reverse=True):
+            for a, b in by_bandwidth[bw]:
+                root_a, root_b = find(a), find(b)
+                if root_a != root_b:
+                    parent[root_a] = root_b
+            levels.append((bw, {switch: find(switch) for switch in adjacency}))
+        return levels
+
+    @staticmethod
+    def bottlenecks(levels, source, destinations):
+        """
+        Group the destination switches by the bottleneck bandwidth of the widest path from a source switch.
+
+        Args:
+            levels (list): The levels of the links, see bandwidth_levels.
+            source (str): The source switch.
+            destinations (set): The destination switches.
+
+        Returns:
+            dict: A dictionary {bandwidth: set of destination switches}, with an infinite bandwidth for the source
+            switch itself and None for the switches that are not connected to it.
+        """
+        by_width = {}
+        remaining = set(destinations)
+        if source in remaining:
+            remaining.discard(source)
+            by_width[float("inf")] = {source}
+        for bw, groups in levels:
+            if not remaining:
+                break
+            group = groups[source]
+            connected = {switch for switch in remaining if groups[switch] == group}
+            if connected:
+                by_width[bw] = connected
+                remaining -= connected
+        if remaining:
+            by_width[None] = remaining
+        return by_width
+
+    @staticmethod
+    def port_index(adjacency, width=0):
+        """
+        Index the links at least as wide as a bandwidth for the searches.
+
+        Args:
+            adjacency (dict): The adjacency {switch: [(neighbor, port, bw, neighbor_port)]}.
+            width (float): The minimum bandwidth of the links.
+
+        Returns:
+            dict: A dictionary {switch: {neighbor: port}}, with the port of the first link to every neighbor.
+        """
+        ports = {}
+        for switch, edges in adjacency.items():
+            neighbors = ports[switch] = {}
+            for neighbor, port, bw, _ in edges:
+                if bw >= width and neighbor not in neighbors:
+                    neighbors[neighbor] = port
+        return ports
+
+    @staticmethod
+    def search(ports, source, targets):
+        """
+        Compute, with a breadth-first search from a source switch, the previous switch of every switch on a path
+        with the fewest hops from the source. The search stops as soon as every target switch has been reached.
+        A layer larger than the switches not reached yet is expanded from these switches instead, each one looking
+        for a neighbor in the layer, which avoids going through the links of every switch of the layer.
+
+        Args:
+            ports (dict): The indexed links {switch: {neighbor: port}}, see port_index.
+            source (str): The source switch.
+            targets (set): The switches to reach.
+
+        Returns:
+            dict: A dictionary {switch: previous_switch}, None for the source.
+        """
+        previous = {source: None}
+        remaining = set(targets)
+        remaining.discard(source)
+        frontier = [source]
+        unvisited = ports
+        while frontier and remaining:
+            layer = []
+            if len(frontier) > len(ports) - len(previous):
+                members = set(frontier)
+                unvisited = [switch for switch in unvisited if switch not in previous]
+                for switch in unvisited:
+                    # The neighbors are tried in the order of the links, so that the paths do not depend on the hash seed
+                    for neighbor in ports[switch]:
+                        if neighbor in members:
+                            previous[switch] = neighbor
+                            layer.append(switch)
+                            break
+                remaining.difference_update(layer)
+            else:
+                for switch in frontier:
+                    reached = [neighbor for neighbor in ports[switch] if neighbor not in previous]
+                    if not reached:
+                        continue
+                    previous.update(dict.fromkeys(reached, switch))
+                    layer.extend(reached)
+                    remaining.difference_update(reached)
+                    if not remaining:
+                        break
+            frontier = layer
+        return previous
+
+    @staticmethod
+    def paths(ports, previous, destinations):
+        """
+        Get the switches and output ports of the paths from the source of a search to some switches.
+        The paths share the hops of their common prefix, which are followed only once.
+
+        Args:
+            ports (dict): The indexed links {switch: {neighbor: port}} used by the search.
+            previous (dict): The previous switch of every switch reached by the search.
+            destinations (set): The destination switches.
+
+        Returns:
+            dict: A dictionary {destination_switch: hops}, where hops is a tuple of the (switch, port) hops before
+            the destination switch, None if it was not reached.
+        """
+        paths = {}
+        known = {}
+        for destination in destinations:
+            if destination not in previous:
+                paths[destination] = None
+                continue
+            unknown = []
+            switch = destination
+            while switch not in known and previous[switch] is not None:
+                unknown.append(switch)
+                switch = previous[switch]
+            hops = known.get(switch, ())
+            for switch in reversed(unknown):
+                prior = previous[switch]
+                hops = known[switch] = hops + ((prior, ports[prior][switch]),)
+            paths[destination] = hops
+        return paths
+
+    def slice_pairs(self, slice_spec):
+        """
+        Collect the pairs of hosts of a slice and the switches that every source switch needs a route to.
+
+        Args:
+            slice_spec (dict): The specification of the slice.
+
+        Returns:
+            tuple: (pairs, targets), where pairs is a list of distinct (src, dst) hosts and targets a dictionary
+            {source_switch: set of destination switches}.
+        """
+        attachments = self.attachments
+        pairs = {}
+        targets = {}
+        for group in slice_spec["groups"]:
+            for src in group:
+                destinations = targets.setdefault(attachments[src][0], set())
+                for dst in group:
+                    if dst != src:
+                        pairs[(src, dst)] = None
+                        destinations.add(attachments[dst][0])
+        return list(pairs), targets
+
+    def routes(self, adjacency, targets):
+        """
+        Compute the path from every source switch to its destination switches, with one search per source switch.
+        With shortest routing every source uses the fewest hops. With widest routing every source uses,
+        among the paths with the largest bottleneck bandwidth, the one with the fewest hops.
+
+        Args:
+            adjacency (dict): The adjacency {switch: [(neighbor, port, bw, neighbor_port)]}.
+            targets (dict): The destination switches of every source switch.
+
+        Returns:
+            dict: A dictionary {(source_switch, destination_switch): hops}, see paths.
+        """
+        routes = {}
+        if self.spec.get("routing", "shortest") != "widest":
+            ports = self.port_index(adjacency)
+            for src_switch, destinations in targets.items():
+                previous = self.search(ports, src_switch, destinations)
+                for dst_switch, hops in self.paths(ports, previous, destinations).items():
+                    routes[(src_switch, dst_switch)] = hops
+            return routes
+
+        levels = self.bandwidth_levels(adjacency)
+        filtered = {}
+        for src_switch, destinations in targets.items():
+            for width, group in self.bottlenecks(levels, src_switch, destinations).items():
+                if width is None:
+                    routes.update(dict.fromkeys([(src_switch, dst_switch) for dst_switch in group]))
+                elif width == float("inf"):
+                    routes[(src_switch, src_switch)] = ()
+                else:
+                    # The shortest path using only links at least as wide as the bottleneck is one of the widest paths
+                    if width not in filtered:
+                        filtered[width] = self.port_index(adjacency, width)
+                    ports = filtered[width]
+                    previous = self.search(ports, src_switch, group)
+                    for dst_switch, hops in self.paths(ports, previous, group).items():
+                        routes[(src_switch, dst_switch)] = hops
+        return routes
+
+    def emit(self, slice_spec, pairs, routes):
+        """
+        Emit the entries of the switches along the route of every pair of hosts, then the static entries of the slice.
+
+        Args:
+            slice_spec (dict): The specification of the slice.
+            pairs (list): The (src, dst) pairs of hosts.
+            routes (dict): The path between every source and destination switch, see routes.
+
+        Returns:
+            dict: A dictionary {dpid: {src: [{dst: port}]}}, in the same format as utils.slice_to_port.
+        """
+        tables = {}
+        switch_tables = {name: tables.setdefault(switch["dpid"], {}) for name, switch in self.spec["switches"].items()}
+        hosts = {name: (switch, port, self.host_keys[name]) for name, (switch, port) in self.attachments.items()}
+        for src, dst in pairs:
+            src_switch, _, src_key = hosts[src]
+            dst_switch, dst_port, dst_key = hosts[dst]
+            route = routes[(src_switch, dst_switch)]
+            if route is None:
+                raise ValueError(f"{dst} is not reachable from {src} in slice {slice_spec['name']}")
+            # The last switch forwards to the port of the destination host
+            for switch, port in chain(route, ((dst_switch, dst_port),)):
+                table = switch_tables[switch]
+                entries = table.get(src_key)
+                if entries is None:
+                    table[src_key] = [{dst_key: port}]
+                else:
+                    entries.append({dst_key: port})
+
+        for entry in slice_spec.get("entries", ()):
+            switch = entry["switch"]
+            port = self.node_port(switch, entry["to"])
+            table = switch_tables[switch]
+            for src in entry["sources"]:
+                table.setdefault(self.host_keys[src], []).extend({self.host_keys[dst]: port} for dst in entry["destinations"])
+        return {dpid: table for dpid, table in tables.items() if table}
+
+    def node_port(self, switch, node):
+        """
+        Get the port of a switch linked to a host or to another switch.
+
+        Args:
+            switch (str): The switch.
+            node (str): The host or switch linked to it.
+
+        Returns:
+            int: The port of the switch.
+        """
+        for link in self.spec["links"]:
+            if link["nodes"] in ([switch, node], [node, switch]):
+                return link["ports"][link["nodes"].index(switch)]
+        raise ValueError(f"{switch} is not linked to {node}")
+
+    def compile_slice(self, slice_spec):
+        """
+        Compile a slice into the forwarding tables of its switches.
+
+        Args:
+            slice_spec (dict): The specification of the slice.
+
+        Returns:
+            dict: A dictionary {dpid: {src: [{dst: port}]}}, in the same format as utils.slice_to_port.
+        """
+        pairs, targets = self.slice_pairs(slice_spec)
+        return self.emit(slice_spec, pairs, self.routes(self.slice_adjacency(slice_spec), targets))
+
+    def compile(self):
+        """
+        Compile every slice of the specification.
+        Slices that can use the same links share their routes, which are computed only once.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {slice_index: forwarding_table}, in the same format as utils.slice_to_port.
+        """
+        # The tables are hundreds of thousands of small containers without cycles, which the cyclic garbage
+        # collector would otherwise go through again and again while they are built
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            return self.compile_slices()
+        finally:
+            if collecting:
+                gc.enable()
+
+    def compile_slices(self):
+        """
+        Compile every slice of the specification, see compile.
+
+        Args: None
+
+        Returns:
+            dict: A dictionary {slice_index: forwarding_table}.
+        """
+        by_links = {}
+        for index, slice_spec in enumerate(self.spec["slices"]):
+            links = frozenset(frozenset(link) for link in slice_spec["links"]) if "links" in slice_spec else None
+            by_links.setdefault(links, []).append(index)
+
+        tables = {}
+        for indexes in by_links.values():
+            slices = [self.spec["slices"][index] for index in indexes]
+            collected = [self.slice_pairs(slice_spec) for slice_spec in slices]
+            targets = {}
+            for _, slice_targets in collected:
+                for src_switch, destinations in slice_targets.items():
+                    targets.setdefault(src_switch, set()).update(destinations)
+
+            routes = self.routes(self.slice_adjacency(slices[0]), targets)
+            for index, slice_spec, (pairs, _) in zip(indexes, slices, collected):
+                tables[index] = self.emit(slice_spec, pairs, routes)
+        return dict(sorted(tables.items()))
+
+
+def same_tables(compiled, reference):
+    """
+    Compare two sets of forwarding tables entry by entry, ignoring the order of the entries and the type of the keys
+    (the DPIDs and slice indexes are strings once written to JSON).
+
+    Args:
+        compiled (dict): The forwarding tables {slice_index: {dpid: {src: [{dst: port}]}}}.
+        reference (dict): The forwarding tables to compare with, in the same format.
+
+    Returns:
+        list: The differing (slice_index, dpid, src, dst, compiled_port, reference_port) entries, empty if the tables are the same.
+    """
+    def flatten(tables):
+        entries = {}
+        for index, table in tables.items():
+            for dpid, sources in table.items():
+                for src, dst_entries in sources.items():
+                    for entry in dst_entries:
+                        for dst, port in entry.items():
+                            entries.setdefault((int(index), int(dpid), src, dst), []).append(port)
+        return entries
+
+    compiled, reference = flatten(compiled), flatten(reference)
+    return [
+        (*key, compiled.get(key), reference.get(key))
+        for key in sorted(compiled.keys() | reference.keys()) if compiled.get(key) != reference.get(key)
+    ]
+
+
+def add_spec_nodes(topo, spec, shaped=True):
+    """
+    Add the hosts, switches and links described by a specification to a mininet topology.
+
+    Args:
+        topo (Topo): The mininet topology.
+        spec (dict): The specification.
+        shaped (bool): Whether the links are limited to their bandwidth, which requires TCLink.
+
+    Returns:
+        None
+    """
+    prefix = spec.get("prefix", 8)
+    for name, host in spec["hosts"].items():
+        topo.addHost(name, inNamespace=True, ip=f"{host['ip']}/{prefix}", mac=host["mac"])
+    for name, switch in spec["switches"].items():
+        topo.addSwitch(name, dpid="%016x" % switch["dpid"])
+    for link in spec["links"]:
+        (a, b), (port_a, port_b) = link["nodes"], link["ports"]
+        options = {"bw": link["bw"]} if shaped and "bw" in link else {}
+        topo.addLink(a, b, port1=port_a, port2=port_b, **options)
+
+
+def build_mininet_topo(spec):
+    """
+    Build the mininet topology described by a specification.
+
+    Args:
+        spec (dict): The specification.
+
+    Returns:
+        Topo: The mininet topology.
+    """
+    from mininet.topo import Topo
+
+    topo = Topo()
+    add_spec_nodes(topo, spec)
+    return topo
+
+
+def run_mininet(spec):
+    """
+    Start the mininet network described by a specification, connected to the controller on port 6633.
+
+    Args:
+        spec (dict): The specification.
+
+    Returns:
+        None
+    """
+    from mininet.net import Mininet
+    from mininet.node import OVSKernelSwitch, RemoteController
+    from mininet.cli import CLI
+    from mininet.link import TCLink
+    from mininet.log import setLogLevel
+
+    setLogLevel("info")
+    net = Mininet(
+        topo=build_mininet_topo(spec),
+        switch=OVSKernelSwitch,
+        link=TCLink,
+        autoSetMacs=False,
+        autoStaticArp=True,
+        controller=RemoteController("c0", ip="127.0.0.1", port=6633),
+    )
+    net.start()
+    CLI(net)
+    net.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a topology and slice specification")
+    parser.add_argument("spec", help="path of the JSON or YAML specification")
+    parser.add_argument("--output", help="write the forwarding tables to this JSON file")
+    parser.add_argument("--check", help="exit with an error if the forwarding tables differ from the ones of this JSON file")
+    parser.add_argument("--mininet", action="store_true", help="start the mininet topology instead")
+    args = parser.parse_args()
+
+    spec = load_spec(args.spec)
+    if args.mininet:
+        run_mininet(spec)
+    else:
+        start = time.perf_counter()
+        tables = SpecCompiler(spec).compile()
+        elapsed = time.perf_counter() - start
+
+        for index, slice_spec in enumerate(spec["slices"]):
+            count = sum(len(entries) for sources in tables[index].values() for entries in sources.values())
+            print(f"Slice {index} ({slice_spec['name']}): {count} entries on {len(tables[index])} switches")
+        print(f"Compiled in {elapsed * 1000:.2f} ms")
+
+        if args.output:
+            with open(args.output, "w") as output_file:
+                json.dump({str(index): table for index, table in tables.items()}, output_file, indent=2)
+
+        if args.check:
+            with open(args.check, "r") as reference_file:
+                differences = same_tables(tables, json.load(reference_file))
+            for index, dpid, src, dst, compiled_port, reference_port in differences:
+                print(f"Slice {index}, switch {dpid}, {src} -> {dst}: compiled {compiled_port}, expected {reference_port}")
+            if differences:
+                raise SystemExit(f"{len(differences)} entries differ from {args.check}")
+            print(f"Same tables as {args.check}")